@@ -0,0 +1,207 @@
+"""
+Admission control and load shedding for upload endpoints.
+
+Runs as ASGI middleware in front of /api/predict, before the multipart body
+is read, so excess uploads are turned away instead of being buffered in
+memory. At most ``max_concurrent`` requests are processed at once and up to
+``max_queue`` more wait (for at most ``queue_timeout`` seconds) for a slot:
+
+- queue full: 429 Too Many Requests
+- waited too long: 503 Service Unavailable
+- memory critical (memory-aware mode): 503 without queueing; under a memory
+  warning the concurrency limit is halved
+
+Every rejection carries a Retry-After header estimated from recent request
+durations.
+"""
+
+import asyncio
+import json
+import math
+import os
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable
+
+
+class Overloaded(Exception):
+    """Raised when a request is not admitted"""
+
+    def __init__(self, reason: str, status_code: int, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded wait queue, optionally memory-aware"""
+
+    def __init__(self, max_concurrent: int = 16, max_queue: int = 32, queue_timeout: float = 5.0,
+                 memory_level: Callable[[], str] = None, on_reject: Callable[[str], None] = None):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout = max(0.0, float(queue_timeout))
+        self.memory_level = memory_level
+        self.on_reject = on_reject
+
+        # Only touched from the event loop thread
+        self._in_flight = 0
+        self._waiters: deque = deque()
+        self._admitted = 0
+        self._rejected: Dict[str, int] = {}
+        self._peak_queue = 0
+        self._avg_seconds = 1.0
+
+    def _level(self) -> str:
+        if self.memory_level is None:
+            return 'normal'
+        try:
+            return self.memory_level()
+        except Exception:
+            return 'normal'
+
+    def limit(self, level: str = None) -> int:
+        """Current concurrency limit: halved under memory warning, zero when critical"""
+        level = level or self._level()
+        if level == 'critical':
+            return 0
+        if level == 'warning':
+            return max(1, self.max_concurrent // 2)
+        return self.max_concurrent
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free, from the queue and mean duration"""
+        waves = (len(self._waiters) + 1) / max(1, self.limit())
+        return max(1, min(60, math.ceil(self._avg_seconds * waves)))
+
+    def _reject(self, reason: str, status_code: int):
+        self._rejected[reason] = self._rejected.get(reason, 0) + 1
+        if self.on_reject is not None:
+            self.on_reject(reason)
+        raise Overloaded(reason, status_code, self.retry_after())
+
+    async def acquire(self):
+        """Wait for a processing slot or raise Overloaded"""
+        level = self._level()
+        if level == 'critical':
+            self._reject('memory_critical', 503)
+        if self._in_flight < self.limit(level) and not self._waiters:
+            self._in_flight += 1
+            self._admitted += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._reject('queue_full', 429)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._peak_queue = max(self._peak_queue, len(self._waiters))
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._discard(waiter)
+            self._reject('queue_timeout', 503)
+        except BaseException:
+            # Client went away; hand on a slot we may already have been given
+            self._discard(waiter)
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        self._admitted += 1
+
+    def _discard(self, waiter):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self, duration: float = None):
+        """Free a slot, handing it straight to the next waiter if allowed"""
+        if duration is not None:
+            self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * duration
+        if self._in_flight <= self.limit():
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        self._in_flight -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return current load and rejection counters"""
+        return {
+            'max_concurrent': self.max_concurrent,
+            'current_limit': self.limit(),
+            'max_queue': self.max_queue,
+            'queue_timeout_seconds': self.queue_timeout,
+            'memory_aware': self.memory_level is not None,
+            'in_flight': self._in_flight,
+            'queue_depth': len(self._waiters),
+            'peak_queue_depth': self._peak_queue,
+            'admitted': self._admitted,
+            'rejected': dict(self._rejected),
+            'avg_request_seconds': round(self._avg_seconds, 3),
+        }
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying an AdmissionController to selected POST paths"""
+
+    def __init__(self, app, get_controller: Callable[[], AdmissionController], paths: Iterable[str]):
+        self.app = app
+        self.get_controller = get_controller
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'POST' or scope['path'] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        # Request deadlines count from here, so time spent queued is included
+        scope.setdefault('state', {})['received_at'] = time.monotonic()
+        controller = self.get_controller()
+        try:
+            await controller.acquire()
+        except Overloaded as overloaded:
+            await self._send_rejection(send, overloaded)
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(time.perf_counter() - started)
+
+    @staticmethod
+    async def _send_rejection(send, overloaded: Overloaded):
+        body = json.dumps({
+            'error': 'Server is busy, please retry shortly',
+            'reason': overloaded.reason,
+            'retry_after': overloaded.retry_after,
+        }).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': overloaded.status_code,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+                (b'retry-after', str(overloaded.retry_after).encode()),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def admission_from_env(memory_level: Callable[[], str] = None,
+                       on_reject: Callable[[str], None] = None) -> AdmissionController:
+    """Create a controller configured by the ADMISSION_* environment variables
+
+    ``memory_level`` is only used when ADMISSION_MEMORY_AWARE is enabled.
+    """
+    memory_aware = os.getenv('ADMISSION_MEMORY_AWARE', 'false').lower() in ('1', 'true', 'yes')
+    return AdmissionController(
+        max_concurrent=int(os.getenv('ADMISSION_MAX_CONCURRENT', 16)),
+        max_queue=int(os.getenv('ADMISSION_MAX_QUEUE', 32)),
+        queue_timeout=float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 5.0)),
+        memory_level=memory_level if memory_aware else None,
+        on_reject=on_reject,
+    )
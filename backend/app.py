@@ -1,14 +1,37 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, Header, Request, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, HTMLResponse
-from fastapi.staticfiles import StaticFiles
-from contextlib import asynccontextmanager
-import gc
+from fastapi.responses import JSONResponse, HTMLResponse, Response, StreamingResponse
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import asynccontextmanager, contextmanager
+from typing import TYPE_CHECKING, List
+import asyncio
+import hmac
+import json
 import os
-import io
+import threading
+import time
 import datetime
-import numpy as np
-from PIL import Image
+from batching import batcher_from_env
+from inference_executor import ExecutorSaturated, executor_from_env
+from prediction_cache import cache_from_env, content_key
+from near_duplicate import dhash, index_from_env
+from batch_upload import (BatchTooLarge, ByteBudget, aggregate_results, expand_archive, is_archive,
+                          max_batch_images, read_upload)
+from jobs import JobStore, JobWorker, jobs_exist, recover_unfinished
+from prefork import PreforkServer, worker_memory
+from metrics import MetricsRegistry
+from profiler import ProfilerBusy, SamplingProfiler, note_request, tag_stage
+from memory_optimizer import MemoryOptimizer
+from memory_governor import governor_from_env
+from admission import AdmissionMiddleware, admission_from_env
+from upload_ingest import UploadRejected, ingest_upload
+from deadlines import DeadlineExceeded, deadline_from_request, watch_disconnect
+from static_assets import PrecompressedStaticFiles, SpaShell
+
+# NumPy, PIL and torch are imported on first use (or by the warm-up thread)
+# so the process can answer health checks as soon as FastAPI is loaded
+if TYPE_CHECKING:
+    from PIL import Image
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -19,9 +42,27 @@ async def lifespan(app: FastAPI):
         try:
             get_model_loader()
             print("✅ Model loader startup check completed")
+            if os.getenv('MODEL_EAGER_LOAD', 'true').lower() in ('1', 'true', 'yes'):
+                start_model_warmup()
+            else:
+                model_readiness['status'] = 'lazy'
+                threading.Thread(target=warm_up_imports, name='import-warmup', daemon=True).start()
         except Exception as e:
             print(f"⚠️ Model loader startup check failed: {e}")
             print("🔄 Continuing with fallback mode...")
+            model_readiness.update(status='fallback', error=str(e))
+        
+        try:
+            get_memory_governor().start()
+        except Exception as e:
+            print(f"⚠️ Memory governor startup failed: {e}")
+        
+        # Resume any unfinished offline scoring jobs
+        try:
+            if jobs_exist():
+                ensure_job_worker()
+        except Exception as e:
+            print(f"⚠️ Job worker startup failed: {e}")
         
         print("✅ FastAPI app startup completed")
         yield
@@ -32,6 +73,13 @@ async def lifespan(app: FastAPI):
 
 app = FastAPI(lifespan=lifespan)
 
+# Shed load before upload bodies are read; added first so CORS headers still apply
+app.add_middleware(
+    AdmissionMiddleware,
+    get_controller=lambda: get_admission_controller(),
+    paths=('/api/predict', '/api/predict/batch')
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -49,42 +97,174 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus metrics served on /api/metrics
+metrics = MetricsRegistry()
+PREDICTIONS = metrics.counter(
+    'sneaker_predictions_total', 'Scored images by endpoint and outcome', ['endpoint', 'outcome'])
+PREDICTION_METHODS = metrics.counter(
+    'sneaker_prediction_method_total',
+    'Returned predictions by method (ml_model, simple_analysis, random_fallback, fallback_mode)', ['method'])
+REQUEST_SECONDS = metrics.histogram(
+    'sneaker_request_duration_seconds', 'End-to-end prediction request latency', ['endpoint'])
+STAGE_SECONDS = metrics.histogram(
+    'sneaker_stage_duration_seconds',
+    'Time per pipeline stage; preprocess and forward are timed once per batch', ['stage'])
+MODEL_LOADS = metrics.counter('sneaker_model_loads_total', 'Model load attempts by result', ['result'])
+MODEL_LOAD_SECONDS = metrics.gauge('sneaker_model_load_duration_seconds', 'Duration of the last model load attempt')
+MODEL_LOADED = metrics.gauge('sneaker_model_loaded', '1 when the model is loaded, 0 when serving fallbacks')
+PROCESS_MEMORY = metrics.gauge('sneaker_process_memory_bytes', 'Process memory by type (rss, vms)', ['type'])
+PROCESS_MEMORY_PERCENT = metrics.gauge('sneaker_process_memory_percent', 'Process RSS as a percentage of system memory')
+SYSTEM_MEMORY_AVAILABLE = metrics.gauge('sneaker_system_memory_available_bytes', 'Memory available on the host')
+ADMISSION_REJECTED = metrics.counter(
+    'sneaker_admission_rejected_total', 'Requests shed by admission control by reason', ['reason'])
+ADMISSION_IN_FLIGHT = metrics.gauge('sneaker_admission_in_flight', 'Upload requests currently being processed')
+ADMISSION_QUEUE_DEPTH = metrics.gauge('sneaker_admission_queue_depth', 'Upload requests waiting for admission')
+MEMORY_PRESSURE = metrics.gauge('sneaker_memory_pressure_level', 'Memory governor level: 0 normal, 1 warning, 2 critical')
+CUT_SHORT = metrics.counter(
+    'sneaker_predictions_cut_short_total',
+    'Images dropped because the request deadline passed or the client disconnected, by the stage not reached',
+    ['reason', 'stage'])
+
+memory_optimizer = MemoryOptimizer()
+
+def collect_process_metrics():
+    """Refresh memory and model gauges before each scrape"""
+    info = memory_optimizer.get_memory_info()
+    if info:
+        PROCESS_MEMORY.set(info['rss_mb'] * 1024 * 1024, type='rss')
+        PROCESS_MEMORY.set(info['vms_mb'] * 1024 * 1024, type='vms')
+        PROCESS_MEMORY_PERCENT.set(info['percent'])
+        SYSTEM_MEMORY_AVAILABLE.set(info['available_system_mb'] * 1024 * 1024)
+    MODEL_LOADED.set(1 if model_loader is not None and model_loader.model_loaded else 0)
+    if admission_controller is not None:
+        admission_stats = admission_controller.get_stats()
+        ADMISSION_IN_FLIGHT.set(admission_stats['in_flight'])
+        ADMISSION_QUEUE_DEPTH.set(admission_stats['queue_depth'])
+    if memory_governor is not None:
+        MEMORY_PRESSURE.set(('normal', 'warning', 'critical').index(memory_governor.level))
+
+metrics.on_collect(collect_process_metrics)
+
+@contextmanager
+def pipeline_stage(name: str):
+    """Time a synchronous pipeline stage and tag it for the sampling profiler"""
+    with STAGE_SECONDS.time(stage=name), tag_stage(name):
+        yield
+
+def observe_prediction(endpoint: str, result: dict):
+    """Count a successfully scored image by outcome and prediction method"""
+    if result.get('cached'):
+        outcome = 'cached'
+    elif result.get('near_duplicate'):
+        outcome = 'near_duplicate'
+    else:
+        outcome = 'scored'
+    PREDICTIONS.inc(endpoint=endpoint, outcome=outcome)
+    PREDICTION_METHODS.inc(method=result.get('method', 'unknown'))
+
+def cut_short_result(endpoint: str, dropped: DeadlineExceeded) -> dict:
+    """Count an image dropped by its deadline and describe it for the response"""
+    PREDICTIONS.inc(endpoint=endpoint, outcome='cut_short')
+    CUT_SHORT.inc(reason=dropped.reason, stage=dropped.stage)
+    print(f"⏱️ Prediction cut short: {dropped}")
+    return {'error': str(dropped), 'cut_short': True, 'reason': dropped.reason, 'stage': dropped.stage}
+
 class LightweightModelLoader:
     def __init__(self):
         self.model_loaded = False
         self.model = None
-        self.transform = None
+        self.backend = None
+        self.preprocessor = None
         self.device = None
+        self.model_path = None
+        self.model_version = None
+        self.load_lock = threading.Lock()
+        
+    def build_model(self):
+        """Build the ResNet50 architecture used by the saved checkpoint"""
+        import torch.nn as nn
+        from torchvision import models
+        
+        # Use ResNet50 to match the saved model architecture
+        model = models.resnet50(weights=None)
+        num_features = model.fc.in_features
+        model.fc = nn.Sequential(
+            nn.Dropout(0.5),
+            nn.Linear(num_features, 512),  # Match the saved model: 2048 -> 512
+            nn.ReLU(),
+            nn.BatchNorm1d(512),
+            nn.Dropout(0.3),
+            nn.Linear(512, 2)  # 2 classes: fake/real
+        )
+        return model
         
     def load_model_lazily(self):
         """Load model only when needed to save memory"""
         if self.model_loaded:
             return
-            
+        
+        # The warm-up thread and early requests may race to load the model
+        with self.load_lock:
+            if not self.model_loaded:
+                started = time.perf_counter()
+                self._load_model()
+                MODEL_LOAD_SECONDS.set(time.perf_counter() - started)
+                MODEL_LOADS.inc(result='success' if self.model_loaded else 'failure')
+                if self.model_loaded and model_readiness['status'] == 'lazy':
+                    # No warm-up thread to calibrate the memory thresholds
+                    calibrate_memory_governor()
+    
+    def _load_model(self):
         try:
             # Import PyTorch only when needed
             import torch
-            import torch.nn as nn
-            from torchvision import transforms, models
+            from checkpoint_format import is_current, load_mmap_state_dict, mmap_checkpoint_path
+            from preprocessing import BatchPreprocessor
+            from inference_backends import BACKEND_CHOICES, OnnxBackend, TorchBackend, onnx_model_path
             
             self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-            
-            # Use ResNet50 to match the saved model architecture
-            model = models.resnet50(weights=None)
-            num_features = model.fc.in_features
-            model.fc = nn.Sequential(
-                nn.Dropout(0.5),
-                nn.Linear(num_features, 512),  # Match the saved model: 2048 -> 512
-                nn.ReLU(),
-                nn.BatchNorm1d(512),
-                nn.Dropout(0.3),
-                nn.Linear(512, 2)  # 2 classes: fake/real
-            )
+            self.preprocessor = BatchPreprocessor(int(os.getenv('BATCH_MAX_SIZE', 8)))
             
             # Check if model file exists and get the correct path
             model_path = self.check_model_file()
+            self.model_path = model_path
+            
+            # Serve an exported ONNX graph instead of eager PyTorch if requested
+            backend_name = os.getenv('INFERENCE_BACKEND', 'torch').lower()
+            if backend_name not in BACKEND_CHOICES:
+                print(f"⚠️ Unknown INFERENCE_BACKEND '{backend_name}', using torch")
+                backend_name = 'torch'
+            if backend_name != 'torch' and model_path:
+                onnx_path = onnx_model_path(model_path, quantized=backend_name == 'onnx-int8')
+                if os.path.exists(onnx_path):
+                    self.backend = OnnxBackend(onnx_path, name=backend_name)
+                    self.device = torch.device("cpu")
+                    onnx_stat = os.stat(onnx_path)
+                    self.model_version = f"{os.path.abspath(onnx_path)}:{onnx_stat.st_size}:{int(onnx_stat.st_mtime)}"
+                    self.model_loaded = True
+                    print(f"✅ Model loaded successfully ({backend_name} backend: {onnx_path})")
+                    return
+                print(f"⚠️ {backend_name} model not found at {onnx_path}, falling back to torch backend")
+            
+            mmap_path = mmap_checkpoint_path(model_path) if model_path else None
+            use_mmap = (
+                mmap_path is not None
+                and os.getenv('MODEL_FORMAT', 'auto').lower() != 'pth'
+                and is_current(mmap_path, model_path)
+            )
             
-            if model_path:
+            if use_mmap:
+                # Map weights straight from the page cache; building on the meta
+                # device skips allocating and initializing throwaway weights
+                print(f"🔍 Attempting to load memory-mapped model from: {mmap_path}")
+                with torch.device('meta'):
+                    model = self.build_model()
+                model.load_state_dict(load_mmap_state_dict(mmap_path), assign=True)
+                print(f"✅ Model weights mapped successfully")
+                model_stat = os.stat(model_path)
+                model_version = f"{os.path.abspath(model_path)}:{model_stat.st_size}:{int(model_stat.st_mtime)}"
+            elif model_path:
+                model = self.build_model()
                 print(f"🔍 Attempting to load model from: {model_path}")
                 try:
                     # Load with map_location to CPU to save GPU memory
@@ -99,6 +279,8 @@ class LightweightModelLoader:
                     
                     model.load_state_dict(checkpoint['model_state_dict'])
                     print(f"✅ Model weights loaded successfully")
+                    model_stat = os.stat(model_path)
+                    model_version = f"{os.path.abspath(model_path)}:{model_stat.st_size}:{int(model_stat.st_mtime)}"
                 except Exception as load_error:
                     print(f"❌ Failed to load model from checkpoint: {load_error}")
                     print(f"❌ Error type: {type(load_error).__name__}")
@@ -107,18 +289,16 @@ class LightweightModelLoader:
                     raise load_error
             else:
                 print("⚠️ Using demo mode - model file not found")
+                model = self.build_model()
+                model_version = "demo"
             
             model.to(self.device)
             model.eval()
             
             self.model = model
-            self.transform = transforms.Compose([
-                transforms.Resize((224, 224)),
-                transforms.ToTensor(),
-                transforms.Normalize(mean=[0.485, 0.456, 0.406],
-                                   std=[0.229, 0.224, 0.225])
-            ])
+            self.backend = TorchBackend(model, self.device)
             
+            self.model_version = model_version
             self.model_loaded = True
             print("✅ Model loaded successfully")
             
@@ -126,6 +306,8 @@ class LightweightModelLoader:
             print(f"❌ Error loading model: {e}")
             self.model_loaded = False
             self.model = None
+            self.backend = None
+            self.model_version = None
         
     def check_model_file(self):
         """Check if model file exists and download if needed"""
@@ -144,6 +326,8 @@ class LightweightModelLoader:
         print(f"🔍 Checking for model file in: {current_dir}")
         for model_path in model_paths:
             if os.path.exists(model_path):
+                if not self.verify_model_file(model_path):
+                    continue
                 file_size = os.path.getsize(model_path)
                 print(f"✅ Model file found: {model_path} ({file_size / (1024*1024):.1f} MB)")
                 return model_path
@@ -165,10 +349,28 @@ class LightweightModelLoader:
         print("⚠️ Model file not found in any expected location")
         return None
     
+    def verify_model_file(self, model_path: str) -> bool:
+        """Reject a model file that fails MODEL_SHA256 or no longer matches its digest record"""
+        from model_download import cached_sha256, read_digest_record
+        
+        expected = os.getenv('MODEL_SHA256')
+        if expected:
+            # Hashed once, then validated against the recorded size and mtime
+            sha256 = cached_sha256(model_path)
+            if sha256 != expected.lower():
+                print(f"❌ Model file {model_path} has SHA-256 {sha256}, expected {expected.lower()}")
+                return False
+            return True
+        record = read_digest_record(model_path)
+        if record and record.get('size') != os.path.getsize(model_path):
+            print(f"❌ Model file {model_path} is {os.path.getsize(model_path)} bytes, recorded download was {record.get('size')}")
+            return False
+        return True
+    
     def download_model(self, model_url: str):
-        """Download model from URL"""
+        """Download model from URL with parallel ranges, resume and SHA-256 verification"""
         try:
-            import requests
+            from model_download import downloader_from_env
             
             # Determine download path
             download_path = 'sneaker_model_production.pth'
@@ -176,81 +378,61 @@ class LightweightModelLoader:
             print(f"📥 Downloading model from {model_url}...")
             print(f"💾 Saving to: {download_path}")
             
-            # Download with progress tracking
-            response = requests.get(model_url, stream=True)
-            response.raise_for_status()
-            
-            total_size = int(response.headers.get('content-length', 0))
-            downloaded = 0
-            
-            with open(download_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        if total_size > 0:
-                            progress = (downloaded / total_size) * 100
-                            if downloaded % (1024 * 1024) == 0:  # Print every MB
-                                print(f"📊 Download progress: {progress:.1f}% ({downloaded // (1024*1024)} MB)")
-            
-            print(f"✅ Model download completed: {downloaded // (1024*1024)} MB")
-            return download_path
+            # Partial downloads stay in a .part file until verified
+            return downloader_from_env(model_url, download_path).download()
             
         except Exception as e:
             print(f"❌ Error downloading model: {e}")
             return None
 
-    def predict(self, image: Image.Image):
+    def predict(self, image: 'Image.Image'):
         """Make prediction with memory cleanup"""
+        return self.predict_batch([image])[0]
+
+    def predict_batch(self, images):
+        """Run a single forward pass over a batch of images"""
         try:
             # Load model if not already loaded
             if not self.model_loaded:
                 self.load_model_lazily()
             
-            if not self.model_loaded or self.model is None:
+            if not self.model_loaded or self.backend is None:
                 # Fallback to simple image analysis
-                return self.simple_image_analysis(image)
+                return [self.simple_image_analysis(image) for image in images]
             
-            # Import torch here to ensure it's available
-            import torch
-            
-            # Preprocess image
-            img_tensor = self.transform(image).unsqueeze(0).to(self.device)
-            
-            # Get prediction
-            with torch.no_grad():
-                outputs = self.model(img_tensor)
-                probabilities = torch.nn.functional.softmax(outputs, dim=1)
-                confidence, predicted = torch.max(probabilities, 1)
-            
-            # Get result
-            class_names = ['fake', 'real']
-            result = class_names[predicted.item()]
-            confidence_score = confidence.item() * 100
-            
-            # Store probabilities before cleanup
-            fake_prob = probabilities[0][0].item() * 100
-            real_prob = probabilities[0][1].item() * 100
-            
-            # Clean up tensors to free memory
-            del img_tensor, outputs, probabilities, confidence, predicted
-            gc.collect()
-            
-            return {
-                'prediction': result,
-                'confidence': round(confidence_score, 2),
-                'fake_probability': round(fake_prob, 2),
-                'real_probability': round(real_prob, 2),
-                'method': 'ml_model'
-            }
+            # Preprocess into the reusable batch buffer and run one forward pass
+            with self.preprocessor.lock:
+                with pipeline_stage('preprocess'):
+                    batch = self.preprocessor.prepare(images)
+                return self.predict_prepared(batch)
             
         except Exception as e:
             print(f"Prediction error: {e}")
             # Fallback to simple analysis
-            return self.simple_image_analysis(image)
+            return [self.simple_image_analysis(image) for image in images]
     
-    def simple_image_analysis(self, image: Image.Image):
+    def predict_prepared(self, batch):
+        """Forward pass over an already normalized (N, 3, 224, 224) batch; the model must be loaded"""
+        with pipeline_stage('forward'):
+            probs = self.backend.predict_proba(batch).tolist()
+        
+        class_names = ['fake', 'real']
+        results = []
+        for fake_p, real_p in probs:
+            predicted = 0 if fake_p >= real_p else 1
+            results.append({
+                'prediction': class_names[predicted],
+                'confidence': round(max(fake_p, real_p) * 100, 2),
+                'fake_probability': round(fake_p * 100, 2),
+                'real_probability': round(real_p * 100, 2),
+                'method': 'ml_model'
+            })
+        return results
+    
+    def simple_image_analysis(self, image: 'Image.Image'):
         """Simple image analysis as fallback when model fails"""
+        import numpy as np
+        
         try:
             # Convert to numpy array for analysis
             img_array = np.array(image)
@@ -258,8 +440,8 @@ class LightweightModelLoader:
             # Simple heuristics based on image properties
             # These are just examples - you can implement more sophisticated analysis
             
-            # Check image dimensions
-            height, width = img_array.shape[:2]
+            # Check image dimensions (before any reduced-size decoding)
+            width, height = image.info.get('original_size', image.size)
             
             # Check brightness
             if len(img_array.shape) == 3:
@@ -336,8 +518,10 @@ def get_model_loader():
                 def __init__(self):
                     self.model_loaded = False
                     self.model = None
-                    self.transform = None
+                    self.backend = None
                     self.device = None
+                    self.model_path = None
+                    self.model_version = None
                 
                 def load_model_lazily(self):
                     print("⚠️ Using fallback mode - model loader failed to initialize")
@@ -351,11 +535,296 @@ def get_model_loader():
                         'real_probability': 50,
                         'method': 'fallback_mode'
                     }
+                
+                def predict_batch(self, images):
+                    return [self.predict(image) for image in images]
             
             model_loader = FallbackModelLoader()
     
     return model_loader
 
+# Micro-batching scheduler shared by all prediction requests
+batcher = None
+
+def get_batcher():
+    """Get or create the micro-batcher feeding the model loader"""
+    global batcher
+    if batcher is None:
+        batcher = batcher_from_env(lambda images: get_model_loader().predict_batch(images))
+        print(f"✅ Micro-batcher initialized (max batch {batcher.max_batch_size}, max wait {batcher.max_wait_ms} ms)")
+    return batcher
+
+# Bounded pool for decode, preprocessing and inference
+inference_executor = None
+
+def get_inference_executor():
+    """Get or create the bounded executor used for blocking prediction work"""
+    global inference_executor
+    if inference_executor is None:
+        # Enough workers to fill a whole batch while others wait on the batcher
+        inference_executor = executor_from_env(default_workers=get_batcher().max_batch_size)
+        print(f"✅ Inference executor initialized ({inference_executor.max_workers} workers, {inference_executor.max_pending} queued)")
+    return inference_executor
+
+class InvalidImageError(Exception):
+    """Raised when uploaded bytes cannot be decoded as an image"""
+
+# Result cache keyed by upload content hash
+prediction_cache = None
+
+def get_prediction_cache():
+    """Get or create the content-addressed prediction cache"""
+    global prediction_cache
+    if prediction_cache is None:
+        prediction_cache = cache_from_env()
+        print(f"✅ Prediction cache initialized ({prediction_cache.max_entries} entries)")
+    return prediction_cache
+
+# Perceptual-hash index for re-encoded copies of already scored photos
+near_duplicate_index = None
+
+def get_near_duplicate_index():
+    """Get or create the near-duplicate perceptual hash index"""
+    global near_duplicate_index
+    if near_duplicate_index is None:
+        near_duplicate_index = index_from_env()
+        print(f"✅ Near-duplicate index initialized (max distance {near_duplicate_index.max_distance})")
+    return near_duplicate_index
+
+def run_prediction_pipeline(contents, cache_key: str = None, deadline=None):
+    """Decode an upload (bytes or a spooled file) and score it; runs inside the inference executor"""
+    from image_decode import decode_image
+    
+    if deadline is not None:
+        # Waited in the executor queue past the deadline, or the client left
+        deadline.check('decode')
+    try:
+        with pipeline_stage('decode'):
+            image = decode_image(contents)
+    except Exception as img_error:
+        raise InvalidImageError(str(img_error)) from img_error
+    
+    model_version = get_model_loader().model_version
+    image_hash = dhash(image)
+    match = get_near_duplicate_index().lookup(image_hash, model_version)
+    if match is not None:
+        result, distance = match
+        result['near_duplicate'] = True
+        result['hamming_distance'] = distance
+        return result
+    
+    if deadline is None:
+        result = get_batcher().submit(image).result()
+    else:
+        # The batcher drops the image if the deadline passes while it is queued
+        future = get_batcher().submit(image, deadline)
+        try:
+            result = future.result(timeout=deadline.remaining())
+        except FutureTimeoutError:
+            raise DeadlineExceeded('deadline', 'forward')
+    
+    if result.get('method') == 'ml_model':
+        # The model may have been loaded by this very request
+        model_version = get_model_loader().model_version
+        get_near_duplicate_index().add(image_hash, result, model_version)
+        if cache_key:
+            get_prediction_cache().put(cache_key, result, model_version)
+    
+    return result
+
+async def score_contents(contents, cache_key: str = None, deadline=None):
+    """Score raw upload bytes or a spooled upload, answering repeat submissions from the cache"""
+    cache_key = cache_key or content_key(contents)
+    cached_result = get_prediction_cache().get(cache_key, get_model_loader().model_version)
+    if cached_result is not None:
+        cached_result['cached'] = True
+        return cached_result
+    
+    if deadline is None:
+        return await get_inference_executor().run(run_prediction_pipeline, contents, cache_key)
+    
+    deadline.check('decode')
+    try:
+        return await asyncio.wait_for(
+            get_inference_executor().run(run_prediction_pipeline, contents, cache_key, deadline),
+            deadline.remaining()
+        )
+    except asyncio.TimeoutError:
+        # Queued work is cancelled; running work stops at its next deadline check
+        raise DeadlineExceeded('deadline', 'response')
+
+# Background memory governor replacing per-request garbage collection
+memory_governor = None
+
+def get_memory_governor():
+    """Get or create the memory governor, with the caches and batcher it may shrink"""
+    global memory_governor
+    if memory_governor is None:
+        governor = governor_from_env(memory_optimizer)
+        # Size the inference pool for the full batch before the batch size can shrink
+        get_inference_executor()
+        cache = get_prediction_cache()
+        governor.register_capacity('prediction_cache', cache.resize, cache.max_entries)
+        index = get_near_duplicate_index()
+        governor.register_capacity('near_duplicate_index', index.resize, index.max_entries)
+        micro_batcher = get_batcher()
+        governor.register_capacity('max_batch_size', lambda size: setattr(micro_batcher, 'max_batch_size', size),
+                                   micro_batcher.max_batch_size, minimum=1)
+        memory_governor = governor
+        thresholds = governor.get_thresholds()
+        if thresholds['source'] == 'auto':
+            print(f"✅ Memory governor initialized (thresholds calibrated once the model is loaded"
+                  + (f", container limit {thresholds['memory_limit_mb']:.0f} MB)" if thresholds['memory_limit_mb'] else ")"))
+        else:
+            print(f"✅ Memory governor initialized (warning {thresholds['warning_mb']:.0f} MB, "
+                  f"critical {thresholds['critical_mb']:.0f} MB)")
+    return memory_governor
+
+def calibrate_memory_governor():
+    """Base the governor's thresholds on the current RSS, if the governor is running"""
+    if memory_governor is not None:
+        try:
+            memory_governor.calibrate()
+        except Exception as e:
+            print(f"⚠️ Memory threshold calibration failed: {e}")
+
+# Admission control in front of the upload endpoints
+admission_controller = None
+
+def get_admission_controller():
+    """Get or create the admission controller, memory-aware via the governor if enabled"""
+    global admission_controller
+    if admission_controller is None:
+        admission_controller = admission_from_env(
+            memory_level=lambda: get_memory_governor().level,
+            on_reject=lambda reason: ADMISSION_REJECTED.inc(reason=reason)
+        )
+        stats = admission_controller.get_stats()
+        print(f"✅ Admission control initialized ({stats['max_concurrent']} concurrent, {stats['max_queue']} queued"
+              + (", memory-aware" if stats['memory_aware'] else "") + ")")
+    return admission_controller
+
+# Offline scoring jobs, persisted under JOBS_DIR
+job_store = None
+job_worker = None
+
+def get_job_store():
+    """Get or create the persistent job store"""
+    global job_store
+    if job_store is None:
+        job_store = JobStore()
+        print(f"✅ Job store initialized at: {job_store.db_path}")
+    return job_store
+
+jobs_recovered = False
+
+def recover_jobs_once():
+    """Re-queue items left running by a previous run, once per deployment"""
+    global jobs_recovered
+    if not jobs_recovered:
+        recover_unfinished(get_job_store())
+        jobs_recovered = True
+
+def ensure_job_worker():
+    """Start the in-process job worker unless workers run as separate processes"""
+    global job_worker
+    if os.getenv('JOBS_WORKER', 'inline').lower() != 'inline':
+        return
+    if job_worker is None:
+        store = get_job_store()
+        recover_jobs_once()
+        job_worker = JobWorker(
+            store,
+            lambda images: get_model_loader().predict_batch(images),
+            batch_size=get_batcher().max_batch_size,
+            poll_interval=float(os.getenv('JOBS_POLL_INTERVAL', 1.0))
+        )
+        print("✅ Job worker started")
+    job_worker.start()
+
+# Model readiness, reported by /api/ready
+model_readiness = {
+    'status': 'not_loaded',
+    'backend': None,
+    'import_seconds': None,
+    'load_seconds': None,
+    'warmup_seconds': None,
+    'warmup_batch_sizes': [],
+    'error': None
+}
+
+def warmup_batch_sizes():
+    """Batch sizes to run warm-up passes at (WARMUP_BATCH_SIZES, default 1 and the max batch)"""
+    configured = os.getenv('WARMUP_BATCH_SIZES')
+    if configured:
+        return sorted({int(size) for size in configured.split(',') if size.strip()})
+    # The configured size, not the live one the memory governor may have lowered
+    return sorted({1, get_batcher().configured_max_batch_size})
+
+def warm_up_imports():
+    """Import the inference stack (NumPy, PIL, torch, torchvision) off the request path"""
+    started = time.perf_counter()
+    try:
+        import numpy  # noqa: F401
+        import torch  # noqa: F401
+        import torchvision.models  # noqa: F401
+        import image_decode  # noqa: F401
+        import preprocessing  # noqa: F401
+        import inference_backends  # noqa: F401
+    except ImportError as e:
+        print(f"⚠️ Import warm-up incomplete: {e}")
+    model_readiness['import_seconds'] = round(time.perf_counter() - started, 3)
+    print(f"✅ Inference imports loaded in {model_readiness['import_seconds']}s")
+
+def warm_up_model():
+    """Load the model and run warm-up forward passes at each served batch size"""
+    from PIL import Image
+    
+    try:
+        loader = get_model_loader()
+        model_readiness['status'] = 'loading'
+        warm_up_imports()
+        started = time.perf_counter()
+        loader.load_model_lazily()
+        model_readiness['load_seconds'] = round(time.perf_counter() - started, 3)
+        
+        if not loader.model_loaded:
+            model_readiness['status'] = 'fallback'
+            model_readiness['error'] = 'Model failed to load, serving heuristic analysis'
+            calibrate_memory_governor()
+            print("⚠️ Model not loaded - ready in fallback mode")
+            return
+        
+        model_readiness['status'] = 'warming_up'
+        model_readiness['backend'] = getattr(loader.backend, 'name', None)
+        started = time.perf_counter()
+        for batch_size in warmup_batch_sizes():
+            dummy_images = [Image.new('RGB', (224, 224), (128, 128, 128)) for _ in range(batch_size)]
+            loader.predict_batch(dummy_images)
+            model_readiness['warmup_batch_sizes'].append(batch_size)
+        model_readiness['warmup_seconds'] = round(time.perf_counter() - started, 3)
+        # Warm-up allocations are part of the steady-state footprint
+        calibrate_memory_governor()
+        model_readiness['status'] = 'ready'
+        print(f"✅ Model ready (load {model_readiness['load_seconds']}s, warm-up {model_readiness['warmup_seconds']}s)")
+    except Exception as e:
+        print(f"❌ Model warm-up failed: {e}")
+        model_readiness.update(status='failed', error=str(e))
+
+def start_model_warmup():
+    """Load and warm up the model on a background thread so startup stays fast"""
+    threading.Thread(target=warm_up_model, name='model-warmup', daemon=True).start()
+
+def preload_for_workers():
+    """Load shared state in the pre-fork parent so workers inherit it copy-on-write"""
+    global jobs_recovered
+    get_model_loader().load_model_lazily()
+    # Settle recovery here so forked workers never re-queue each other's items;
+    # with no jobs database yet there is nothing left running to recover
+    if jobs_exist():
+        recover_jobs_once()
+    jobs_recovered = True
+
 print("✅ Model loader system initialized (lazy loading enabled)")
 
 # Mount static files for frontend (but NOT at root to avoid route conflicts)
@@ -371,7 +840,7 @@ try:
     for frontend_path in frontend_paths:
         if os.path.exists(frontend_path):
             # Mount static files at /static to avoid conflicts with API routes
-            app.mount("/static", StaticFiles(directory=frontend_path), name="static")
+            app.mount("/static", PrecompressedStaticFiles(directory=frontend_path), name="static")
             print(f"✅ Static files mounted successfully from: {frontend_path} at /static")
             frontend_mounted = True
             break
@@ -381,7 +850,7 @@ try:
     public_mounted = False
     for public_path in public_paths:
         if os.path.exists(public_path):
-            app.mount("/public", StaticFiles(directory=public_path), name="public")
+            app.mount("/public", PrecompressedStaticFiles(directory=public_path, immutable_prefixes=()), name="public")
             print(f"✅ Public assets mounted successfully from: {public_path}")
             public_mounted = True
             break
@@ -393,26 +862,25 @@ try:
 except Exception as e:
     print(f"⚠️ Could not mount static files: {e}")
 
+# index.html rewritten for /static and held in memory with compressed variants;
+# built here so pre-forked workers share it
+spa_shell = SpaShell(["dist", "frontend/dist", "../frontend/dist"],
+                     recheck_interval=float(os.getenv('SPA_SHELL_RECHECK_SECONDS', 2)))
+try:
+    spa_shell.refresh(force=True)
+except Exception as e:
+    print(f"⚠️ Could not cache SPA shell: {e}")
+
 # Note: Catch-all route moved to the END after all specific routes
 
 @app.get("/")
-async def root():
+async def root(request: Request):
     """Root endpoint serves the frontend application"""
-    print(f"🌐 Root endpoint accessed - Serving frontend from: {os.getcwd()}")
-    
-    # Try to serve the frontend index.html
+    # Try to serve the cached frontend index.html
     try:
-        # Check if we have frontend files
-        frontend_paths = ["dist", "frontend/dist", "../frontend/dist"]
-        for frontend_path in frontend_paths:
-            index_path = os.path.join(frontend_path, "index.html")
-            if os.path.exists(index_path):
-                with open(index_path, 'r') as f:
-                    html_content = f.read()
-                # Update asset paths to use /static prefix
-                html_content = html_content.replace('src="/assets/', 'src="/static/assets/')
-                html_content = html_content.replace('href="/assets/', 'href="/static/assets/')
-                return HTMLResponse(content=html_content, media_type="text/html")
+        shell_response = spa_shell.response(request.headers)
+        if shell_response is not None:
+            return shell_response
         
         # Fallback: return a simple HTML with API info if no frontend found
         fallback_html = f"""
@@ -495,54 +963,97 @@ async def api_info():
         "timestamp": str(datetime.datetime.now()),
         "endpoints": {
             "health": "/api/health",
+            "ready": "/api/ready",
+            "metrics": "/api/metrics",
+            "memory": "/api/memory",
             "predict": "/api/predict",
+            "predict_batch": "/api/predict/batch",
+            "jobs": "/api/jobs",
             "documentation": "/docs"
         },
         "usage": {
             "health_check": "GET /api/health",
-            "predict_sneaker": "POST /api/predict (with image file)"
+            "readiness_check": "GET /api/ready",
+            "predict_sneaker": "POST /api/predict (with image file)",
+            "predict_listing": "POST /api/predict/batch (with several image files or a zip/tar archive)",
+            "offline_job": "POST /api/jobs (with image files), then GET /api/jobs/{id} and /api/jobs/{id}/results"
         }
     }
 
-@app.post("/api/predict")
-async def predict(file: UploadFile = File(...)):
+# The upload is parsed from the request stream, so describe the form for /docs
+PREDICT_REQUEST_BODY = {
+    'requestBody': {
+        'required': True,
+        'content': {
+            'multipart/form-data': {
+                'schema': {
+                    'type': 'object',
+                    'properties': {'file': {'type': 'string', 'format': 'binary'}},
+                    'required': ['file']
+                }
+            }
+        }
+    }
+}
+
+@app.post("/api/predict", openapi_extra=PREDICT_REQUEST_BODY)
+async def predict(request: Request):
     try:
-        # Validate file type
-        if not file.content_type.startswith('image/'):
-            return JSONResponse(
-                content={'error': 'File must be an image'},
-                status_code=400
-            )
-        
-        # Read image
-        contents = await file.read()
+        with REQUEST_SECONDS.time(endpoint='predict'):
+            return await predict_single(request)
+    finally:
+        note_request()
+
+async def predict_single(request: Request):
+    try:
+        try:
+            deadline = deadline_from_request(request)
+        except ValueError as timeout_error:
+            return JSONResponse(content={'error': str(timeout_error)}, status_code=400)
         
-        if not contents:
+        # Stream the upload into a spool, rejecting oversized or non-image payloads early
+        try:
+            with STAGE_SECONDS.time(stage='upload_read'):
+                upload = await ingest_upload(request, 'file')
+        except UploadRejected as rejected:
+            PREDICTIONS.inc(endpoint='predict', outcome='rejected')
             return JSONResponse(
-                content={'error': 'Empty file received'},
-                status_code=400
+                content={'error': str(rejected)},
+                status_code=rejected.status_code
             )
         
+        # Decode and predict in the inference pool, off the event loop
         try:
-            image = Image.open(io.BytesIO(contents)).convert('RGB')
-        except Exception as img_error:
+            print(f"🔍 Starting prediction for image: {upload.filename} ({upload.format} {upload.dimensions[0]}x{upload.dimensions[1]}, {upload.size} bytes)")
+            async with watch_disconnect(request, deadline):
+                result = await score_contents(upload.file, cache_key=upload.sha256, deadline=deadline)
+            print(f"✅ Prediction successful: {result}")
+            observe_prediction('predict', result)
+            
+            with pipeline_stage('serialize'):
+                return JSONResponse(content=result)
+        except ExecutorSaturated as busy_error:
+            print(f"⚠️ Inference pool saturated: {busy_error}")
+            PREDICTIONS.inc(endpoint='predict', outcome='busy')
+            return JSONResponse(
+                content={'error': 'Server is busy, please retry shortly'},
+                status_code=503,
+                headers={'Retry-After': '1'}
+            )
+        except DeadlineExceeded as dropped:
+            # 499 (client closed request) is only seen in logs; the client is gone
+            return JSONResponse(
+                content=cut_short_result('predict', dropped),
+                status_code=499 if dropped.reason == 'disconnected' else 504
+            )
+        except InvalidImageError as img_error:
+            PREDICTIONS.inc(endpoint='predict', outcome='invalid_image')
             return JSONResponse(
                 content={'error': f'Invalid image format: {str(img_error)}'},
                 status_code=400
             )
-        
-        # Get prediction
-        try:
-            print(f"🔍 Starting prediction for image: {file.filename}")
-            result = get_model_loader().predict(image)
-            print(f"✅ Prediction successful: {result}")
-            
-            # Clean up image to free memory
-            del image, contents
-            gc.collect()
-            
-            return JSONResponse(content=result)
         except Exception as pred_error:
+            PREDICTIONS.inc(endpoint='predict', outcome='error')
             print(f"❌ Prediction error: {pred_error}")
             print(f"❌ Error type: {type(pred_error).__name__}")
             import traceback
@@ -551,6 +1062,8 @@ async def predict(file: UploadFile = File(...)):
                 content={'error': f'Model prediction failed: {str(pred_error)}'},
                 status_code=500
             )
+        finally:
+            upload.close()
     
     except Exception as e:
         print(f"Unexpected error in predict endpoint: {e}")
@@ -559,6 +1072,281 @@ async def predict(file: UploadFile = File(...)):
             status_code=500
         )
 
+@app.post("/api/predict/batch")
+async def predict_listing(request: Request, files: List[UploadFile] = File(...)):
+    """Score every photo of a listing, given as several files or a zip/tar archive"""
+    try:
+        with REQUEST_SECONDS.time(endpoint='predict_batch'):
+            return await predict_listing_files(request, files)
+    finally:
+        note_request()
+
+async def predict_listing_files(request: Request, files: List[UploadFile]):
+    try:
+        try:
+            deadline = deadline_from_request(request)
+        except ValueError as timeout_error:
+            return JSONResponse(content={'error': str(timeout_error)}, status_code=400)
+        
+        limit = max_batch_images()
+        budget = ByteBudget()
+        uploads = []
+        # Archive members that are not images, reported alongside the results
+        skipped = []
+        for file in files:
+            archive = is_archive(file.filename, file.content_type)
+            try:
+                with STAGE_SECONDS.time(stage='upload_read'):
+                    # An archive may use the rest of the budget, a single image one image's worth
+                    contents = await read_upload(
+                        file, budget.remaining if archive else min(budget.max_item_bytes, budget.remaining)
+                    )
+                if archive:
+                    try:
+                        # Archive members carry no content type and are validated on decode;
+                        # inflating them is CPU-bound, so keep it off the event loop
+                        members = await asyncio.to_thread(
+                            expand_archive, contents, limit + 1 - len(uploads), budget, skipped
+                        )
+                    except BatchTooLarge:
+                        raise
+                    except Exception as archive_error:
+                        return JSONResponse(
+                            content={'error': f'Invalid archive {file.filename}: {str(archive_error)}'},
+                            status_code=400
+                        )
+                    uploads.extend((name, None, data) for name, data in members)
+                else:
+                    budget.take(file.filename, len(contents))
+                    uploads.append((file.filename, file.content_type, contents))
+            except BatchTooLarge as too_large:
+                PREDICTIONS.inc(endpoint='predict_batch', outcome='rejected')
+                return JSONResponse(content={'error': str(too_large)}, status_code=413)
+            
+            if len(uploads) > limit:
+                return JSONResponse(
+                    content={'error': f'Too many images, at most {limit} per request'},
+                    status_code=400
+                )
+        
+        if not uploads:
+            return JSONResponse(
+                content={'error': 'No images received', 'skipped': skipped},
+                status_code=400
+            )
+        
+        async def score_one(filename, content_type, contents):
+            if content_type is not None and not content_type.startswith('image/'):
+                PREDICTIONS.inc(endpoint='predict_batch', outcome='rejected')
+                return {'filename': filename, 'error': 'File must be an image'}
+            if not contents:
+                PREDICTIONS.inc(endpoint='predict_batch', outcome='rejected')
+                return {'filename': filename, 'error': 'Empty file received'}
+            try:
+                result = await score_contents(contents, deadline=deadline)
+            except DeadlineExceeded as dropped:
+                return {'filename': filename, **cut_short_result('predict_batch', dropped)}
+            except ExecutorSaturated:
+                PREDICTIONS.inc(endpoint='predict_batch', outcome='busy')
+                return {'filename': filename, 'error': 'Server is busy, please retry shortly'}
+            except InvalidImageError as img_error:
+                PREDICTIONS.inc(endpoint='predict_batch', outcome='invalid_image')
+                return {'filename': filename, 'error': f'Invalid image format: {str(img_error)}'}
+            except Exception as pred_error:
+                PREDICTIONS.inc(endpoint='predict_batch', outcome='error')
+                print(f"❌ Prediction error for {filename}: {pred_error}")
+                return {'filename': filename, 'error': f'Model prediction failed: {str(pred_error)}'}
+            observe_prediction('predict_batch', result)
+            return {'filename': filename, **result}
+        
+        print(f"🔍 Starting batch prediction for {len(uploads)} images")
+        async with watch_disconnect(request, deadline):
+            results = await asyncio.gather(*[score_one(*upload) for upload in uploads])
+        
+        with pipeline_stage('serialize'):
+            # The aggregate only covers the images scored before the deadline
+            return JSONResponse(content={
+                'results': results,
+                'skipped': skipped,
+                'aggregate': aggregate_results(results),
+                'cut_short': any(result.get('cut_short') for result in results)
+            })
+    
+    except Exception as e:
+        print(f"Unexpected error in batch predict endpoint: {e}")
+        return JSONResponse(
+            content={'error': f'Server error: {str(e)}'},
+            status_code=500
+        )
+
+@app.post("/api/jobs")
+async def create_job(files: List[UploadFile] = File(...)):
+    """Queue images (or zip/tar archives of images) for offline scoring"""
+    try:
+        limit = int(os.getenv('MAX_JOB_IMAGES', 10000))
+        # Every image counts towards the job's total; archives are expanded in
+        # memory before being written to the job directory, so they get a smaller one
+        budget = ByteBudget(max_total_bytes=int(os.getenv('MAX_JOB_UPLOAD_BYTES', 1024 * 1024 * 1024)))
+        archive_budget = ByteBudget(max_total_bytes=int(os.getenv('MAX_JOB_ARCHIVE_BYTES', 128 * 1024 * 1024)))
+        uploads = []
+        skipped = []
+        for file in files:
+            if is_archive(file.filename, file.content_type):
+                try:
+                    contents = await read_upload(file, min(archive_budget.remaining, budget.remaining))
+                    members = await asyncio.to_thread(
+                        expand_archive, contents, limit + 1 - len(uploads), archive_budget, skipped
+                    )
+                except BatchTooLarge as too_large:
+                    return JSONResponse(content={'error': str(too_large)}, status_code=413)
+                except Exception as archive_error:
+                    return JSONResponse(
+                        content={'error': f'Invalid archive {file.filename}: {str(archive_error)}'},
+                        status_code=400
+                    )
+                images = [(name, data, len(data)) for name, data in members]
+            else:
+                # Spooled upload files are copied to disk without reading them into memory
+                size = file.file.seek(0, os.SEEK_END)
+                file.file.seek(0)
+                images = [(file.filename, file.file, size)]
+            
+            try:
+                for name, _, size in images:
+                    budget.take(name, size)
+            except BatchTooLarge as too_large:
+                return JSONResponse(content={'error': str(too_large)}, status_code=413)
+            uploads.extend((name, source) for name, source, _ in images)
+            
+            if len(uploads) > limit:
+                return JSONResponse(
+                    content={'error': f'Too many images, at most {limit} per job'},
+                    status_code=400
+                )
+        
+        if not uploads:
+            return JSONResponse(
+                content={'error': 'No images received', 'skipped': skipped},
+                status_code=400
+            )
+        
+        store = get_job_store()
+        job = await asyncio.to_thread(store.create_job, uploads)
+        ensure_job_worker()
+        print(f"📥 Job {job['job_id']} queued with {job['total']} images")
+        
+        return JSONResponse(content={
+            **job,
+            'skipped': skipped,
+            'status_url': f"/api/jobs/{job['job_id']}",
+            'results_url': f"/api/jobs/{job['job_id']}/results"
+        }, status_code=202)
+    
+    except Exception as e:
+        print(f"Unexpected error creating job: {e}")
+        return JSONResponse(
+            content={'error': f'Server error: {str(e)}'},
+            status_code=500
+        )
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, offset: int = 0, limit: int = 100):
+    """Return job progress and a page of finished results"""
+    store = get_job_store()
+    job = await asyncio.to_thread(store.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    job['results'] = await asyncio.to_thread(store.list_results, job_id, max(0, offset), max(0, min(limit, 1000)))
+    return job
+
+@app.get("/api/jobs/{job_id}/results")
+async def download_job_results(job_id: str):
+    """Stream all finished results of a job as JSON lines"""
+    store = get_job_store()
+    job = await asyncio.to_thread(store.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    def result_lines():
+        for result in store.iter_results(job_id):
+            yield json.dumps(result) + "\n"
+    
+    return StreamingResponse(
+        result_lines(),
+        media_type="application/x-ndjson",
+        headers={'Content-Disposition': f'attachment; filename="{job_id}.jsonl"'}
+    )
+
+@app.get("/api/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics in the text exposition format"""
+    return Response(content=metrics.render(), media_type=metrics.content_type)
+
+def check_admin_token(token: str):
+    """Reject admin requests unless ADMIN_TOKEN is configured and matches"""
+    expected = os.getenv('ADMIN_TOKEN')
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not token or not hmac.compare_digest(token.encode(), expected.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.post("/api/admin/profile")
+async def profile(seconds: float = 10.0, requests: int = 0, interval_ms: float = 5.0,
+                  include_idle: bool = False, x_admin_token: str = Header(None)):
+    """Sample this worker's stacks for a while and return collapsed stacks for a flamegraph"""
+    check_admin_token(x_admin_token)
+    max_seconds = float(os.getenv('PROFILE_MAX_SECONDS', 120))
+    seconds = max(0.1, min(seconds, max_seconds))
+    
+    profiler = SamplingProfiler(interval=interval_ms / 1000.0, include_idle=include_idle)
+    print(f"🔬 Profiling worker {os.getpid()} for up to {seconds:.1f}s" + (f" or {requests} requests" if requests else ""))
+    try:
+        collapsed = await asyncio.to_thread(profiler.run, seconds, requests)
+    except ProfilerBusy as busy_error:
+        raise HTTPException(status_code=409, detail=str(busy_error))
+    
+    print(f"✅ Profile finished: {profiler.samples} samples, {profiler.requests} requests, stages {profiler.stage_totals()}")
+    filename = f"profile-{os.getpid()}-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.folded"
+    return Response(
+        content=collapsed,
+        media_type='text/plain; charset=utf-8',
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'X-Profile-Samples': str(profiler.samples),
+            'X-Profile-Requests': str(profiler.requests),
+            'X-Profile-Seconds': f'{profiler.duration:.3f}',
+            'X-Profile-Pid': str(os.getpid())
+        }
+    )
+
+@app.get("/api/memory")
+async def memory_status():
+    """Current memory usage and the memory governor's recent decisions"""
+    return {
+        "memory": memory_optimizer.get_memory_info(),
+        "governor": get_memory_governor().get_stats(),
+        "timestamp": str(datetime.datetime.now())
+    }
+
+@app.get("/api/ready")
+async def ready():
+    """Readiness probe: 200 once the model is loaded and warmed up, or once serving degraded
+
+    A failed load or warm-up still serves the heuristic fallback, so it
+    reports ready (with ``degraded``) rather than failing health checks forever.
+    """
+    is_ready = model_readiness['status'] in ('ready', 'fallback', 'lazy', 'failed')
+    return JSONResponse(
+        content={
+            "ready": is_ready,
+            "degraded": model_readiness['status'] in ('fallback', 'failed'),
+            **model_readiness,
+            "timestamp": str(datetime.datetime.now())
+        },
+        status_code=200 if is_ready else 503
+    )
+
 @app.get("/api/health")
 async def health():
     try:
@@ -592,9 +1380,17 @@ async def health():
             "model_status": model_status,
             "model_path": actual_path,
             "loader_status": loader_status,
+            "model_readiness": model_readiness['status'],
             "working_directory": os.getcwd(),
             "timestamp": str(datetime.datetime.now()),
-            "memory_optimized": True
+            "memory_optimized": True,
+            "batching": get_batcher().get_stats(),
+            "inference_executor": get_inference_executor().get_stats(),
+            "prediction_cache": get_prediction_cache().get_stats(),
+            "near_duplicate_index": get_near_duplicate_index().get_stats(),
+            "memory_governor": get_memory_governor().level,
+            "admission": get_admission_controller().get_stats(),
+            "worker": {"pid": os.getpid(), **worker_memory([os.getpid()]).get(os.getpid(), {})}
         }
     except Exception as e:
         # Return a basic health response even if there are errors
@@ -607,7 +1403,7 @@ async def health():
 
 # Add catch-all route for SPA routing (must come AFTER all specific routes)
 @app.get("/{full_path:path}")
-async def catch_all(full_path: str):
+async def catch_all(full_path: str, request: Request):
     """Catch-all route for SPA routing - serves frontend for any non-API route"""
     # Skip API routes
     if full_path.startswith("api/"):
@@ -619,16 +1415,9 @@ async def catch_all(full_path: str):
     
     # For all other routes, serve the frontend (SPA routing)
     try:
-        frontend_paths = ["dist", "frontend/dist", "../frontend/dist"]
-        for frontend_path in frontend_paths:
-            index_path = os.path.join(frontend_path, "index.html")
-            if os.path.exists(index_path):
-                with open(index_path, 'r') as f:
-                    html_content = f.read()
-                # Update asset paths to use /static prefix
-                html_content = html_content.replace('src="/assets/', 'src="/static/assets/')
-                html_content = html_content.replace('href="/assets/', 'href="/static/assets/')
-                return HTMLResponse(content=html_content, media_type="text/html")
+        shell_response = spa_shell.response(request.headers)
+        if shell_response is not None:
+            return shell_response
         
         # Fallback
         raise HTTPException(status_code=404, detail="Frontend not available")
@@ -649,15 +1438,21 @@ if __name__ == "__main__":
     print(f"🔌 Environment PORT: {os.getenv('PORT', 'Not set')}")
     print(f"🌍 Server will be accessible at: http://0.0.0.0:{port}")
     
+    # Several workers share one copy of the model weights via fork copy-on-write
+    workers = int(os.getenv('WEB_CONCURRENCY', 1))
+    
     try:
-        # Ensure we bind to all interfaces for Render
-        uvicorn.run(
-            app, 
-            host="0.0.0.0", 
-            port=port,
-            log_level="info",
-            access_log=True
-        )
+        if workers > 1:
+            PreforkServer(app, "0.0.0.0", port, workers, preload=preload_for_workers).run()
+        else:
+            # Ensure we bind to all interfaces for Render
+            uvicorn.run(
+                app, 
+                host="0.0.0.0", 
+                port=port,
+                log_level="info",
+                access_log=True
+            )
     except Exception as e:
         print(f"❌ Failed to start server: {e}")
         raise
\ No newline at end of file
@@ -0,0 +1,168 @@
+"""
+Helpers for the multi-image /api/predict/batch endpoint.
+
+Uploads are read in chunks and archive members are checked against their
+declared size before extraction, so no single image may exceed
+MAX_UPLOAD_BYTES and a request may not expand to more than
+MAX_BATCH_UPLOAD_BYTES (default 64 MB) in total; a zip bomb or an
+oversized part is refused with 413 before it is held in memory. Archive
+members are picked by sniffing their leading bytes, like single uploads,
+so any format PIL can open is scored whatever its extension.
+"""
+
+import io
+import os
+import tarfile
+import zipfile
+from typing import Any, Dict, List, Optional, Tuple
+
+from upload_ingest import SIGNATURE_BYTES, max_upload_bytes, sniff_format
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz')
+
+
+# Chunk size for reading spooled uploads
+READ_CHUNK_BYTES = 1024 * 1024
+
+
+class BatchTooLarge(Exception):
+    """Raised when an upload or archive member exceeds the size limits"""
+
+
+def max_batch_images() -> int:
+    return int(os.getenv('MAX_BATCH_IMAGES', 32))
+
+
+def max_batch_bytes() -> int:
+    return int(os.getenv('MAX_BATCH_UPLOAD_BYTES', 64 * 1024 * 1024))
+
+
+class ByteBudget:
+    """Per-image and per-request byte limits for one batch request"""
+
+    def __init__(self, max_item_bytes: int = None, max_total_bytes: int = None):
+        self.max_item_bytes = max_item_bytes if max_item_bytes is not None else max_upload_bytes()
+        self.max_total_bytes = max_total_bytes if max_total_bytes is not None else max_batch_bytes()
+        self.used = 0
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.max_total_bytes - self.used)
+
+    def take(self, name: str, size: int):
+        """Account for an image of ``size`` bytes, or raise BatchTooLarge"""
+        if size > self.max_item_bytes:
+            raise BatchTooLarge(f'{name} is {size} bytes, over the limit of {self.max_item_bytes} bytes per image')
+        if size > self.remaining:
+            raise BatchTooLarge(f'Request images exceed the limit of {self.max_total_bytes} bytes in total')
+        self.used += size
+
+
+async def read_upload(file, max_bytes: int, chunk_size: int = READ_CHUNK_BYTES) -> bytes:
+    """Read an UploadFile in chunks, raising BatchTooLarge past ``max_bytes``"""
+    chunks = []
+    total = 0
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            return b''.join(chunks)
+        total += len(chunk)
+        if total > max_bytes:
+            raise BatchTooLarge(f'{file.filename} exceeds the {max_bytes} bytes allowed for it in this request')
+        chunks.append(chunk)
+
+
+def is_archive(filename: str, content_type: str) -> bool:
+    """Return True for zip/tar uploads that should be expanded into images"""
+    name = (filename or '').lower()
+    return name.endswith(ARCHIVE_EXTENSIONS) or content_type in (
+        'application/zip', 'application/x-zip-compressed',
+        'application/x-tar', 'application/gzip', 'application/x-gzip',
+    )
+
+
+def _read_image_member(name: str, member, size: int, budget: ByteBudget) -> Optional[bytes]:
+    """Read an archive member if its leading bytes are an image, else None
+
+    The declared size is charged to ``budget`` once the member is known to
+    be an image and before the rest of it is read.
+    """
+    head = member.read(SIGNATURE_BYTES)
+    if sniff_format(head) is None:
+        return None
+    budget.take(name, size)
+    return head + member.read()
+
+
+def expand_archive(contents: bytes, limit: int, budget: ByteBudget = None,
+                   skipped: List[str] = None) -> List[Tuple[str, bytes]]:
+    """Extract up to ``limit`` image members from a zip or tar archive
+
+    Members that are not images are left out and their names appended to
+    ``skipped``.
+    """
+    members: List[Tuple[str, bytes]] = []
+    buffer = io.BytesIO(contents)
+    budget = budget or ByteBudget()
+    skipped = skipped if skipped is not None else []
+
+    if zipfile.is_zipfile(buffer):
+        with zipfile.ZipFile(buffer) as archive:
+            for info in archive.infolist():
+                if len(members) >= limit:
+                    break
+                if info.is_dir():
+                    continue
+                # zipfile never returns more than the declared file_size
+                with archive.open(info) as member:
+                    data = _read_image_member(info.filename, member, info.file_size, budget)
+                if data is None:
+                    skipped.append(info.filename)
+                else:
+                    members.append((info.filename, data))
+        return members
+
+    buffer.seek(0)
+    with tarfile.open(fileobj=buffer, mode='r:*') as archive:
+        for info in archive:
+            if len(members) >= limit:
+                break
+            if not info.isfile():
+                continue
+            extracted = archive.extractfile(info)
+            data = _read_image_member(info.name, extracted, info.size, budget) if extracted is not None else None
+            if data is None:
+                skipped.append(info.name)
+            else:
+                members.append((info.name, data))
+    return members
+
+
+def aggregate_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine per-image results into a listing-level verdict
+
+    Averages the class probabilities of every successfully scored image.
+    """
+    scored = [r for r in results if 'fake_probability' in r and 'error' not in r]
+    if not scored:
+        return {
+            'prediction': 'unknown',
+            'confidence': 0,
+            'images_scored': 0,
+            'images_failed': len(results),
+        }
+
+    fake_prob = sum(r['fake_probability'] for r in scored) / len(scored)
+    real_prob = sum(r['real_probability'] for r in scored) / len(scored)
+    prediction = 'fake' if fake_prob >= real_prob else 'real'
+    return {
+        'prediction': prediction,
+        'confidence': round(max(fake_prob, real_prob), 2),
+        'fake_probability': round(fake_prob, 2),
+        'real_probability': round(real_prob, 2),
+        'fake_count': sum(1 for r in scored if r.get('prediction') == 'fake'),
+        'real_count': sum(1 for r in scored if r.get('prediction') == 'real'),
+        'images_scored': len(scored),
+        'images_failed': len(results) - len(scored),
+        'methods': sorted({r.get('method', 'unknown') for r in scored}),
+    }
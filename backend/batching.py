@@ -0,0 +1,163 @@
+"""
+Dynamic micro-batching for model inference.
+
+Requests arriving within a short window are gathered into a single batch so
+that one forward pass serves several callers. Items submitted with a
+deadline (see deadlines.Deadline) are dropped when the batch is assembled if
+their deadline has passed or their client has gone, so they never reach the
+forward pass.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+
+class _PendingItem:
+    __slots__ = ('payload', 'deadline', 'future', 'enqueued_at')
+
+    def __init__(self, payload: Any, deadline=None):
+        self.payload = payload
+        self.deadline = deadline
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """Collect submitted items into batches and run them on a worker thread.
+
+    ``run_batch`` receives a list of payloads and must return a list of
+    results of the same length, in the same order.
+    """
+
+    def __init__(self, run_batch: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 8, max_wait_ms: float = 10.0):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        # As configured; max_batch_size may be lowered under memory pressure
+        self.configured_max_batch_size = self.max_batch_size
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+
+        self._queue: "queue.Queue[_PendingItem]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._batches = 0
+        self._items = 0
+        self._dropped = 0
+        self._batch_size_counts: Dict[int, int] = {}
+        self._queue_wait_total_ms = 0.0
+        self._queue_wait_max_ms = 0.0
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name='micro-batcher', daemon=True
+                )
+                self._worker.start()
+
+    def submit(self, payload: Any, deadline=None) -> Future:
+        """Queue a payload and return a future resolving to its result
+
+        ``deadline`` may be any object whose ``check(stage)`` raises once the
+        result is no longer wanted; the future then fails with that error.
+        """
+        self._ensure_worker()
+        item = _PendingItem(payload, deadline)
+        self._queue.put(item)
+        return item.future
+
+    def _collect_batch(self) -> List[_PendingItem]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drop_expired(self, batch: List[_PendingItem]) -> List[_PendingItem]:
+        live = []
+        for item in batch:
+            try:
+                if item.deadline is not None:
+                    item.deadline.check('forward')
+            except Exception as dropped:
+                item.future.set_exception(dropped)
+                continue
+            live.append(item)
+        if len(live) < len(batch):
+            with self._lock:
+                self._dropped += len(batch) - len(live)
+        return live
+
+    def _run(self):
+        while True:
+            batch = self._drop_expired(self._collect_batch())
+            if not batch:
+                continue
+            started = time.perf_counter()
+            self._record_batch(batch, started)
+
+            try:
+                results = self.run_batch([item.payload for item in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"Batch returned {len(results)} results for {len(batch)} inputs"
+                    )
+            except Exception as e:
+                for item in batch:
+                    item.future.set_exception(e)
+                continue
+
+            for item, result in zip(batch, results):
+                item.future.set_result(result)
+
+    def _record_batch(self, batch: List[_PendingItem], started: float):
+        with self._lock:
+            size = len(batch)
+            self._batches += 1
+            self._items += size
+            self._batch_size_counts[size] = self._batch_size_counts.get(size, 0) + 1
+            for item in batch:
+                wait_ms = (started - item.enqueued_at) * 1000.0
+                self._queue_wait_total_ms += wait_ms
+                self._queue_wait_max_ms = max(self._queue_wait_max_ms, wait_ms)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return batch size and queue wait metrics"""
+        with self._lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'configured_max_batch_size': self.configured_max_batch_size,
+                'max_wait_ms': self.max_wait_ms,
+                'queue_depth': self._queue.qsize(),
+                'batches': self._batches,
+                'items': self._items,
+                'dropped': self._dropped,
+                'avg_batch_size': round(self._items / self._batches, 2) if self._batches else 0,
+                'batch_size_counts': dict(sorted(self._batch_size_counts.items())),
+                'avg_queue_wait_ms': round(self._queue_wait_total_ms / self._items, 3) if self._items else 0,
+                'max_queue_wait_ms': round(self._queue_wait_max_ms, 3),
+            }
+
+
+def batcher_from_env(run_batch: Callable[[List[Any]], List[Any]]) -> MicroBatcher:
+    """Create a batcher configured by BATCH_MAX_SIZE and BATCH_MAX_WAIT_MS"""
+    return MicroBatcher(
+        run_batch,
+        max_batch_size=int(os.getenv('BATCH_MAX_SIZE', 8)),
+        max_wait_ms=float(os.getenv('BATCH_MAX_WAIT_MS', 10)),
+    )
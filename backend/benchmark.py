@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Load-testing and latency benchmark for the prediction API.
+
+Replays the bundled dataset images against /api/predict, either in-process
+through FastAPI's ASGI transport (the default: runs the app's lifespan and
+waits for /api/ready) or against a running server with --url. Two load
+models are supported:
+
+- closed loop (default): --concurrency clients each send the next request
+  as soon as the previous one finishes, measuring peak throughput;
+- open loop: --rate requests per second arrive on a Poisson (or uniform)
+  schedule regardless of how fast the server answers. Latency is measured
+  from each request's scheduled arrival time, so queueing delay is included.
+
+Throughput, p50/p95/p99 latency, status codes, cache/near-duplicate hits,
+peak RSS and CPU use are written as JSON so runs can be compared.
+
+Usage:
+    python benchmark.py --concurrency 8 --requests 400
+    python benchmark.py --rate 20 --duration 30 --output results/rate20.json
+    python benchmark.py --url http://localhost:8000 --pid 1234 --concurrency 16
+    python benchmark.py --compare results/before.json results/after.json
+"""
+
+import asyncio
+import datetime
+import glob
+import json
+import math
+import os
+import random
+import subprocess
+import time
+from typing import Any, Dict, List, Optional
+
+import psutil
+
+try:
+    import httpx
+except ImportError:
+    raise SystemExit("❌ benchmark.py requires httpx (pip install httpx)")
+
+DATASET_DIR = '../counterfeit-nike-shoes-detection-1'
+DEFAULT_SPLITS = ('valid', 'test')
+# Settings that change serving behaviour, recorded with every run
+CONFIG_ENV_VARS = (
+    'INFERENCE_BACKEND', 'BATCH_MAX_SIZE', 'BATCH_MAX_WAIT_MS', 'INFERENCE_WORKERS',
+    'INFERENCE_QUEUE_SIZE', 'PREDICTION_CACHE_SIZE', 'NEAR_DUPLICATE_MAX_DISTANCE',
+    'MODEL_FORMAT', 'WEB_CONCURRENCY', 'OMP_NUM_THREADS',
+)
+
+
+def load_images(dataset_dir: str, splits, limit: int = 0) -> List[Dict[str, Any]]:
+    """Read the dataset images for the given splits into memory"""
+    paths = []
+    for split in splits:
+        paths.extend(sorted(glob.glob(os.path.join(dataset_dir, split, 'images', '*.jpg'))))
+    if limit:
+        paths = paths[:limit]
+    images = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            images.append({'filename': os.path.basename(path), 'data': f.read()})
+    return images
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class ResourceSampler:
+    """Sample RSS and CPU time of a process while the benchmark runs"""
+
+    def __init__(self, pid: int = None, interval: float = 0.1):
+        self.process = psutil.Process(pid or os.getpid())
+        self.interval = interval
+        self.peak_rss = 0
+        self.rss_samples: List[int] = []
+        self._task = None
+
+    def _rss(self) -> int:
+        # Include forked workers when sampling a pre-fork parent
+        rss = self.process.memory_info().rss
+        for child in self.process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+        return rss
+
+    def _cpu_seconds(self) -> float:
+        total = sum(self.process.cpu_times()[:2])
+        for child in self.process.children(recursive=True):
+            try:
+                total += sum(child.cpu_times()[:2])
+            except psutil.NoSuchProcess:
+                pass
+        return total
+
+    async def _run(self):
+        while True:
+            rss = self._rss()
+            self.rss_samples.append(rss)
+            self.peak_rss = max(self.peak_rss, rss)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._cpu_start = self._cpu_seconds()
+        self._wall_start = time.perf_counter()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> Dict[str, Any]:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        cpu_seconds = self._cpu_seconds() - self._cpu_start
+        wall_seconds = time.perf_counter() - self._wall_start
+        return {
+            'pid': self.process.pid,
+            'peak_rss_mb': round(self.peak_rss / (1024 * 1024), 1),
+            'mean_rss_mb': round(sum(self.rss_samples) / len(self.rss_samples) / (1024 * 1024), 1) if self.rss_samples else None,
+            'cpu_seconds': round(cpu_seconds, 2),
+            # 100% is one fully used core
+            'cpu_percent': round(cpu_seconds / wall_seconds * 100, 1) if wall_seconds else None,
+        }
+
+
+async def send_request(client: httpx.AsyncClient, image: Dict[str, Any], scheduled: float,
+                       records: List[Dict[str, Any]]):
+    status = None
+    body = {}
+    try:
+        response = await client.post('/api/predict', files={'file': (image['filename'], image['data'], 'image/jpeg')})
+        status = response.status_code
+        if response.headers.get('content-type', '').startswith('application/json'):
+            body = response.json()
+    except Exception as e:
+        body = {'error': f'{type(e).__name__}: {e}'}
+    records.append({
+        'latency': time.perf_counter() - scheduled,
+        'status': status,
+        'method': body.get('method'),
+        'cached': bool(body.get('cached')),
+        'near_duplicate': bool(body.get('near_duplicate')),
+        'error': body.get('error'),
+    })
+
+
+async def run_closed_loop(client, images, concurrency: int, total: int, duration: float, records):
+    counter = iter(range(total or 10 ** 12))
+    deadline = time.perf_counter() + duration if duration else None
+
+    async def client_loop():
+        for index in counter:
+            if deadline and time.perf_counter() >= deadline:
+                return
+            await send_request(client, images[index % len(images)], time.perf_counter(), records)
+
+    await asyncio.gather(*[client_loop() for _ in range(concurrency)])
+
+
+async def run_open_loop(client, images, rate: float, arrival: str, total: int, duration: float,
+                        records, seed: int):
+    rng = random.Random(seed)
+    total = total or int(rate * (duration or 10))
+    started = time.perf_counter()
+    scheduled = started
+    tasks = []
+    for index in range(total):
+        scheduled += rng.expovariate(rate) if arrival == 'poisson' else 1.0 / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(send_request(client, images[index % len(images)], scheduled, records)))
+    await asyncio.gather(*tasks)
+
+
+def summarize(records: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    latencies = sorted(r['latency'] * 1000 for r in records if r['status'] == 200)
+    statuses: Dict[str, int] = {}
+    for record in records:
+        key = str(record['status'] or 'connection_error')
+        statuses[key] = statuses.get(key, 0) + 1
+    ok = len(latencies)
+    return {
+        'requests': len(records),
+        'succeeded': ok,
+        'wall_seconds': round(wall_seconds, 3),
+        'throughput_rps': round(ok / wall_seconds, 2) if wall_seconds else None,
+        'latency_ms': {
+            'mean': round(sum(latencies) / ok, 2) if ok else None,
+            'min': round(latencies[0], 2) if ok else None,
+            'p50': round(percentile(latencies, 50), 2) if ok else None,
+            'p95': round(percentile(latencies, 95), 2) if ok else None,
+            'p99': round(percentile(latencies, 99), 2) if ok else None,
+            'max': round(latencies[-1], 2) if ok else None,
+        },
+        'status_codes': statuses,
+        'cached': sum(1 for r in records if r['cached']),
+        'near_duplicate': sum(1 for r in records if r['near_duplicate']),
+        'methods': sorted({r['method'] for r in records if r['method']}),
+    }
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            response = await client.get('/api/ready')
+            if response.status_code == 200:
+                return response.json()
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.25)
+    raise SystemExit(f"❌ App not ready after {timeout:.0f}s")
+
+
+async def run_benchmark(args, images) -> Dict[str, Any]:
+    timeout = httpx.Timeout(args.timeout)
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=timeout,
+                                   limits=httpx.Limits(max_connections=None))
+        lifespan = None
+    else:
+        from app import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://benchmark',
+                                   timeout=timeout)
+        lifespan = app.router.lifespan_context(app)
+
+    async with client:
+        if lifespan is not None:
+            await lifespan.__aenter__()
+        try:
+            readiness = await wait_until_ready(client, args.ready_timeout)
+
+            if args.warmup:
+                warmup_records: List[Dict[str, Any]] = []
+                await run_closed_loop(client, images, min(args.concurrency, args.warmup), args.warmup, 0, warmup_records)
+
+            # A remote server can only be sampled when its pid is given
+            sampler = ResourceSampler(args.pid) if args.pid or not args.url else None
+            if sampler:
+                sampler.start()
+            records: List[Dict[str, Any]] = []
+            started = time.perf_counter()
+            if args.rate:
+                await run_open_loop(client, images, args.rate, args.arrival, args.requests, args.duration,
+                                    records, args.seed)
+            else:
+                await run_closed_loop(client, images, args.concurrency, args.requests, args.duration, records)
+            wall_seconds = time.perf_counter() - started
+            resources = await sampler.stop() if sampler else None
+
+            health = (await client.get('/api/health')).json()
+        finally:
+            if lifespan is not None:
+                await lifespan.__aexit__(None, None, None)
+
+    return {
+        'summary': summarize(records, wall_seconds),
+        'resources': resources,
+        'readiness': readiness,
+        'server_stats': {key: health.get(key) for key in
+                         ('batching', 'inference_executor', 'prediction_cache', 'near_duplicate_index')},
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(before_path: str, after_path: str):
+    """Print the change in the headline numbers between two result files"""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+
+    rows = [('throughput_rps', ('summary', 'throughput_rps'))]
+    rows += [(f'{p}_ms', ('summary', 'latency_ms', p)) for p in ('p50', 'p95', 'p99')]
+    rows += [('peak_rss_mb', ('resources', 'peak_rss_mb')), ('cpu_percent', ('resources', 'cpu_percent'))]
+
+    print(f"{'metric':<16}{'before':>12}{'after':>12}{'change':>10}")
+    for label, keys in rows:
+        values = []
+        for result in (before, after):
+            value = result
+            for key in keys:
+                value = (value or {}).get(key)
+            values.append(value)
+        old, new = values
+        change = f"{(new - old) / old * 100:+.1f}%" if old and new is not None else ''
+        print(f"{label:<16}{str(old):>12}{str(new):>12}{change:>10}")
+
+
+def main():
+    """Main function for command line usage"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Throughput and latency benchmark for /api/predict')
+    parser.add_argument('--url', help='Benchmark a running server instead of the in-process app')
+    parser.add_argument('--pid', type=int, help='Server process to sample RSS/CPU from when using --url')
+    parser.add_argument('--dataset', default=DATASET_DIR, help='Dataset directory with <split>/images')
+    parser.add_argument('--splits', default=','.join(DEFAULT_SPLITS), help='Comma-separated splits to replay')
+    parser.add_argument('--images', type=int, default=0, help='Use at most this many distinct images')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients (closed loop)')
+    parser.add_argument('--rate', type=float, default=0, help='Open-loop arrival rate in requests/second')
+    parser.add_argument('--arrival', choices=['poisson', 'uniform'], default='poisson', help='Open-loop arrival process')
+    parser.add_argument('--requests', type=int, default=0, help='Total requests (default: one pass over the images)')
+    parser.add_argument('--duration', type=float, default=0, help='Stop after this many seconds')
+    parser.add_argument('--warmup', type=int, default=8, help='Untimed requests sent first')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Per-request timeout in seconds')
+    parser.add_argument('--ready-timeout', type=float, default=300.0, help='Seconds to wait for /api/ready')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for Poisson arrivals')
+    parser.add_argument('--output', help='Result file (default: benchmark_results/<timestamp>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='Compare two result files and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    images = load_images(args.dataset, [s for s in args.splits.split(',') if s], args.images)
+    if not images:
+        raise SystemExit(f"❌ No images found under {args.dataset}")
+    if not args.requests and not args.duration:
+        args.requests = len(images)
+
+    print(f"🏁 Benchmarking {'in-process app' if not args.url else args.url} with {len(images)} images "
+          f"({f'{args.rate} req/s {args.arrival}' if args.rate else f'concurrency {args.concurrency}'})")
+    result = asyncio.run(run_benchmark(args, images))
+
+    report = {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'config': {
+            'target': args.url or 'in-process',
+            'load_model': 'open' if args.rate else 'closed',
+            'concurrency': None if args.rate else args.concurrency,
+            'rate': args.rate or None,
+            'arrival': args.arrival if args.rate else None,
+            'requests': args.requests or None,
+            'duration': args.duration or None,
+            'distinct_images': len(images),
+            'splits': args.splits,
+            'cpu_count': os.cpu_count(),
+            'env': {name: os.environ[name] for name in CONFIG_ENV_VARS if name in os.environ},
+        },
+        **result,
+    }
+
+    output = args.output or os.path.join(
+        'benchmark_results', datetime.datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    summary = report['summary']
+    latency = summary['latency_ms']
+    print(f"✅ {summary['succeeded']}/{summary['requests']} ok, {summary['throughput_rps']} req/s, "
+          f"p50 {latency['p50']} ms, p95 {latency['p95']} ms, p99 {latency['p99']} ms")
+    if report['resources']:
+        print(f"📊 Peak RSS {report['resources']['peak_rss_mb']} MB, CPU {report['resources']['cpu_percent']}%")
+    print(f"📝 Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped checkpoint format for fast cold starts.
+
+``torch.load`` unpickles the whole .pth checkpoint into fresh memory and
+``load_state_dict`` then copies it into the model, so peak memory is about
+twice the weights. This module converts the state dict into a flat
+safetensors-layout file (8-byte header length, JSON header, raw tensor
+data) and loads it with ``np.memmap``: tensors are views straight onto the
+page cache, the model is built on the meta device and the mapped tensors
+are assigned to it without a copy. Pages are faulted in lazily, and are
+shared between processes that map the same file.
+
+Usage:
+    python checkpoint_format.py --convert ../sneaker_model_production.pth
+    python checkpoint_format.py --benchmark ../sneaker_model_production.pth
+"""
+
+import json
+import os
+import struct
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+# Data section starts on this boundary so every tensor is element-aligned
+ALIGNMENT = 64
+
+_DTYPES = {
+    'F64': np.float64,
+    'F32': np.float32,
+    'F16': np.float16,
+    'I64': np.int64,
+    'I32': np.int32,
+    'I16': np.int16,
+    'I8': np.int8,
+    'U8': np.uint8,
+    'BOOL': np.bool_,
+}
+_DTYPE_NAMES = {np.dtype(v): k for k, v in _DTYPES.items()}
+
+
+def mmap_checkpoint_path(checkpoint_path: str) -> str:
+    """Return the converted file that sits next to a .pth checkpoint"""
+    return os.path.splitext(checkpoint_path)[0] + '.safetensors'
+
+
+def _source_stamp(checkpoint_path: str) -> Dict[str, str]:
+    stat = os.stat(checkpoint_path)
+    return {'source_size': str(stat.st_size), 'source_mtime': str(int(stat.st_mtime))}
+
+
+def convert_checkpoint(checkpoint_path: str, output_path: str = None) -> str:
+    """Write the checkpoint's model_state_dict in the mmap-able format"""
+    import torch
+
+    output_path = output_path or mmap_checkpoint_path(checkpoint_path)
+    checkpoint = torch.load(checkpoint_path, map_location='cpu', weights_only=False)
+    state_dict = checkpoint['model_state_dict'] if 'model_state_dict' in checkpoint else checkpoint
+
+    arrays = {name: tensor.detach().contiguous().numpy() for name, tensor in state_dict.items()}
+    # Widest dtypes first keeps every tensor aligned to its element size
+    order = sorted(arrays, key=lambda name: -arrays[name].dtype.itemsize)
+
+    header: Dict[str, Any] = {'__metadata__': {'format': 'pt', **_source_stamp(checkpoint_path)}}
+    offset = 0
+    for name in order:
+        array = arrays[name]
+        if array.dtype not in _DTYPE_NAMES:
+            raise ValueError(f"Unsupported dtype {array.dtype} for {name}")
+        header[name] = {
+            'dtype': _DTYPE_NAMES[array.dtype],
+            'shape': list(array.shape),
+            'data_offsets': [offset, offset + array.nbytes],
+        }
+        offset += array.nbytes
+
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    # Pad the header with spaces (allowed by the format) to align the data section
+    padding = (-(8 + len(header_bytes))) % ALIGNMENT
+    header_bytes += b' ' * padding
+
+    temp_path = output_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        for name in order:
+            f.write(arrays[name].tobytes())
+    os.replace(temp_path, output_path)
+    print(f"✅ Wrote mmap checkpoint: {output_path} ({os.path.getsize(output_path) / (1024*1024):.1f} MB)")
+    return output_path
+
+
+def read_header(path: str) -> Dict[str, Any]:
+    with open(path, 'rb') as f:
+        (length,) = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(length))
+    header['__data_start__'] = 8 + length
+    return header
+
+
+def is_current(path: str, checkpoint_path: Optional[str]) -> bool:
+    """Return True if ``path`` was converted from the checkpoint as it is now"""
+    if not os.path.exists(path):
+        return False
+    if not checkpoint_path or not os.path.exists(checkpoint_path):
+        return True
+    metadata = read_header(path).get('__metadata__', {})
+    stamp = _source_stamp(checkpoint_path)
+    return all(metadata.get(key) == value for key, value in stamp.items())
+
+
+def load_mmap_state_dict(path: str) -> Dict[str, Any]:
+    """Map the file and return tensors that view it without copying"""
+    import torch
+
+    header = read_header(path)
+    data_start = header.pop('__data_start__')
+    header.pop('__metadata__', None)
+
+    # Copy-on-write mapping: tensors are writable, but pages stay shared
+    # with the page cache (and other processes) until something writes them
+    mapped = np.memmap(path, dtype=np.uint8, mode='c', offset=data_start)
+    state_dict = {}
+    for name, info in header.items():
+        begin, end = info['data_offsets']
+        array = mapped[begin:end].view(_DTYPES[info['dtype']]).reshape(info['shape'])
+        state_dict[name] = torch.from_numpy(array)
+    return state_dict
+
+
+def _measure(mode: str, checkpoint_path: str):
+    import resource
+    import time
+
+    import psutil
+    import torch
+    import torchvision  # noqa: F401  imported up front so only weight loading is timed
+
+    from app import LightweightModelLoader
+
+    loader = LightweightModelLoader()
+    # Exclude torch's one-time operator initialization from the comparison
+    torch.nn.Linear(2, 2)(torch.zeros(1, 2))
+    baseline_mb = psutil.Process().memory_info().rss / (1024 * 1024)
+    started = time.perf_counter()
+    if mode == 'pth':
+        model = loader.build_model()
+        checkpoint = torch.load(checkpoint_path, map_location='cpu', weights_only=False)
+        model.load_state_dict(checkpoint['model_state_dict'])
+        del checkpoint
+    else:
+        with torch.device('meta'):
+            model = loader.build_model()
+        model.load_state_dict(load_mmap_state_dict(mmap_checkpoint_path(checkpoint_path)), assign=True)
+    model.eval()
+    loaded = time.perf_counter() - started
+
+    with torch.no_grad():
+        model(torch.zeros(1, 3, 224, 224))
+    first_prediction = time.perf_counter() - started
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({
+        'mode': mode,
+        'load_s': round(loaded, 3),
+        'first_prediction_s': round(first_prediction, 3),
+        'peak_rss_over_imports_mb': round(peak_mb - baseline_mb, 1),
+        'peak_rss_mb': round(peak_mb, 1),
+    }))
+
+
+def main():
+    """Main function for command line usage"""
+    import argparse
+    import subprocess
+    import sys
+
+    parser = argparse.ArgumentParser(description='Convert and benchmark memory-mapped checkpoints')
+    parser.add_argument('checkpoint', help='Path to the .pth checkpoint')
+    parser.add_argument('--convert', action='store_true', help='Write the .safetensors file next to the checkpoint')
+    parser.add_argument('--benchmark', action='store_true', help='Compare cold start time and peak RSS in fresh processes')
+    parser.add_argument('--measure', choices=['pth', 'mmap'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        _measure(args.measure, args.checkpoint)
+        return
+
+    if args.convert:
+        convert_checkpoint(args.checkpoint)
+
+    if args.benchmark:
+        for mode in ('pth', 'mmap'):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), args.checkpoint, '--measure', mode],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            print(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    main()
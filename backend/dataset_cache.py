@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Packed, memory-mapped image cache for training and evaluation.
+
+Reads the YOLO export in ``counterfeit-nike-shoes-detection-1`` (``data.yaml``
+and one label file per image), maps its four classes onto fake/real the
+way the notebook's ``convert_detection_to_classification_full_images`` does
+(class of the first box; "original"/"real"/"authentic" is real,
+"fake"/"counterfeit"/"replica" is fake), and decodes and resizes every image
+once into contiguous uint8 ``.npy`` shards:
+
+    dataset_cache/<split>/shard-00000.npy   (N, H, W, 3) uint8
+    dataset_cache/<split>/index.json        per-image shard, row, label, sha256
+
+``PackedImageDataset`` maps the shards copy-on-write and hands out CHW uint8
+tensor views without copying, so DataLoader workers only pay for the
+augmentation (the notebook's crop/flip/rotation/colour jitter, applied to
+tensors) and the forward pass, never JPEG decoding. A split is rebuilt when
+its source images change. Reading data.yaml requires PyYAML.
+
+Usage:
+    python dataset_cache.py build --dataset ../counterfeit-nike-shoes-detection-1 --output ../dataset_cache
+    python dataset_cache.py benchmark --output ../dataset_cache --split train
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+
+SPLITS = ('train', 'valid', 'test')
+CLASSES = ('fake', 'real')
+# Resize target before random 224 crops, as in the notebook
+CACHE_SIZE = (256, 256)
+SHARD_IMAGES = 1024
+INDEX_VERSION = 1
+REAL_KEYWORDS = ('original', 'real', 'authentic')
+FAKE_KEYWORDS = ('fake', 'counterfeit', 'replica')
+MEAN = [0.485, 0.456, 0.406]
+STD = [0.229, 0.224, 0.225]
+
+
+def read_class_names(dataset_dir: str) -> List[str]:
+    import yaml
+
+    with open(os.path.join(dataset_dir, 'data.yaml')) as f:
+        return list(yaml.safe_load(f)['names'])
+
+
+def binary_label(class_name: str) -> Optional[int]:
+    """Index into CLASSES for a detection class name, or None if it can't be mapped"""
+    name = class_name.lower()
+    if any(keyword in name for keyword in REAL_KEYWORDS):
+        return CLASSES.index('real')
+    if any(keyword in name for keyword in FAKE_KEYWORDS):
+        return CLASSES.index('fake')
+    if 'jordan' in name:
+        return CLASSES.index('real')
+    return None
+
+
+def list_split(dataset_dir: str, split: str, class_names: Sequence[str]) -> List[Dict[str, Any]]:
+    """Labelled images of one split, sorted by file name"""
+    image_dir = os.path.join(dataset_dir, split, 'images')
+    label_dir = os.path.join(dataset_dir, split, 'labels')
+    if not os.path.isdir(image_dir):
+        return []
+
+    items = []
+    skipped = 0
+    for name in sorted(os.listdir(image_dir)):
+        if os.path.splitext(name)[1].lower() not in ('.jpg', '.jpeg', '.png'):
+            continue
+        label_path = os.path.join(label_dir, os.path.splitext(name)[0] + '.txt')
+        try:
+            with open(label_path) as f:
+                first = f.readline().split()
+        except OSError:
+            first = []
+        label = binary_label(class_names[int(first[0])]) if first else None
+        if label is None:
+            skipped += 1
+            continue
+        path = os.path.join(image_dir, name)
+        file_stat = os.stat(path)
+        items.append({
+            'file': name,
+            'label': label,
+            'class_name': class_names[int(first[0])],
+            'source': [file_stat.st_size, file_stat.st_mtime_ns],
+        })
+    if skipped:
+        print(f"⚠️ {split}: skipped {skipped} images without a usable label")
+    return items
+
+
+def _load_image(args: Tuple[str, Tuple[int, int]]) -> Tuple[str, np.ndarray]:
+    """Read, hash, decode and resize one image; runs in the builder's worker processes"""
+    from image_decode import decode_image
+    from preprocessing import resize_pixels
+
+    path, size = args
+    with open(path, 'rb') as f:
+        data = f.read()
+    return hashlib.sha256(data).hexdigest(), resize_pixels(decode_image(data, target_size=size), size)
+
+
+def read_index(split_dir: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(split_dir, 'index.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_current(split_dir: str, items: List[Dict[str, Any]], size: Tuple[int, int]) -> bool:
+    """Whether a cached split was built from exactly these source files at this size"""
+    index = read_index(split_dir)
+    if not index or index.get('version') != INDEX_VERSION or tuple(index.get('size', ())) != tuple(size):
+        return False
+    cached = [(item['file'], item['source']) for item in index['items']]
+    return cached == [(item['file'], item['source']) for item in items]
+
+
+def build_split(dataset_dir: str, split: str, output_dir: str, size: Tuple[int, int] = CACHE_SIZE,
+                workers: int = None, shard_images: int = SHARD_IMAGES, force: bool = False) -> Dict[str, Any]:
+    """Decode one split into memory-mapped shards; return its index"""
+    items = list_split(dataset_dir, split, read_class_names(dataset_dir))
+    split_dir = os.path.join(output_dir, split)
+    if not items:
+        print(f"⚠️ {split}: no labelled images found")
+        return {}
+    if not force and is_current(split_dir, items, size):
+        print(f"✅ {split}: cache is current ({len(items)} images)")
+        return read_index(split_dir)
+
+    started = time.perf_counter()
+    temp_dir = split_dir + '.tmp'
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+    width, height = size
+    image_dir = os.path.join(dataset_dir, split, 'images')
+
+    shards = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for shard_number, first in enumerate(range(0, len(items), shard_images)):
+            shard_items = items[first:first + shard_images]
+            shard_file = f'shard-{shard_number:05d}.npy'
+            shard = np.lib.format.open_memmap(os.path.join(temp_dir, shard_file), mode='w+',
+                                              dtype=np.uint8, shape=(len(shard_items), height, width, 3))
+            jobs = [(os.path.join(image_dir, item['file']), size) for item in shard_items]
+            for row, (item, (sha256, pixels)) in enumerate(zip(shard_items, pool.map(_load_image, jobs, chunksize=16))):
+                shard[row] = pixels
+                item.update(sha256=sha256, shard=shard_number, row=row)
+            shard.flush()
+            del shard
+            shards.append({'file': shard_file, 'count': len(shard_items)})
+
+    index = {
+        'version': INDEX_VERSION,
+        'split': split,
+        'size': list(size),
+        'classes': list(CLASSES),
+        'dataset': os.path.abspath(dataset_dir),
+        'shards': shards,
+        'items': items,
+    }
+    with open(os.path.join(temp_dir, 'index.json'), 'w') as f:
+        json.dump(index, f)
+    shutil.rmtree(split_dir, ignore_errors=True)
+    os.replace(temp_dir, split_dir)
+
+    counts = np.bincount([item['label'] for item in items], minlength=len(CLASSES))
+    megabytes = len(items) * width * height * 3 / (1024 * 1024)
+    print(f"✅ {split}: packed {len(items)} images ({', '.join(f'{name} {count}' for name, count in zip(CLASSES, counts))}) "
+          f"into {len(shards)} shards, {megabytes:.0f} MB in {time.perf_counter() - started:.1f}s")
+    return index
+
+
+def train_transform(crop: int = 224):
+    """The notebook's training augmentation, on uint8 CHW tensors"""
+    from torchvision import transforms
+
+    return transforms.Compose([
+        transforms.RandomCrop(crop),
+        transforms.RandomHorizontalFlip(p=0.5),
+        transforms.RandomRotation(degrees=15),
+        transforms.ColorJitter(brightness=0.2, contrast=0.2, saturation=0.2, hue=0.1),
+        transforms.ConvertImageDtype(torch.float32),
+        transforms.Normalize(mean=MEAN, std=STD),
+    ])
+
+
+def eval_transform():
+    """Scale and normalize only, as the notebook's validation transform after its resize"""
+    from torchvision import transforms
+
+    return transforms.Compose([
+        transforms.ConvertImageDtype(torch.float32),
+        transforms.Normalize(mean=MEAN, std=STD),
+    ])
+
+
+class PackedImageDataset(Dataset):
+    """(image, label) pairs read zero-copy from a packed split
+
+    Shards are opened lazily in each process, so the dataset pickles cheaply
+    into DataLoader workers, which then share the page cache.
+    """
+
+    def __init__(self, cache_dir: str, split: str, transform=None):
+        self.split_dir = os.path.join(cache_dir, split)
+        index = read_index(self.split_dir)
+        if index is None:
+            raise FileNotFoundError(f"No packed {split} split in {cache_dir}; run dataset_cache.py build first")
+        self.transform = transform
+        self.classes = index['classes']
+        self.items = index['items']
+        self.shard_files = [shard['file'] for shard in index['shards']]
+        self.labels = torch.tensor([item['label'] for item in self.items])
+        self._shards: Dict[int, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_shards'] = {}
+        return state
+
+    def _shard(self, number: int) -> np.ndarray:
+        shard = self._shards.get(number)
+        if shard is None:
+            # Copy-on-write: writable for torch, but the file and page cache stay shared
+            shard = self._shards[number] = np.load(os.path.join(self.split_dir, self.shard_files[number]),
+                                                   mmap_mode='c')
+        return shard
+
+    def pixels(self, index: int) -> torch.Tensor:
+        """The cached image as a CHW uint8 tensor view"""
+        item = self.items[index]
+        return torch.from_numpy(self._shard(item['shard'])[item['row']]).permute(2, 0, 1)
+
+    def __getitem__(self, index: int):
+        image = self.pixels(index)
+        if self.transform is not None:
+            image = self.transform(image)
+        return image, int(self.labels[index])
+
+
+class _JpegDataset(Dataset):
+    """Decode-per-epoch baseline equivalent to the notebook's ImageFolder pipeline"""
+
+    def __init__(self, dataset_dir: str, split: str, items: List[Dict[str, Any]], transform, size: Tuple[int, int]):
+        self.image_dir = os.path.join(dataset_dir, split, 'images')
+        self.items = items
+        self.transform = transform
+        self.size = size
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __getitem__(self, index: int):
+        from PIL import Image
+
+        item = self.items[index]
+        with Image.open(os.path.join(self.image_dir, item['file'])) as image:
+            pixels = np.array(image.convert('RGB').resize(self.size, Image.BILINEAR))
+        return self.transform(torch.from_numpy(pixels).permute(2, 0, 1)), item['label']
+
+
+def _epoch_rate(dataset, batch_size: int, workers: int) -> float:
+    from torch.utils.data import DataLoader
+
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=True, num_workers=workers)
+    started = time.perf_counter()
+    for _ in loader:
+        pass
+    return len(dataset) / (time.perf_counter() - started)
+
+
+def main():
+    """Main function for command line usage"""
+    parser = argparse.ArgumentParser(description='Build or benchmark the packed dataset cache')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help='Decode the YOLO export into memory-mapped shards')
+    build.add_argument('--dataset', default='../counterfeit-nike-shoes-detection-1', help='YOLO export directory')
+    build.add_argument('--output', default='../dataset_cache', help='Cache directory')
+    build.add_argument('--splits', nargs='+', default=list(SPLITS), help='Splits to build')
+    build.add_argument('--size', type=int, default=CACHE_SIZE[0], help='Cached image side length')
+    build.add_argument('--workers', type=int, default=None, help='Decode processes (default: all cores)')
+    build.add_argument('--force', action='store_true', help='Rebuild even if the cache is current')
+
+    benchmark = subparsers.add_parser('benchmark', help='Compare an augmented epoch from the cache and from JPEGs')
+    benchmark.add_argument('--output', default='../dataset_cache', help='Cache directory')
+    benchmark.add_argument('--split', default='train', help='Split to iterate')
+    benchmark.add_argument('--batch-size', type=int, default=32, help='DataLoader batch size')
+    benchmark.add_argument('--workers', type=int, default=0, help='DataLoader workers')
+    benchmark.add_argument('--limit', type=int, default=512, help='Images per epoch (0 for all)')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        for split in args.splits:
+            build_split(args.dataset, split, args.output, size=(args.size, args.size),
+                        workers=args.workers, force=args.force)
+        return
+
+    packed = PackedImageDataset(args.output, args.split)
+    index = read_index(packed.split_dir)
+    subset = list(range(len(packed)))[:args.limit or None]
+    print(f"{len(subset)} {args.split} images, batch {args.batch_size}, {args.workers} workers")
+    for name, transform in (('eval transform', eval_transform()), ('train augmentation', train_transform())):
+        packed.transform = transform
+        jpeg = _JpegDataset(index['dataset'], args.split, [packed.items[i] for i in subset],
+                            transform, tuple(index['size']))
+        jpeg_rate = _epoch_rate(jpeg, args.batch_size, args.workers)
+        packed_rate = _epoch_rate(torch.utils.data.Subset(packed, subset), args.batch_size, args.workers)
+        print(f"{name}: JPEG decode + resize {jpeg_rate:.0f} images/s, "
+              f"packed cache {packed_rate:.0f} images/s ({packed_rate / jpeg_rate:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Per-request deadlines and cancellation for the inference pipeline.
+
+Every prediction request gets a Deadline: a timeout taken from the
+``X-Request-Timeout`` header (seconds, capped at MAX_REQUEST_TIMEOUT_SECONDS)
+or REQUEST_TIMEOUT_SECONDS (default 30; 0 disables it), counted from when
+the request reached the admission queue. The deadline is also cancelled
+when the client disconnects.
+
+The pipeline checks it before decoding and again when the micro-batcher
+assembles a batch, so work nobody is waiting for any more is dropped
+instead of occupying executor threads and batch slots.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+TIMEOUT_HEADER = 'x-request-timeout'
+
+
+class DeadlineExceeded(Exception):
+    """Raised when work is dropped because its deadline passed or its client left"""
+
+    def __init__(self, reason: str, stage: str):
+        super().__init__(f"{'Client disconnected' if reason == 'disconnected' else 'Deadline exceeded'} before {stage}")
+        self.reason = reason
+        self.stage = stage
+
+
+class Deadline:
+    """Expiry time plus a cancellation flag, safe to check from any thread"""
+
+    def __init__(self, timeout: Optional[float], started: float = None):
+        started = time.monotonic() if started is None else started
+        self.timeout = timeout
+        self.expires_at = None if timeout is None else started + timeout
+        self._cancelled = threading.Event()
+        self.reason: Optional[str] = None
+
+    def cancel(self, reason: str = 'disconnected'):
+        self.reason = reason
+        self._cancelled.set()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None without a timeout"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def dropped_reason(self) -> Optional[str]:
+        """'disconnected' or 'deadline' once the work should be dropped, else None"""
+        if self._cancelled.is_set():
+            return self.reason
+        if self.expires_at is not None and time.monotonic() >= self.expires_at:
+            return 'deadline'
+        return None
+
+    def check(self, stage: str):
+        """Raise DeadlineExceeded if the work should not proceed to ``stage``"""
+        reason = self.dropped_reason()
+        if reason is not None:
+            raise DeadlineExceeded(reason, stage)
+
+
+def default_timeout() -> Optional[float]:
+    timeout = float(os.getenv('REQUEST_TIMEOUT_SECONDS', 30))
+    return timeout if timeout > 0 else None
+
+
+def max_timeout() -> float:
+    return float(os.getenv('MAX_REQUEST_TIMEOUT_SECONDS', 120))
+
+
+def request_timeout(header_value: Optional[str]) -> Optional[float]:
+    """Timeout for a request from its X-Request-Timeout header or the default
+
+    Raises ValueError for a header that is not a positive number of seconds.
+    """
+    if not header_value:
+        return default_timeout()
+    try:
+        timeout = float(header_value)
+    except ValueError:
+        timeout = 0.0
+    if not timeout > 0:
+        raise ValueError('X-Request-Timeout must be a positive number of seconds')
+    return min(timeout, max_timeout())
+
+
+def deadline_from_request(request) -> Deadline:
+    """Deadline counted from when the admission middleware first saw the request"""
+    timeout = request_timeout(request.headers.get(TIMEOUT_HEADER))
+    return Deadline(timeout, getattr(request.state, 'received_at', None))
+
+
+@asynccontextmanager
+async def watch_disconnect(request, deadline: Deadline):
+    """Cancel ``deadline`` if the client disconnects while the block runs
+
+    Only use once the request body has been read: the watcher consumes
+    the remaining ASGI receive messages.
+    """
+    async def wait_for_disconnect():
+        while True:
+            message = await request.receive()
+            if message['type'] == 'http.disconnect':
+                deadline.cancel('disconnected')
+                return
+
+    watcher = asyncio.create_task(wait_for_disconnect())
+    try:
+        yield deadline
+    finally:
+        watcher.cancel()
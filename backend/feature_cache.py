@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Frozen-backbone feature cache for fast head retraining.
+
+The classifier head (``model.fc``: 2048 -> 512 -> 2) is tiny next to the
+ResNet50 in front of it, and the backbone does not change when only the
+head is retrained. This module runs the backbone once, in batches, over the
+packed dataset cache (see dataset_cache.py) and stores the pooled 2048-d
+features as float16 rows in a flat memory-mapped file:
+
+    feature_cache/features.f16   (N, 2048) float16, appended in place
+    feature_cache/index.json     image sha256 per row, backbone fingerprint
+
+Rows are keyed by the image's SHA-256, so renamed or re-labelled images
+reuse their features and only new images go through the backbone. The
+store records a fingerprint of the backbone weights and starts over if
+they change. Training the head then runs on the cached features in
+seconds, starting from the checkpoint's head (re-calibration) or from
+scratch (``--reinit``), and writes a new checkpoint; the production
+checkpoint is never overwritten.
+
+Features use the notebook's evaluation view (256x256, normalized, no
+augmentation).
+
+Usage:
+    python feature_cache.py extract --data ../dataset_cache --output ../feature_cache
+    python feature_cache.py train --data ../dataset_cache --output ../feature_cache --save ../sneaker_model_retrained.pth
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from dataset_cache import SPLITS, PackedImageDataset, eval_transform
+
+FEATURE_DIM = 2048
+INDEX_VERSION = 1
+# Persist the index after this many appended batches, so an interrupted run keeps its work
+SAVE_EVERY_BATCHES = 32
+
+
+def backbone_fingerprint(state_dict: Dict[str, torch.Tensor]) -> str:
+    """SHA-256 over every weight outside the head; features stay valid while it matches"""
+    digest = hashlib.sha256()
+    for name in sorted(state_dict):
+        if name.startswith('fc.'):
+            continue
+        digest.update(name.encode('utf-8'))
+        digest.update(state_dict[name].detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()
+
+
+class FeatureStore:
+    """Append-only float16 feature rows keyed by image SHA-256"""
+
+    def __init__(self, directory: str, dim: int = FEATURE_DIM):
+        self.directory = directory
+        self.dim = dim
+        self.data_path = os.path.join(directory, 'features.f16')
+        self.index_path = os.path.join(directory, 'index.json')
+        self.backbone: Optional[str] = None
+        self.keys: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        if index.get('version') != INDEX_VERSION or index.get('dim') != self.dim:
+            return
+        keys = index['keys']
+        # Rows past the end of the data file were never written
+        available = os.path.getsize(self.data_path) // self.row_bytes if os.path.exists(self.data_path) else 0
+        self.keys = keys[:available]
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+        self.backbone = index.get('backbone')
+
+    @property
+    def row_bytes(self) -> int:
+        return self.dim * np.dtype(np.float16).itemsize
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.rows
+
+    def reset(self, backbone: str):
+        """Drop every row; used when the backbone weights change"""
+        os.makedirs(self.directory, exist_ok=True)
+        open(self.data_path, 'wb').close()
+        self.keys, self.rows, self.backbone = [], {}, backbone
+        self.save_index()
+
+    def save_index(self):
+        index = {
+            'version': INDEX_VERSION,
+            'dim': self.dim,
+            'dtype': 'float16',
+            'backbone': self.backbone,
+            'count': len(self.keys),
+            'keys': self.keys,
+        }
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(temp_path, self.index_path)
+
+    def append(self, f, keys: Sequence[str], features: np.ndarray):
+        """Write rows to the open data file ``f``; call save_index to publish them"""
+        f.write(np.ascontiguousarray(features, dtype=np.float16).tobytes())
+        for key in keys:
+            self.rows[key] = len(self.keys)
+            self.keys.append(key)
+
+    def open_for_append(self):
+        os.makedirs(self.directory, exist_ok=True)
+        f = open(self.data_path, 'r+b' if os.path.exists(self.data_path) else 'w+b')
+        # Discard a partial row or rows an interrupted run wrote but never indexed
+        f.truncate(len(self.keys) * self.row_bytes)
+        f.seek(0, os.SEEK_END)
+        return f
+
+    def features(self) -> np.ndarray:
+        """All rows as a read-only memory map"""
+        if not self.keys:
+            return np.zeros((0, self.dim), dtype=np.float16)
+        return np.memmap(self.data_path, dtype=np.float16, mode='r', shape=(len(self.keys), self.dim))
+
+    def lookup(self, keys: Sequence[str]) -> np.ndarray:
+        """Rows for ``keys`` as float32, in order"""
+        return self.features()[[self.rows[key] for key in keys]].astype(np.float32)
+
+
+def load_checkpoint_model(checkpoint_path: str):
+    """The production architecture with weights from ``checkpoint_path``"""
+    from app import LightweightModelLoader
+
+    model = LightweightModelLoader().build_model()
+    checkpoint = torch.load(checkpoint_path, map_location='cpu', weights_only=False)
+    model.load_state_dict(checkpoint['model_state_dict'])
+    model.eval()
+    return model, checkpoint
+
+
+def extract_features(model, store: FeatureStore, cache_dir: str, splits: Sequence[str] = SPLITS,
+                     batch_size: int = 32, workers: int = 0) -> Dict[str, Any]:
+    """Run the backbone over images of ``splits`` that the store doesn't have yet"""
+    from torch.utils.data import DataLoader, Subset
+
+    fingerprint = backbone_fingerprint(model.state_dict())
+    if store.backbone != fingerprint:
+        if len(store):
+            print(f"⚠️ Backbone weights changed; discarding {len(store)} cached feature rows")
+        store.reset(fingerprint)
+
+    pending = []
+    # Shared across splits: an image listed in several splits is extracted once
+    seen = set()
+    for split in dict.fromkeys(splits):
+        try:
+            dataset = PackedImageDataset(cache_dir, split, transform=eval_transform())
+        except FileNotFoundError as missing:
+            print(f"⚠️ {missing}")
+            continue
+        todo = []
+        for position, item in enumerate(dataset.items):
+            if item['sha256'] not in store and item['sha256'] not in seen:
+                seen.add(item['sha256'])
+                todo.append(position)
+        print(f"🔍 {split}: {len(dataset) - len(todo)} of {len(dataset)} images cached or already queued, {len(todo)} to extract")
+        if todo:
+            pending.append((dataset, todo))
+
+    total = sum(len(todo) for _, todo in pending)
+    if not total:
+        return {'extracted': 0, 'cached': len(store), 'seconds': 0.0}
+
+    head, model.fc = model.fc, nn.Identity()
+    started = time.perf_counter()
+    done = 0
+    try:
+        with store.open_for_append() as f, torch.inference_mode():
+            for dataset, todo in pending:
+                loader = DataLoader(Subset(dataset, todo), batch_size=batch_size, num_workers=workers)
+                for batch_number, (images, _) in enumerate(loader):
+                    positions = todo[batch_number * batch_size:batch_number * batch_size + len(images)]
+                    store.append(f, [dataset.items[p]['sha256'] for p in positions], model(images).numpy())
+                    done += len(images)
+                    if (batch_number + 1) % SAVE_EVERY_BATCHES == 0:
+                        f.flush()
+                        store.save_index()
+                        elapsed = time.perf_counter() - started
+                        print(f"📊 Extracted {done}/{total} ({done / elapsed:.1f} images/s)")
+            f.flush()
+            os.fsync(f.fileno())
+    finally:
+        model.fc = head
+        store.save_index()
+
+    seconds = time.perf_counter() - started
+    print(f"✅ Extracted {done} feature rows in {seconds:.1f}s ({done / seconds:.1f} images/s); "
+          f"{len(store)} cached")
+    return {'extracted': done, 'cached': len(store), 'seconds': round(seconds, 2)}
+
+
+def split_features(store: FeatureStore, cache_dir: str, split: str):
+    """(features, labels) tensors for a packed split, read from the store"""
+    dataset = PackedImageDataset(cache_dir, split)
+    features = store.lookup([item['sha256'] for item in dataset.items])
+    return torch.from_numpy(features), dataset.labels
+
+
+def evaluate_head(head: nn.Module, features: torch.Tensor, labels: torch.Tensor) -> Dict[str, float]:
+    head.eval()
+    with torch.inference_mode():
+        outputs = head(features)
+        loss = nn.functional.cross_entropy(outputs, labels).item()
+        accuracy = (outputs.argmax(1) == labels).float().mean().item()
+    return {'loss': round(loss, 4), 'accuracy': round(accuracy * 100, 2)}
+
+
+def reset_head(head: nn.Module):
+    for module in head.modules():
+        if hasattr(module, 'reset_parameters'):
+            module.reset_parameters()
+
+
+def train_head(head: nn.Module, train_data, valid_data, epochs: int = 30, batch_size: int = 64,
+               lr: float = 1e-3, weight_decay: float = 0.01) -> Dict[str, Any]:
+    """Fit the head on cached features; keep the weights with the lowest validation loss
+
+    Uses the notebook's loss, optimizer and plateau schedule.
+    """
+    features, labels = train_data
+    criterion = nn.CrossEntropyLoss()
+    optimizer = torch.optim.AdamW(head.parameters(), lr=lr, weight_decay=weight_decay)
+    scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='min', patience=3, factor=0.5)
+
+    best = {'epoch': 0, **evaluate_head(head, *valid_data)}
+    best_state = {name: value.clone() for name, value in head.state_dict().items()}
+    started = time.perf_counter()
+    for epoch in range(1, epochs + 1):
+        head.train()
+        order = torch.randperm(len(labels))
+        for first in range(0, len(order), batch_size):
+            batch = order[first:first + batch_size]
+            if len(batch) < 2:
+                continue  # BatchNorm needs more than one sample
+            loss = criterion(head(features[batch]), labels[batch])
+            optimizer.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(head.parameters(), max_norm=1.0)
+            optimizer.step()
+
+        valid = evaluate_head(head, *valid_data)
+        scheduler.step(valid['loss'])
+        if valid['loss'] < best['loss']:
+            best = {'epoch': epoch, **valid}
+            best_state = {name: value.clone() for name, value in head.state_dict().items()}
+
+    head.load_state_dict(best_state)
+    head.eval()
+    return {**best, 'epochs': epochs, 'seconds': round(time.perf_counter() - started, 2)}
+
+
+def main():
+    """Main function for command line usage"""
+    parser = argparse.ArgumentParser(description='Cache backbone features and retrain the classifier head')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    for name, help_text in (('extract', 'Extract features for images not cached yet'),
+                            ('train', 'Extract new features, then retrain the head from the cache')):
+        command = subparsers.add_parser(name, help=help_text)
+        command.add_argument('--data', default='../dataset_cache', help='Packed dataset cache (dataset_cache.py build)')
+        command.add_argument('--output', default='../feature_cache', help='Feature cache directory')
+        command.add_argument('--checkpoint', default='../sneaker_model_production.pth', help='Source checkpoint')
+        command.add_argument('--batch-size', type=int, default=32, help='Images per backbone forward pass')
+        command.add_argument('--workers', type=int, default=0, help='DataLoader workers')
+        command.add_argument('--torch-threads', type=int, default=None, help='PyTorch intra-op threads')
+    extract = subparsers.choices['extract']
+    extract.add_argument('--splits', nargs='+', default=list(SPLITS), help='Splits to extract')
+    train = subparsers.choices['train']
+    train.add_argument('--save', default='../sneaker_model_retrained.pth', help='Checkpoint to write')
+    train.add_argument('--train-split', default='train', help='Split to fit on')
+    train.add_argument('--valid-split', default='valid', help='Split for model selection')
+    train.add_argument('--test-split', default='test', help='Split reported at the end (empty to skip)')
+    train.add_argument('--epochs', type=int, default=30, help='Epochs over the cached features')
+    train.add_argument('--lr', type=float, default=1e-3, help='Head learning rate')
+    train.add_argument('--reinit', action='store_true', help="Train from scratch instead of the checkpoint's head")
+    train.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+
+    if args.torch_threads:
+        torch.set_num_threads(args.torch_threads)
+    if os.path.abspath(getattr(args, 'save', '')) == os.path.abspath(args.checkpoint):
+        raise SystemExit("❌ --save must differ from --checkpoint; the source checkpoint is never overwritten")
+
+    model, checkpoint = load_checkpoint_model(args.checkpoint)
+    store = FeatureStore(args.output)
+    splits = args.splits if args.command == 'extract' else \
+        [split for split in (args.train_split, args.valid_split, args.test_split) if split]
+    try:
+        extract_features(model, store, args.data, splits, batch_size=args.batch_size, workers=args.workers)
+    except KeyboardInterrupt:
+        raise SystemExit(f"⚠️ Interrupted; {len(store)} feature rows kept, run again to continue")
+    if args.command == 'extract':
+        return
+
+    torch.manual_seed(args.seed)
+    head = model.fc
+    train_data = split_features(store, args.data, args.train_split)
+    valid_data = split_features(store, args.data, args.valid_split)
+    before = evaluate_head(head, *valid_data)
+    print(f"📋 Checkpoint head on {args.valid_split}: loss {before['loss']}, accuracy {before['accuracy']}%")
+    if args.reinit:
+        reset_head(head)
+
+    result = train_head(head, train_data, valid_data, epochs=args.epochs, lr=args.lr)
+    print(f"✅ Trained head on {len(train_data[1])} cached features in {result['seconds']}s: "
+          f"best epoch {result['epoch']}, {args.valid_split} loss {result['loss']}, accuracy {result['accuracy']}%")
+    if args.test_split:
+        test = evaluate_head(head, *split_features(store, args.data, args.test_split))
+        print(f"📋 {args.test_split}: loss {test['loss']}, accuracy {test['accuracy']}%")
+
+    model.eval()
+    torch.save({
+        **{key: value for key, value in checkpoint.items() if key != 'model_state_dict'},
+        'model_state_dict': model.state_dict(),
+        'head_training': {
+            'source_checkpoint': os.path.abspath(args.checkpoint),
+            'backbone': store.backbone,
+            'reinit': args.reinit,
+            'train_images': len(train_data[1]),
+            'valid_before': before,
+            'valid_after': {'loss': result['loss'], 'accuracy': result['accuracy']},
+            'best_epoch': result['epoch'],
+        },
+    }, args.save)
+    print(f"💾 Saved {args.save}; set it as the model file (and rerun checkpoint_format.py --convert) to serve it")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Fast-path image decoding for inference.
+
+The model only ever sees 224x224 pixels, so there is no reason to fully
+decode a 12 MP phone photo. JPEGs are decoded with PIL's draft mode, which
+lets libjpeg scale by 1/2, 1/4 or 1/8 during the DCT, and other formats are
+box-reduced after decoding. Both stop at twice the target size so the final
+antialiased resize still sees enough pixels to match full-resolution output.
+
+Usage:
+    python image_decode.py --parity ../classification_data_full/valid/fake
+"""
+
+import io
+import os
+from typing import Tuple
+
+from PIL import Image
+
+TARGET_SIZE = (224, 224)
+# Keep at least this multiple of the target size before the final resize
+OVERSAMPLE = 2
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when an image exceeds the decoded pixel budget"""
+
+
+def max_decode_pixels() -> int:
+    return int(os.getenv('MAX_DECODE_PIXELS', 50_000_000))
+
+
+def decode_image(data, target_size: Tuple[int, int] = TARGET_SIZE,
+                 max_pixels: int = None) -> Image.Image:
+    """Decode bytes or a file object to an RGB image close to the target scale
+
+    The original dimensions are kept in ``image.info['original_size']``.
+    """
+    if max_pixels is None:
+        max_pixels = max_decode_pixels()
+    source = io.BytesIO(data) if isinstance(data, (bytes, bytearray, memoryview)) else data
+
+    image = Image.open(source)
+    original_size = image.size
+    width, height = original_size
+    if max_pixels and width * height > max_pixels:
+        raise ImageTooLargeError(
+            f"Image too large: {width}x{height} exceeds {max_pixels} pixels"
+        )
+
+    min_size = (target_size[0] * OVERSAMPLE, target_size[1] * OVERSAMPLE)
+    if image.format == 'JPEG':
+        image.draft('RGB', min_size)
+    image = image.convert('RGB')
+
+    factor = min(image.width // min_size[0], image.height // min_size[1])
+    if factor >= 2:
+        image = image.reduce(factor)
+
+    image.info['original_size'] = original_size
+    return image
+
+
+def main():
+    """Main function for command line usage"""
+    import argparse
+    import glob
+    import time
+
+    import numpy as np
+    from torchvision import transforms
+
+    parser = argparse.ArgumentParser(description='Fast-path decode parity and timing check')
+    parser.add_argument('--parity', required=True, help='Directory of images to compare')
+    parser.add_argument('--limit', type=int, default=50, help='Maximum number of images')
+    args = parser.parse_args()
+
+    transform = transforms.Compose([
+        transforms.Resize(TARGET_SIZE),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+    ])
+
+    paths = sorted(glob.glob(os.path.join(args.parity, '*')))[:args.limit]
+    full_time = fast_time = 0.0
+    max_diff = mean_diff = 0.0
+    for path in paths:
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        started = time.perf_counter()
+        reference = transform(Image.open(io.BytesIO(data)).convert('RGB'))
+        full_time += time.perf_counter() - started
+
+        started = time.perf_counter()
+        fast = transform(decode_image(data))
+        fast_time += time.perf_counter() - started
+
+        diff = np.abs(reference.numpy() - fast.numpy())
+        max_diff = max(max_diff, float(diff.max()))
+        mean_diff += float(diff.mean())
+
+    count = max(1, len(paths))
+    print(f"Images: {len(paths)}")
+    print(f"Full decode: {full_time / count * 1000:.2f} ms/image")
+    print(f"Fast decode: {fast_time / count * 1000:.2f} ms/image")
+    print(f"Mean abs diff (normalized): {mean_diff / count:.5f}, max: {max_diff:.5f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Import-time profiling for the API process.
+
+Runs ``python -X importtime -c "import <module>"`` in a fresh interpreter
+and reports the cost of every module imported along the way: ``self`` is
+the time spent executing that module's own body, ``cumulative`` includes
+everything it imported in turn. Use it to spot heavy imports creeping onto
+the startup path, which delays the first health check after a restart.
+
+Usage:
+    python import_profile.py                   # top 20 modules for "import app"
+    python import_profile.py --sort self --top 40
+    python import_profile.py --budget 1.5      # exit 1 if "import app" is slower
+"""
+
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+# Modules that must stay off the startup path (imported by the warm-up thread)
+DEFERRED_MODULES = ('numpy', 'PIL', 'torch', 'torchvision', 'onnxruntime')
+
+
+def default_budget() -> float:
+    return float(os.getenv('IMPORT_BUDGET_SECONDS', 1.5))
+
+
+def profile_imports(module: str = 'app', cwd: str = None) -> List[Dict[str, Any]]:
+    """Import ``module`` in a fresh interpreter and return per-module timings"""
+    cwd = cwd or os.path.dirname(os.path.abspath(__file__))
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True,
+    )
+
+    entries = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # column header
+        name = fields[2].rstrip()
+        entries.append({
+            'module': name.strip(),
+            'depth': (len(name) - len(name.lstrip()) - 1) // 2,
+            'self_us': int(fields[0]),
+            'cumulative_us': int(fields[1]),
+        })
+    return entries
+
+
+def import_seconds(entries: List[Dict[str, Any]], module: str = 'app') -> float:
+    """Return the cumulative import time of the top-level ``module`` in seconds"""
+    for entry in entries:
+        if entry['module'] == module and entry['depth'] == 0:
+            return entry['cumulative_us'] / 1e6
+    raise ValueError(f"{module} not found in import profile")
+
+
+def deferred_imports(entries: List[Dict[str, Any]]) -> List[str]:
+    """Return the heavy packages that were imported although they should be deferred"""
+    imported = {entry['module'].split('.')[0] for entry in entries}
+    return [name for name in DEFERRED_MODULES if name in imported]
+
+
+def main():
+    """Main function for command line usage"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Profile module import time with -X importtime')
+    parser.add_argument('--module', default='app', help='Module to import')
+    parser.add_argument('--top', type=int, default=20, help='Number of modules to list')
+    parser.add_argument('--sort', choices=['cumulative', 'self'], default='cumulative', help='Sort key')
+    parser.add_argument('--budget', type=float, help='Fail if the import takes longer (seconds)')
+    args = parser.parse_args()
+
+    entries = profile_imports(args.module)
+    total = import_seconds(entries, args.module)
+    key = f'{args.sort}_us'
+
+    print(f"{'self ms':>9} {'cumul ms':>9}  module")
+    for entry in sorted(entries, key=lambda e: e[key], reverse=True)[:args.top]:
+        print(f"{entry['self_us'] / 1000:9.1f} {entry['cumulative_us'] / 1000:9.1f}  "
+              f"{'  ' * entry['depth']}{entry['module']}")
+    print(f"\nimport {args.module}: {total * 1000:.0f} ms across {len(entries)} modules")
+
+    early = deferred_imports(entries)
+    if early:
+        print(f"⚠️ Imported at startup but meant to be deferred: {', '.join(early)}")
+
+    if args.budget is not None and total > args.budget:
+        print(f"❌ Over the {args.budget:.2f}s import budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
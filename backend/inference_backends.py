@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Pluggable inference backends for the sneaker classifier.
+
+The default backend runs the eager PyTorch ResNet50. Setting
+INFERENCE_BACKEND=onnx or INFERENCE_BACKEND=onnx-int8 serves an exported
+ONNX graph (optionally statically quantized to int8) through ONNX Runtime instead.
+
+Usage:
+    python inference_backends.py --export
+    python inference_backends.py --parity --split ../classification_data_full/valid
+"""
+
+import os
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+BACKEND_CHOICES = ('torch', 'onnx', 'onnx-int8')
+
+
+def onnx_model_path(checkpoint_path: str, quantized: bool = False) -> str:
+    """Return the ONNX file that sits next to a .pth checkpoint"""
+    base = os.getenv('ONNX_MODEL_PATH') or os.path.splitext(checkpoint_path)[0] + '.onnx'
+    if quantized:
+        return os.path.splitext(base)[0] + '.int8.onnx'
+    return base
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class TorchBackend:
+    """Eager PyTorch inference"""
+
+    name = 'torch'
+
+    def __init__(self, model, device):
+        self.model = model
+        self.device = device
+
+    def predict_proba(self, batch) -> np.ndarray:
+        import torch
+
+        if isinstance(batch, np.ndarray):
+            batch = torch.from_numpy(batch)
+        with torch.no_grad():
+            outputs = self.model(batch.to(self.device))
+            probabilities = torch.nn.functional.softmax(outputs, dim=1)
+        return probabilities.cpu().numpy()
+
+
+class OnnxBackend:
+    """ONNX Runtime CPU inference"""
+
+    def __init__(self, path: str, name: str = 'onnx'):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = int(os.getenv('ONNX_INTRA_OP_THREADS', 0))
+        if threads:
+            options.intra_op_num_threads = threads
+
+        self.name = name
+        self.path = path
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict_proba(self, batch) -> np.ndarray:
+        if not isinstance(batch, np.ndarray):
+            batch = batch.numpy()
+        logits = self.session.run(None, {self.input_name: np.ascontiguousarray(batch, dtype=np.float32)})[0]
+        return _softmax(logits)
+
+
+def export_onnx(model, path: str):
+    """Export an eval-mode torch model to ONNX with a dynamic batch axis"""
+    import torch
+
+    model.eval()
+    dummy = torch.zeros(1, 3, 224, 224)
+    torch.onnx.export(
+        model,
+        dummy,
+        path,
+        input_names=['input'],
+        output_names=['logits'],
+        dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}},
+        opset_version=17,
+        dynamo=False,
+    )
+    print(f"✅ Exported ONNX model: {path} ({os.path.getsize(path) / (1024*1024):.1f} MB)")
+
+
+def quantize_onnx(src: str, dst: str, calibration_batches: List[np.ndarray]):
+    """Write a statically int8-quantized (QDQ) copy of an ONNX model
+
+    Activation ranges are calibrated on ``calibration_batches``; static
+    quantization keeps convolutions in int8 kernels, which dynamic
+    quantization does not do efficiently on CPU.
+    """
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat,
+                                          QuantType, quantize_static)
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    class _BatchReader(CalibrationDataReader):
+        def __init__(self, batches):
+            self._batches = iter(batches)
+
+        def get_next(self):
+            batch = next(self._batches, None)
+            return None if batch is None else {'input': batch}
+
+    prepared = dst + '.prep'
+    try:
+        quant_pre_process(src, prepared)
+        quantize_static(
+            prepared,
+            dst,
+            _BatchReader(calibration_batches),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            weight_type=QuantType.QInt8,
+            activation_type=QuantType.QUInt8,
+        )
+    finally:
+        if os.path.exists(prepared):
+            os.remove(prepared)
+    print(f"✅ Quantized ONNX model: {dst} ({os.path.getsize(dst) / (1024*1024):.1f} MB)")
+
+
+def _load_split(split_dir: str, limit: int = 0) -> List[tuple]:
+    samples = []
+    for label, class_name in enumerate(['fake', 'real']):
+        class_dir = os.path.join(split_dir, class_name)
+        files = sorted(os.listdir(class_dir)) if os.path.isdir(class_dir) else []
+        samples.extend((os.path.join(class_dir, name), label) for name in files)
+    if limit:
+        samples = samples[::max(1, len(samples) // limit)][:limit]
+    return samples
+
+
+def reference_transform():
+    """The torchvision preprocessing the checkpoint was validated with
+
+    Serving uses preprocessing.BatchPreprocessor instead; this stack is only
+    built for export calibration and parity checks.
+    """
+    from torchvision import transforms
+
+    return transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+    ])
+
+
+def check_parity(loader, backends: Dict[str, Any], split_dir: str,
+                 batch_size: int = 16, limit: int = 0) -> Dict[str, Any]:
+    """Compare accuracy and agreement of each backend against eager PyTorch"""
+    import torch
+    from PIL import Image
+
+    transform = reference_transform()
+    samples = _load_split(split_dir, limit)
+    if not samples:
+        raise ValueError(f"No images found under {split_dir}")
+
+    probabilities = {name: [] for name in backends}
+    timings = {name: 0.0 for name in backends}
+    labels = []
+    for start in range(0, len(samples), batch_size):
+        chunk = samples[start:start + batch_size]
+        batch = torch.stack([
+            transform(Image.open(path).convert('RGB')) for path, _ in chunk
+        ])
+        labels.extend(label for _, label in chunk)
+        for name, backend in backends.items():
+            started = time.perf_counter()
+            probabilities[name].append(backend.predict_proba(batch))
+            timings[name] += time.perf_counter() - started
+
+    labels = np.array(labels)
+    reference = np.concatenate(probabilities['torch'])
+    report = {'split': split_dir, 'images': len(labels), 'backends': {}}
+    for name in backends:
+        probs = np.concatenate(probabilities[name])
+        predicted = probs.argmax(axis=1)
+        report['backends'][name] = {
+            'accuracy': round(float((predicted == labels).mean()) * 100, 2),
+            'agreement_with_torch': round(float((predicted == reference.argmax(axis=1)).mean()) * 100, 2),
+            'max_prob_diff': round(float(np.abs(probs - reference).max()), 5),
+            'ms_per_image': round(timings[name] / len(labels) * 1000, 2),
+        }
+    return report
+
+
+def main():
+    """Main function for command line usage"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='ONNX export and parity check for the sneaker classifier')
+    parser.add_argument('--export', action='store_true', help='Export ONNX and int8-quantized ONNX models')
+    parser.add_argument('--parity', action='store_true', help='Check accuracy parity against the PyTorch checkpoint')
+    parser.add_argument('--split', default='../classification_data_full/valid', help='Split directory with fake/ and real/ folders')
+    parser.add_argument('--calibration', default='../classification_data_full/train', help='Split directory used to calibrate int8 activations')
+    parser.add_argument('--calibration-images', type=int, default=32, help='Number of calibration images')
+    parser.add_argument('--limit', type=int, default=0, help='Evaluate at most this many images')
+    parser.add_argument('--batch-size', type=int, default=16, help='Evaluation batch size')
+    args = parser.parse_args()
+
+    # Always build the reference model with eager PyTorch
+    os.environ['INFERENCE_BACKEND'] = 'torch'
+    from app import LightweightModelLoader
+
+    loader = LightweightModelLoader()
+    loader.load_model_lazily()
+    if not loader.model_loaded:
+        raise SystemExit("❌ Could not load the PyTorch checkpoint")
+
+    checkpoint_path = loader.model_path or 'sneaker_model_production.pth'
+    fp32_path = onnx_model_path(checkpoint_path)
+    int8_path = onnx_model_path(checkpoint_path, quantized=True)
+
+    if args.export:
+        from PIL import Image
+
+        export_onnx(loader.model.cpu(), fp32_path)
+        transform = reference_transform()
+        calibration = [
+            transform(Image.open(path).convert('RGB')).unsqueeze(0).numpy()
+            for path, _ in _load_split(args.calibration, args.calibration_images)
+        ]
+        quantize_onnx(fp32_path, int8_path, calibration)
+
+    if args.parity:
+        backends = {'torch': loader.backend}
+        if os.path.exists(fp32_path):
+            backends['onnx'] = OnnxBackend(fp32_path)
+        if os.path.exists(int8_path):
+            backends['onnx-int8'] = OnnxBackend(int8_path, name='onnx-int8')
+        report = check_parity(loader, backends, args.split, args.batch_size, args.limit)
+        print(f"Parity Report: {report}")
+
+
+if __name__ == "__main__":
+    main()
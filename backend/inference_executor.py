@@ -0,0 +1,82 @@
+"""
+Bounded thread pool for blocking decode and inference work.
+
+Keeps CPU-heavy work off the asyncio event loop and rejects new work once the
+pool and its waiting queue are full, instead of letting requests pile up.
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+class ExecutorSaturated(Exception):
+    """Raised when the executor has no free worker or queue slot"""
+
+
+class BoundedExecutor:
+    """Thread pool with a hard limit on running plus queued tasks"""
+
+    def __init__(self, max_workers: int = 4, max_pending: int = 32):
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending = max(0, int(max_pending))
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix='inference'
+        )
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_pending)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Submit work or raise ExecutorSaturated if capacity is exhausted"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise ExecutorSaturated(
+                f"Inference capacity exhausted ({self.max_workers} workers, "
+                f"{self.max_pending} queued)"
+            )
+        with self._lock:
+            self._in_flight += 1
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+        self._slots.release()
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run work in the pool and await its result from the event loop"""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return pool utilisation counters"""
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'in_flight': self._in_flight,
+                'completed': self._completed,
+                'rejected': self._rejected,
+            }
+
+
+def executor_from_env(default_workers: int = 4) -> BoundedExecutor:
+    """Create an executor configured by INFERENCE_WORKERS and INFERENCE_QUEUE_SIZE"""
+    return BoundedExecutor(
+        max_workers=int(os.getenv('INFERENCE_WORKERS', default_workers)),
+        max_pending=int(os.getenv('INFERENCE_QUEUE_SIZE', 32)),
+    )
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Persistent job queue for large offline scoring runs.
+
+Jobs and their items live in a local SQLite database, and uploaded images
+are spooled to disk next to it. Workers claim pending items in batches,
+score them through ``LightweightModelLoader.predict_batch`` and record each
+result as it finishes. Items left "running" by a crashed or restarted
+worker go back to pending on startup, so finished items are never scored
+twice.
+
+Run either the in-process worker thread started by the API (the default,
+JOBS_WORKER=inline) or standalone worker processes (JOBS_WORKER=external)
+against the same JOBS_DIR, not both.
+
+Usage:
+    python jobs.py --worker                # one standalone worker process
+    python jobs.py --worker --processes 2  # several worker processes
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    total INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    result TEXT,
+    updated_at REAL,
+    PRIMARY KEY (job_id, seq)
+);
+CREATE INDEX IF NOT EXISTS items_status ON items (status);
+"""
+
+
+def jobs_dir() -> str:
+    return os.getenv('JOBS_DIR', 'jobs_data')
+
+
+def jobs_exist(root: str = None) -> bool:
+    """Return True if a job database has been created under JOBS_DIR"""
+    return os.path.exists(os.path.join(root or jobs_dir(), 'jobs.sqlite3'))
+
+
+class JobStore:
+    """SQLite-backed store for jobs and their per-image items"""
+
+    def __init__(self, root: str = None):
+        self.root = root or jobs_dir()
+        os.makedirs(self.root, exist_ok=True)
+        self.db_path = os.path.join(self.root, 'jobs.sqlite3')
+        # Signalled when new work is queued by this process
+        self.work_available = threading.Event()
+        with closing(self._connect()) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create_job(self, uploads: List[Tuple[str, BinaryIO]]) -> Dict[str, Any]:
+        """Spool uploaded files to disk and queue one item per image"""
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.root, job_id)
+        os.makedirs(job_dir)
+
+        rows = []
+        for seq, (filename, source) in enumerate(uploads):
+            safe_name = os.path.basename(filename or f'image_{seq}')
+            path = os.path.join(job_dir, f'{seq:06d}_{safe_name}')
+            with open(path, 'wb') as out:
+                if isinstance(source, (bytes, bytearray)):
+                    out.write(source)
+                else:
+                    shutil.copyfileobj(source, out, 1024 * 1024)
+            rows.append((job_id, seq, safe_name, path))
+
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('INSERT INTO jobs (id, created_at, total) VALUES (?, ?, ?)',
+                         (job_id, time.time(), len(rows)))
+            conn.executemany('INSERT INTO items (job_id, seq, filename, path) VALUES (?, ?, ?, ?)', rows)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+        finally:
+            conn.close()
+
+        self.work_available.set()
+        return {'job_id': job_id, 'total': len(rows)}
+
+    def reset_running(self) -> int:
+        """Return items orphaned by a previous worker to the queue"""
+        with closing(self._connect()) as conn:
+            cursor = conn.execute("UPDATE items SET status = 'pending' WHERE status = 'running'")
+            return cursor.rowcount
+
+    def claim_items(self, limit: int) -> List[sqlite3.Row]:
+        """Atomically move up to ``limit`` pending items to running"""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            rows = conn.execute(
+                "SELECT job_id, seq, filename, path FROM items WHERE status = 'pending' "
+                "ORDER BY rowid LIMIT ?", (limit,)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE items SET status = 'running', updated_at = ? WHERE job_id = ? AND seq = ?",
+                [(time.time(), row['job_id'], row['seq']) for row in rows]
+            )
+            conn.execute('COMMIT')
+            return rows
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def complete_items(self, outcomes: List[Tuple[str, int, Dict[str, Any]]]):
+        """Record results; an outcome with an 'error' key marks the item failed"""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.executemany(
+                "UPDATE items SET status = ?, result = ?, updated_at = ? WHERE job_id = ? AND seq = ?",
+                [('failed' if 'error' in result else 'done', json.dumps(result), now, job_id, seq)
+                 for job_id, seq, result in outcomes]
+            )
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return job progress counters, or None if the job does not exist"""
+        with closing(self._connect()) as conn:
+            job = conn.execute('SELECT id, created_at, total FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if job is None:
+                return None
+            counts = dict(conn.execute(
+                'SELECT status, COUNT(*) FROM items WHERE job_id = ? GROUP BY status', (job_id,)
+            ).fetchall())
+
+        finished = counts.get('done', 0) + counts.get('failed', 0)
+        if finished == job['total']:
+            status = 'completed'
+        elif finished or counts.get('running'):
+            status = 'running'
+        else:
+            status = 'queued'
+        return {
+            'job_id': job['id'],
+            'status': status,
+            'created_at': job['created_at'],
+            'total': job['total'],
+            'completed': counts.get('done', 0),
+            'failed': counts.get('failed', 0),
+            'pending': counts.get('pending', 0) + counts.get('running', 0),
+            'progress': round(finished / job['total'] * 100, 2) if job['total'] else 100.0,
+        }
+
+    def list_results(self, job_id: str, offset: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """Return one page of finished item results in submission order"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT seq, filename, result FROM items WHERE job_id = ? "
+                "AND status IN ('done', 'failed') ORDER BY seq LIMIT ? OFFSET ?",
+                (job_id, limit, offset)
+            ).fetchall()
+        return [{'seq': row['seq'], 'filename': row['filename'], **json.loads(row['result'])} for row in rows]
+
+    def iter_results(self, job_id: str, page_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """Yield every finished item result, reading the table page by page"""
+        last_seq = -1
+        while True:
+            with closing(self._connect()) as conn:
+                rows = conn.execute(
+                    "SELECT seq, filename, result FROM items WHERE job_id = ? AND seq > ? "
+                    "AND status IN ('done', 'failed') ORDER BY seq LIMIT ?",
+                    (job_id, last_seq, page_size)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield {'seq': row['seq'], 'filename': row['filename'], **json.loads(row['result'])}
+            last_seq = rows[-1]['seq']
+
+
+class JobWorker:
+    """Claim queued items and score them in batches"""
+
+    def __init__(self, store: JobStore, score_batch: Callable[[List[Any]], List[Dict[str, Any]]],
+                 batch_size: int = 8, poll_interval: float = 1.0):
+        self.store = store
+        self.score_batch = score_batch
+        self.batch_size = max(1, int(batch_size))
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def process_once(self) -> int:
+        """Score one claimed batch; return how many items were processed"""
+        rows = self.store.claim_items(self.batch_size)
+        if not rows:
+            return 0
+
+        from image_decode import decode_image
+
+        outcomes = []
+        images = []
+        decoded_rows = []
+        for row in rows:
+            try:
+                with open(row['path'], 'rb') as f:
+                    images.append(decode_image(f.read()))
+                decoded_rows.append(row)
+            except Exception as e:
+                outcomes.append((row['job_id'], row['seq'], {'error': f'Invalid image format: {str(e)}'}))
+
+        if images:
+            try:
+                results = self.score_batch(images)
+            except Exception as e:
+                results = [{'error': f'Model prediction failed: {str(e)}'}] * len(images)
+            outcomes.extend((row['job_id'], row['seq'], result) for row, result in zip(decoded_rows, results))
+
+        self.store.complete_items(outcomes)
+        for row in rows:
+            try:
+                os.remove(row['path'])
+            except OSError:
+                pass
+        return len(rows)
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                processed = self.process_once()
+            except Exception as e:
+                print(f"❌ Job worker error: {e}")
+                processed = 0
+            if not processed:
+                self.store.work_available.wait(self.poll_interval)
+                self.store.work_available.clear()
+
+    def start(self):
+        """Run the worker on a daemon thread"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self.run_forever, name='job-worker', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.store.work_available.set()
+
+
+def recover_unfinished(store: JobStore):
+    """Re-queue items left running by a previous run; call before starting workers"""
+    recovered = store.reset_running()
+    if recovered:
+        print(f"🔄 Re-queued {recovered} unfinished job items")
+
+
+def _worker_process():
+    from app import get_model_loader
+
+    loader = get_model_loader()
+    loader.load_model_lazily()
+    worker = JobWorker(JobStore(), loader.predict_batch,
+                       batch_size=int(os.getenv('BATCH_MAX_SIZE', 8)),
+                       poll_interval=float(os.getenv('JOBS_POLL_INTERVAL', 1.0)))
+    print(f"✅ Job worker {os.getpid()} started")
+    try:
+        worker.run_forever()
+    except KeyboardInterrupt:
+        print(f"Job worker {os.getpid()} stopped")
+
+
+def main():
+    """Main function for command line usage"""
+    import argparse
+    import multiprocessing
+
+    parser = argparse.ArgumentParser(description='Offline scoring job worker')
+    parser.add_argument('--worker', action='store_true', help='Run job worker(s) against JOBS_DIR')
+    parser.add_argument('--processes', type=int, default=1, help='Number of worker processes')
+    args = parser.parse_args()
+
+    if not args.worker:
+        parser.print_help()
+        return
+
+    recover_unfinished(JobStore())
+
+    if args.processes <= 1:
+        _worker_process()
+        return
+
+    processes = [multiprocessing.Process(target=_worker_process) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
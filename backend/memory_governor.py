@@ -0,0 +1,307 @@
+"""
+Background memory governor built on MemoryOptimizer.
+
+Instead of a full ``gc.collect()`` on every request, a daemon thread checks
+RSS against the MemoryOptimizer thresholds every MEMORY_CHECK_INTERVAL
+seconds:
+
+- normal: nothing to do; capacities reduced earlier grow back one step per
+  check once RSS is back in the lower 90% of the headroom below the
+  warning threshold;
+- warning: collect garbage (at most every MEMORY_GC_COOLDOWN seconds, backing
+  off while collections free nothing) and halve registered capacities such
+  as cache sizes and the maximum batch size, one step every
+  MEMORY_STEP_INTERVAL seconds while the pressure lasts;
+- critical: collect immediately and halve capacities on every check.
+
+The loaded model alone is above any fixed threshold that suits a small
+instance, so unless MEMORY_WARNING_MB or MEMORY_CRITICAL_MB is set the
+thresholds are calibrated from the RSS once the model is loaded: a share of
+the room left under the container memory limit or, without a limit, a fixed
+headroom (MEMORY_WARNING_HEADROOM_MB, default 256, and
+MEMORY_CRITICAL_HEADROOM_MB, default 384). Until then only the container
+limit, if any, is enforced.
+
+Every action is recorded so the decisions can be inspected over HTTP.
+"""
+
+import ctypes
+import datetime
+import gc
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from profiler import tag_stage
+
+LEVELS = ('normal', 'warning', 'critical')
+# Restore capacities only once RSS is comfortably below the warning threshold
+RELIEF_RATIO = 0.9
+# A collection freeing less than this doubles the cooldown
+MIN_USEFUL_FREE_MB = 1.0
+# Shares of the room between the calibrated baseline and the container limit
+WARNING_LIMIT_SHARE = 0.6
+CRITICAL_LIMIT_SHARE = 0.85
+# Before calibration, with a container limit, as fractions of the limit
+UNCALIBRATED_WARNING_RATIO = 0.85
+UNCALIBRATED_CRITICAL_RATIO = 0.95
+# cgroup v1 reports "no limit" as a huge number
+UNLIMITED_BYTES = 1 << 60
+
+
+def _malloc_trim() -> bool:
+    """Return freed heap pages to the OS (glibc only)"""
+    try:
+        return bool(ctypes.CDLL('libc.so.6').malloc_trim(0))
+    except (OSError, AttributeError):
+        return False
+
+
+def container_memory_limit_mb() -> Optional[float]:
+    """The cgroup (v2 or v1) memory limit of this process, or None without one"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and 0 < int(value) < UNLIMITED_BYTES:
+            return int(value) / (1024 * 1024)
+        return None
+    return None
+
+
+class MemoryGovernor:
+    """Watch RSS and react to memory pressure in the background"""
+
+    def __init__(self, optimizer, interval: float = 5.0, gc_cooldown: float = 30.0, history: int = 50,
+                 step_interval: float = 30.0, auto_thresholds: bool = True, memory_limit_mb: float = None,
+                 warning_headroom_mb: float = 256.0, critical_headroom_mb: float = 384.0):
+        self.optimizer = optimizer
+        self.interval = max(0.1, float(interval))
+        self.base_cooldown = max(0.0, float(gc_cooldown))
+        self.gc_cooldown = self.base_cooldown
+        self.step_interval = max(0.0, float(step_interval))
+        self.auto_thresholds = auto_thresholds
+        self.memory_limit_mb = memory_limit_mb
+        self.warning_headroom_mb = float(warning_headroom_mb)
+        self.critical_headroom_mb = max(float(critical_headroom_mb), self.warning_headroom_mb)
+        self.baseline_mb: Optional[float] = None
+        self.level = 'normal'
+        self.last_status: Dict[str, Any] = {}
+        self.decisions: deque = deque(maxlen=history)
+        self.checks = 0
+        self.collections = 0
+
+        self._reducers: List[tuple] = []
+        self._reduced = False
+        self._last_collect = float('-inf')
+        self._last_step = float('-inf')
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        if self.auto_thresholds:
+            if self.memory_limit_mb:
+                optimizer.set_thresholds(self.memory_limit_mb * UNCALIBRATED_WARNING_RATIO,
+                                         self.memory_limit_mb * UNCALIBRATED_CRITICAL_RATIO)
+            else:
+                # Nothing sensible to compare against until the model is loaded
+                optimizer.set_thresholds(float('inf'), float('inf'))
+
+    def register(self, name: str, step_down: Callable[[], Optional[str]], step_up: Callable[[], Optional[str]]):
+        """Register a component to shrink under pressure
+
+        ``step_down()`` is called for each reduction step and ``step_up()``
+        for each recovery step once pressure is gone; both return a short
+        description of what they did, or None when already at their limit.
+        """
+        self._reducers.append((name, step_down, step_up))
+
+    def register_capacity(self, name: str, setter: Callable[[int], None], base: int, minimum: int = 0):
+        """Halve a capacity per reduction step, down to ``minimum``, and double it back up to ``base``"""
+        current = [base]
+
+        def step_down() -> Optional[str]:
+            value = max(minimum, current[0] // 2)
+            if value == current[0]:
+                return None
+            setter(value)
+            previous, current[0] = current[0], value
+            return f'{previous} -> {value}'
+
+        def step_up() -> Optional[str]:
+            value = min(base, max(current[0] * 2, minimum + 1))
+            if value == current[0]:
+                return None
+            setter(value)
+            previous, current[0] = current[0], value
+            return f'{previous} -> {value}' + (' (restored)' if value == base else '')
+
+        self.register(name, step_down, step_up)
+
+    def calibrate(self) -> Dict[str, Any]:
+        """Set automatic thresholds relative to the current RSS, taken as the loaded footprint"""
+        with self._lock:
+            rss_mb = self.optimizer.get_memory_info().get('rss_mb')
+            if rss_mb is None:
+                return self.get_thresholds()
+            self.baseline_mb = rss_mb
+            if self.auto_thresholds:
+                room = (self.memory_limit_mb - rss_mb) if self.memory_limit_mb else 0
+                if room > 0:
+                    warning = rss_mb + room * WARNING_LIMIT_SHARE
+                    critical = rss_mb + room * CRITICAL_LIMIT_SHARE
+                else:
+                    warning = rss_mb + self.warning_headroom_mb
+                    critical = rss_mb + self.critical_headroom_mb
+                self.optimizer.set_thresholds(warning, critical)
+        thresholds = self.get_thresholds()
+        print(f"✅ Memory thresholds calibrated at {rss_mb:.0f} MB RSS: warning {thresholds['warning_mb']} MB, "
+              f"critical {thresholds['critical_mb']} MB"
+              + ('' if self.auto_thresholds else ' (set by MEMORY_WARNING_MB/MEMORY_CRITICAL_MB)'))
+        return thresholds
+
+    def relief_mb(self) -> float:
+        """RSS below which reduced capacities start growing back"""
+        warning_mb = self.optimizer.memory_threshold / (1024 * 1024)
+        if self.baseline_mb is not None and self.baseline_mb < warning_mb:
+            return self.baseline_mb + (warning_mb - self.baseline_mb) * RELIEF_RATIO
+        return warning_mb * RELIEF_RATIO
+
+    def get_thresholds(self) -> Dict[str, Any]:
+        def megabytes(value):
+            return None if value == float('inf') else round(value / (1024 * 1024), 1)
+
+        return {
+            'warning_mb': megabytes(self.optimizer.memory_threshold),
+            'critical_mb': megabytes(self.optimizer.critical_threshold),
+            'relief_mb': megabytes(self.relief_mb() * 1024 * 1024),
+            'baseline_mb': round(self.baseline_mb, 1) if self.baseline_mb is not None else None,
+            'memory_limit_mb': round(self.memory_limit_mb, 1) if self.memory_limit_mb else None,
+            'source': 'auto' if self.auto_thresholds else 'env',
+        }
+
+    def _collect(self) -> str:
+        rss_before = self.optimizer.get_memory_info().get('rss_mb', 0)
+        started = time.perf_counter()
+        with tag_stage('gc_collect'):
+            collected = gc.collect()
+            trimmed = _malloc_trim()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        freed_mb = max(0.0, rss_before - self.optimizer.get_memory_info().get('rss_mb', rss_before))
+
+        self.collections += 1
+        self._last_collect = time.monotonic()
+        # Back off while collections don't help (e.g. RSS is mostly model weights)
+        if freed_mb < MIN_USEFUL_FREE_MB:
+            self.gc_cooldown = min(max(self.gc_cooldown * 2, 1.0), 3600.0)
+        else:
+            self.gc_cooldown = self.base_cooldown
+        return (f'gc.collect: {collected} objects, freed {freed_mb:.1f} MB in {elapsed_ms:.0f} ms'
+                + (', malloc_trim' if trimmed else ''))
+
+    def _step(self, up: bool) -> List[str]:
+        actions = []
+        for name, step_down, step_up in self._reducers:
+            description = step_up() if up else step_down()
+            if description:
+                actions.append(f'{name}: {description}')
+        self._last_step = time.monotonic()
+        # Recovery is finished once no capacity can grow any further
+        self._reduced = bool(actions) or not up
+        return actions
+
+    def check(self) -> Dict[str, Any]:
+        """Run one check and act on the current memory level"""
+        with self._lock:
+            status = self.optimizer.check_memory_usage()
+            level = status.get('status')
+            if level not in LEVELS:
+                return status
+            self.checks += 1
+            self.last_status = status
+
+            actions = []
+            escalated = LEVELS.index(level) > LEVELS.index(self.level)
+            if level != 'normal':
+                if escalated or time.monotonic() - self._last_collect >= self.gc_cooldown:
+                    actions.append(self._collect())
+                if escalated or level == 'critical' or time.monotonic() - self._last_step >= self.step_interval:
+                    actions.extend(self._step(up=False))
+            elif self.level != 'normal' or self._reduced:
+                if status['rss_mb'] < self.relief_mb():
+                    actions.extend(self._step(up=True))
+                    self.gc_cooldown = self.base_cooldown
+                else:
+                    # Hold the reduced capacities until pressure is clearly gone
+                    level = self.level
+
+            if actions:
+                self.decisions.append({
+                    'time': datetime.datetime.now().isoformat(timespec='seconds'),
+                    'level': level,
+                    'previous_level': self.level,
+                    'rss_mb': round(status['rss_mb'], 1),
+                    'actions': actions,
+                })
+                print(f"🧹 Memory {level} ({status['rss_mb']:.0f} MB): {'; '.join(actions)}")
+            self.level = level
+            return status
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                self.check()
+            except Exception as e:
+                print(f"❌ Memory governor error: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """Run the governor on a daemon thread"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self.run_forever, name='memory-governor', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return the current level, thresholds and recent decisions"""
+        thresholds = self.get_thresholds()
+        return {
+            'level': self.level,
+            'rss_mb': round(self.last_status.get('rss_mb', 0), 1),
+            'warning_threshold_mb': thresholds['warning_mb'],
+            'critical_threshold_mb': thresholds['critical_mb'],
+            'thresholds': thresholds,
+            'check_interval_seconds': self.interval,
+            'step_interval_seconds': self.step_interval,
+            'gc_cooldown_seconds': self.gc_cooldown,
+            'checks': self.checks,
+            'collections': self.collections,
+            'capacities_reduced': self._reduced,
+            'reducers': [name for name, _, _ in self._reducers],
+            'decisions': list(self.decisions),
+        }
+
+
+def governor_from_env(optimizer) -> MemoryGovernor:
+    """Create a governor configured by the MEMORY_* variables
+
+    Explicit MEMORY_WARNING_MB/MEMORY_CRITICAL_MB thresholds (read by the
+    optimizer) turn off calibration.
+    """
+    explicit = bool(os.getenv('MEMORY_WARNING_MB') or os.getenv('MEMORY_CRITICAL_MB'))
+    return MemoryGovernor(
+        optimizer,
+        interval=float(os.getenv('MEMORY_CHECK_INTERVAL', 5.0)),
+        gc_cooldown=float(os.getenv('MEMORY_GC_COOLDOWN', 30.0)),
+        step_interval=float(os.getenv('MEMORY_STEP_INTERVAL', 30.0)),
+        auto_thresholds=not explicit,
+        memory_limit_mb=container_memory_limit_mb(),
+        warning_headroom_mb=float(os.getenv('MEMORY_WARNING_HEADROOM_MB', 256)),
+        critical_headroom_mb=float(os.getenv('MEMORY_CRITICAL_HEADROOM_MB', 384)),
+    )
@@ -18,7 +18,13 @@ logger = logging.getLogger(__name__)
 class MemoryOptimizer:
     def __init__(self):
         self.process = psutil.Process()
-        self.memory_threshold = 400 * 1024 * 1024  # 400MB threshold
+        self.memory_threshold = int(os.getenv('MEMORY_WARNING_MB', 400)) * 1024 * 1024  # MEMORY_WARNING_MB, default 400MB
+        self.critical_threshold = int(os.getenv('MEMORY_CRITICAL_MB', 450)) * 1024 * 1024  # MEMORY_CRITICAL_MB, default 450MB
+        
+    def set_thresholds(self, warning_mb: float, critical_mb: float):
+        """Replace the warning and critical RSS thresholds"""
+        self.memory_threshold = warning_mb * 1024 * 1024
+        self.critical_threshold = critical_mb * 1024 * 1024
         
     def get_memory_info(self) -> Dict[str, Any]:
         """Get current memory usage information"""
@@ -86,7 +92,7 @@ class MemoryOptimizer:
             status = 'normal'
             if is_high_memory or is_high_percent:
                 status = 'warning'
-            if rss_mb > 450 * 1024 * 1024 / (1024 * 1024):  # 450MB
+            if rss_mb > self.critical_threshold / (1024 * 1024):
                 status = 'critical'
             
             return {
@@ -94,6 +100,7 @@ class MemoryOptimizer:
                 'rss_mb': rss_mb,
                 'percent': percent,
                 'threshold_mb': self.memory_threshold / (1024 * 1024),
+                'critical_threshold_mb': self.critical_threshold / (1024 * 1024),
                 'is_high_memory': is_high_memory,
                 'is_high_percent': is_high_percent,
                 'recommendation': self._get_recommendation(status, rss_mb, percent)
@@ -0,0 +1,289 @@
+"""
+Resumable, parallel, checksum-verified model download.
+
+The file is fetched into ``<dest>.part`` with several concurrent HTTP Range
+requests (MODEL_DOWNLOAD_PARTS, default 4) and large buffers
+(MODEL_DOWNLOAD_CHUNK_MB, default 1). Progress is recorded in
+``<dest>.part.json``, so an interrupted download resumes from where each range
+stopped, provided the server still reports the same size and ETag or
+Last-Modified. Servers without range support get a single stream.
+
+When the download is complete, its SHA-256 is checked against MODEL_SHA256
+(if set). Only then is the file moved into place with an atomic rename, so
+``dest`` never holds a truncated or corrupt model. The digest is recorded in
+``<dest>.sha256.json`` together with the file's size and mtime. Later checks
+can then validate the cached model without re-hashing it.
+
+Usage:
+    python model_download.py URL [--dest sneaker_model_production.pth] [--sha256 HEX]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import requests
+
+DEFAULT_CHUNK_BYTES = 1024 * 1024
+# Smaller files are not worth splitting into ranges
+MIN_PART_BYTES = 8 * 1024 * 1024
+# Persist resume state after roughly this much new data
+STATE_SAVE_BYTES = 8 * 1024 * 1024
+
+
+class DownloadError(Exception):
+    """Raised when a download cannot be completed or fails verification"""
+
+
+def file_sha256(path: str, chunk_size: int = DEFAULT_CHUNK_BYTES) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def digest_record_path(path: str) -> str:
+    return path + '.sha256.json'
+
+
+def read_digest_record(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(digest_record_path(path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_digest_record(path: str, sha256: str, url: str = None) -> Dict[str, Any]:
+    """Record the digest of ``path`` along with the size and mtime it was taken at"""
+    file_stat = os.stat(path)
+    record = {
+        'sha256': sha256,
+        'size': file_stat.st_size,
+        'mtime_ns': file_stat.st_mtime_ns,
+        'url': url,
+    }
+    with open(digest_record_path(path), 'w') as f:
+        json.dump(record, f, indent=2)
+    return record
+
+
+def cached_sha256(path: str) -> str:
+    """SHA-256 of ``path``, from its digest record while size and mtime are unchanged"""
+    record = read_digest_record(path)
+    file_stat = os.stat(path)
+    if record and record.get('size') == file_stat.st_size and record.get('mtime_ns') == file_stat.st_mtime_ns:
+        return record['sha256']
+    sha256 = file_sha256(path)
+    try:
+        write_digest_record(path, sha256, record.get('url') if record else None)
+    except OSError:
+        pass  # Read-only location; hash again next time
+    return sha256
+
+
+class ModelDownloader:
+    """Download ``url`` to ``dest`` with parallel ranges, resume and verification"""
+
+    def __init__(self, url: str, dest: str, sha256: str = None, parts: int = 4,
+                 chunk_size: int = DEFAULT_CHUNK_BYTES, retries: int = 3, timeout: float = 30.0,
+                 min_part_bytes: int = MIN_PART_BYTES):
+        self.url = url
+        self.dest = dest
+        self.sha256 = sha256.lower() if sha256 else None
+        self.parts = max(1, int(parts))
+        self.chunk_size = max(1024, int(chunk_size))
+        self.retries = max(0, int(retries))
+        self.timeout = timeout
+        self.min_part_bytes = max(1, int(min_part_bytes))
+        self.part_path = dest + '.part'
+        self.state_path = dest + '.part.json'
+
+        self.size = 0
+        self.resumed_bytes = 0
+        self.fetched_bytes = 0
+        self._ranges: List[List[int]] = []
+        self._validator: Optional[str] = None
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self._next_report = 0.0
+
+    def _probe(self):
+        """Find the size and range support with a one-byte ranged GET"""
+        with requests.get(self.url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            self._validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+            content_range = response.headers.get('Content-Range', '')
+            if response.status_code == 206 and '/' in content_range:
+                total = content_range.rsplit('/', 1)[1]
+                if total.isdigit():
+                    return int(total), True
+            return int(response.headers.get('Content-Length', 0)), False
+
+    def _plan(self, ranged: bool) -> List[List[int]]:
+        """[start, end (inclusive), bytes done] per range"""
+        if not ranged or self.size == 0:
+            return [[0, self.size - 1, 0]]
+        parts = max(1, min(self.parts, self.size // self.min_part_bytes))
+        step = -(-self.size // parts)
+        return [[start, min(start + step, self.size) - 1, 0] for start in range(0, self.size, step)]
+
+    def _resume_state(self, ranged: bool) -> Optional[List[List[int]]]:
+        if not ranged or not os.path.exists(self.part_path):
+            return None
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (state.get('url') != self.url or state.get('size') != self.size
+                or state.get('validator') != self._validator
+                or os.path.getsize(self.part_path) != self.size):
+            return None
+        return state['ranges']
+
+    def _save_state(self):
+        with self._lock:
+            state = {
+                'url': self.url,
+                'size': self.size,
+                'validator': self._validator,
+                'ranges': [list(r) for r in self._ranges],
+            }
+            self._unsaved = 0
+        temp_path = self.state_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.state_path)
+
+    def _progress(self, count: int):
+        with self._lock:
+            self.fetched_bytes += count
+            self._unsaved += count
+            save = self._unsaved >= STATE_SAVE_BYTES
+            done = self.resumed_bytes + self.fetched_bytes
+            report = self.size and done / self.size >= self._next_report
+            if report:
+                self._next_report = done / self.size + 0.1
+        if save:
+            self._save_state()
+        if report:
+            print(f"📊 Download progress: {done / self.size * 100:.0f}% ({done // (1024 * 1024)} MB)")
+
+    def _fetch_range(self, index: int, ranged: bool):
+        byte_range = self._ranges[index]
+        attempt = 0
+        while True:
+            start, end, done = byte_range
+            if start + done > end:
+                return
+            headers = {'Range': f'bytes={start + done}-{end}'} if ranged else {}
+            try:
+                with requests.get(self.url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    response.raise_for_status()
+                    if ranged and response.status_code != 206:
+                        raise DownloadError(f"Server ignored range request (HTTP {response.status_code})")
+                    with open(self.part_path, 'r+b') as f:
+                        f.seek(start + done)
+                        for block in response.iter_content(chunk_size=self.chunk_size):
+                            block = block[:end + 1 - (start + byte_range[2])]
+                            if not block:
+                                continue
+                            f.write(block)
+                            with self._lock:
+                                byte_range[2] += len(block)
+                            self._progress(len(block))
+                if start + byte_range[2] <= end:
+                    raise DownloadError(f"Connection closed at byte {start + byte_range[2]} of range ending {end}")
+                return
+            except (requests.RequestException, DownloadError) as fetch_error:
+                if not ranged:
+                    # Without ranges a retry has to start over
+                    with self._lock:
+                        byte_range[2] = 0
+                attempt += 1
+                if attempt > self.retries:
+                    raise DownloadError(f"Range {start}-{end} failed: {fetch_error}") from fetch_error
+                print(f"⚠️ Download of bytes {start + byte_range[2]}-{end} interrupted ({fetch_error}), retrying")
+                time.sleep(min(10.0, 0.5 * 2 ** (attempt - 1)))
+
+    def download(self) -> str:
+        """Fetch, verify and move the file into place; return ``dest``"""
+        started = time.perf_counter()
+        self.size, ranged = self._probe()
+        if self.size <= 0:
+            raise DownloadError("Server did not report the file size")
+
+        ranges = self._resume_state(ranged)
+        if ranges is None:
+            ranges = self._plan(ranged)
+            with open(self.part_path, 'wb') as f:
+                f.truncate(self.size)
+        self._ranges = ranges
+        self.resumed_bytes = sum(done for _, _, done in ranges)
+        if self.resumed_bytes:
+            print(f"🔄 Resuming download at {self.resumed_bytes // (1024 * 1024)} of {self.size // (1024 * 1024)} MB")
+        self._save_state()
+
+        print(f"📥 Downloading {self.size / (1024 * 1024):.1f} MB in {len(ranges)} "
+              f"{'ranges' if ranged else 'stream (no range support)'}")
+        try:
+            with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix='model-download') as pool:
+                for future in [pool.submit(self._fetch_range, index, ranged) for index in range(len(ranges))]:
+                    future.result()
+        finally:
+            self._save_state()
+
+        sha256 = file_sha256(self.part_path, self.chunk_size)
+        if self.sha256 and sha256 != self.sha256:
+            # Corrupt or changed upstream: don't resume from this data
+            os.remove(self.part_path)
+            os.remove(self.state_path)
+            raise DownloadError(f"SHA-256 mismatch: expected {self.sha256}, got {sha256}")
+        if not self.sha256:
+            print("⚠️ MODEL_SHA256 not set - recording the digest without verifying it")
+
+        with open(self.part_path, 'rb+') as f:
+            os.fsync(f.fileno())
+        os.replace(self.part_path, self.dest)
+        os.remove(self.state_path)
+        write_digest_record(self.dest, sha256, self.url)
+
+        elapsed = time.perf_counter() - started
+        print(f"✅ Model download completed: {self.size / (1024 * 1024):.1f} MB in {elapsed:.1f}s, sha256 {sha256}")
+        return self.dest
+
+
+def downloader_from_env(url: str, dest: str) -> ModelDownloader:
+    """Create a downloader configured by MODEL_SHA256 and the MODEL_DOWNLOAD_* variables"""
+    return ModelDownloader(
+        url,
+        dest,
+        sha256=os.getenv('MODEL_SHA256') or None,
+        parts=int(os.getenv('MODEL_DOWNLOAD_PARTS', 4)),
+        chunk_size=int(float(os.getenv('MODEL_DOWNLOAD_CHUNK_MB', 1)) * 1024 * 1024),
+        retries=int(os.getenv('MODEL_DOWNLOAD_RETRIES', 3)),
+        timeout=float(os.getenv('MODEL_DOWNLOAD_TIMEOUT', 30)),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Download a model file with resume and SHA-256 verification')
+    parser.add_argument('url', help='Model URL')
+    parser.add_argument('--dest', default='sneaker_model_production.pth', help='Destination path')
+    parser.add_argument('--sha256', default=os.getenv('MODEL_SHA256'), help='Expected SHA-256 (hex)')
+    parser.add_argument('--parts', type=int, default=int(os.getenv('MODEL_DOWNLOAD_PARTS', 4)),
+                        help='Concurrent range requests')
+    args = parser.parse_args()
+
+    ModelDownloader(args.url, args.dest, sha256=args.sha256, parts=args.parts).download()
+
+
+if __name__ == '__main__':
+    main()
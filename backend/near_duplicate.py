@@ -0,0 +1,174 @@
+"""
+Perceptual-hash index for near-duplicate uploads.
+
+Re-encoded, resized or EXIF-stripped copies of a listing photo produce
+different bytes but almost identical 64-bit difference hashes (dHash). The
+index stores previously scored hashes and finds matches within a Hamming
+distance using multi-index hashing: the hash is split into 16-bit chunks and,
+by the pigeonhole principle, any hash within distance ``r`` of a query
+matches at least one chunk within distance ``r // chunks``.
+"""
+
+import itertools
+import os
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+HASH_BITS = 64
+CHUNK_BITS = 16
+NUM_CHUNKS = HASH_BITS // CHUNK_BITS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+
+def dhash(image: 'Image.Image', hash_size: int = 8) -> int:
+    """Compute a 64-bit difference hash from a downsampled grayscale image"""
+    import numpy as np
+    from PIL import Image
+
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def _flip_masks(radius: int) -> List[int]:
+    masks = [0]
+    for distance in range(1, radius + 1):
+        for positions in itertools.combinations(range(CHUNK_BITS), distance):
+            mask = 0
+            for position in positions:
+                mask |= 1 << position
+            masks.append(mask)
+    return masks
+
+
+class NearDuplicateIndex:
+    """Multi-index Hamming search over stored perceptual hashes"""
+
+    def __init__(self, max_distance: int = 6, max_entries: int = 200000):
+        self.max_distance = max(0, int(max_distance))
+        self.max_entries = max(0, int(max_entries))
+        self.model_version: Optional[str] = None
+
+        self._probe_masks = _flip_masks(self.max_distance // NUM_CHUNKS)
+        self._tables: List[Dict[int, Set[int]]] = [{} for _ in range(NUM_CHUNKS)]
+        self._entries: "OrderedDict[int, Tuple[int, Dict[str, Any]]]" = OrderedDict()
+        self._hash_ids: Dict[int, int] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def _chunks(value: int) -> List[int]:
+        return [(value >> (i * CHUNK_BITS)) & CHUNK_MASK for i in range(NUM_CHUNKS)]
+
+    def _sync_version(self, model_version: Optional[str]):
+        # Caller holds the lock
+        if model_version != self.model_version:
+            self._clear()
+            self.model_version = model_version
+
+    def _clear(self):
+        for table in self._tables:
+            table.clear()
+        self._entries.clear()
+        self._hash_ids.clear()
+
+    def _remove(self, entry_id: int):
+        value, _ = self._entries.pop(entry_id)
+        self._hash_ids.pop(value, None)
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            bucket = table.get(chunk)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del table[chunk]
+
+    def lookup(self, value: int, model_version: Optional[str]) -> Optional[Tuple[Dict[str, Any], int]]:
+        """Return the closest stored result and its distance, if within range"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._sync_version(model_version)
+            candidates: Set[int] = set()
+            for table, chunk in zip(self._tables, self._chunks(value)):
+                for mask in self._probe_masks:
+                    bucket = table.get(chunk ^ mask)
+                    if bucket:
+                        candidates.update(bucket)
+
+            best = None
+            for entry_id in candidates:
+                stored_value, result = self._entries[entry_id]
+                distance = (stored_value ^ value).bit_count()
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = (result, distance)
+                    if distance == 0:
+                        break
+
+            if best is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            return dict(best[0]), best[1]
+
+    def add(self, value: int, result: Dict[str, Any], model_version: Optional[str]):
+        """Index a scored image hash for this model version"""
+        if not self.enabled or model_version is None:
+            return
+        with self._lock:
+            self._sync_version(model_version)
+            existing = self._hash_ids.get(value)
+            if existing is not None:
+                self._remove(existing)
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (value, dict(result))
+            self._hash_ids[value] = entry_id
+            for table, chunk in zip(self._tables, self._chunks(value)):
+                table.setdefault(chunk, set()).add(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def resize(self, max_entries: int):
+        """Change the capacity, dropping the oldest entries if needed"""
+        with self._lock:
+            self.max_entries = max(0, int(max_entries))
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return index size and lookup counters"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'max_distance': self.max_distance,
+                'hits': self._hits,
+                'misses': self._misses,
+                'model_version': self.model_version,
+            }
+
+
+def index_from_env() -> NearDuplicateIndex:
+    """Create an index configured by NEAR_DUPLICATE_MAX_DISTANCE and NEAR_DUPLICATE_MAX_ENTRIES"""
+    return NearDuplicateIndex(
+        max_distance=int(os.getenv('NEAR_DUPLICATE_MAX_DISTANCE', 6)),
+        max_entries=int(os.getenv('NEAR_DUPLICATE_MAX_ENTRIES', 200000)),
+    )
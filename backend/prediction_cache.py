@@ -0,0 +1,113 @@
+"""
+Content-addressed LRU cache for prediction results.
+
+Entries are keyed by a hash of the raw upload bytes and tied to the model
+version that produced them, so loading a different checkpoint drops them.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+def content_key(data: bytes) -> str:
+    """Hash raw upload bytes into a cache key"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class PredictionCache:
+    """Thread-safe LRU cache with optional TTL"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 0):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl_seconds = max(0.0, float(ttl_seconds))
+        self.model_version: Optional[str] = None
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _sync_version(self, model_version: Optional[str]):
+        # Caller holds the lock
+        if model_version != self.model_version:
+            if self._entries:
+                self._invalidations += 1
+            self._entries.clear()
+            self.model_version = model_version
+
+    def get(self, key: str, model_version: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Return a cached result for this model version, if any"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._sync_version(model_version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            result, stored_at = entry
+            if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return dict(result)
+
+    def put(self, key: str, result: Dict[str, Any], model_version: Optional[str]):
+        """Store a result produced by the given model version"""
+        if not self.enabled or model_version is None:
+            return
+        with self._lock:
+            self._sync_version(model_version)
+            self._entries[key] = (dict(result), time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def resize(self, max_entries: int):
+        """Change the capacity, evicting least recently used entries if needed"""
+        with self._lock:
+            self.max_entries = max(0, int(max_entries))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations,
+                'model_version': self.model_version,
+            }
+
+
+def cache_from_env() -> PredictionCache:
+    """Create a cache configured by PREDICTION_CACHE_SIZE and PREDICTION_CACHE_TTL"""
+    return PredictionCache(
+        max_entries=int(os.getenv('PREDICTION_CACHE_SIZE', 1024)),
+        ttl_seconds=float(os.getenv('PREDICTION_CACHE_TTL', 0)),
+    )
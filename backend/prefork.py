@@ -0,0 +1,123 @@
+"""
+Pre-fork multi-worker serving with copy-on-write model weights.
+
+The parent process binds the listening socket and loads the model once,
+then forks the uvicorn workers. Weight tensors are never written after
+loading, so their pages stay shared between all workers; each extra worker
+only adds its own activations and Python heap. ``gc.freeze()`` moves the
+parent's objects out of the collector's reach so collections in the
+workers do not touch (and un-share) those pages either.
+
+Only the parent loads weights; it must not run inference before forking,
+since thread pools started by a forward pass do not survive ``fork()``.
+"""
+
+import gc
+import os
+import signal
+import socket
+import time
+from typing import Callable, Dict, List
+
+import psutil
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    """Bind the shared listening socket in the parent"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def worker_memory(pids: List[int]) -> Dict[int, Dict[str, float]]:
+    """Return RSS, unique (USS) and proportional (PSS) memory per worker in MB"""
+    report = {}
+    for pid in pids:
+        try:
+            info = psutil.Process(pid).memory_full_info()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+        report[pid] = {
+            'rss_mb': round(info.rss / (1024 * 1024), 1),
+            'uss_mb': round(info.uss / (1024 * 1024), 1),
+            'pss_mb': round(getattr(info, 'pss', 0) / (1024 * 1024), 1),
+        }
+    return report
+
+
+class PreforkServer:
+    """Fork and supervise uvicorn workers sharing one socket"""
+
+    def __init__(self, app, host: str, port: int, workers: int,
+                 preload: Callable[[], None] = None, log_level: str = 'info'):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = max(1, int(workers))
+        self.preload = preload
+        self.log_level = log_level
+        self.children: Dict[int, int] = {}
+        self._stopping = False
+        self._sock = None
+
+    def _spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            self._run_worker()
+            os._exit(0)
+        self.children[pid] = index
+
+    def _run_worker(self):
+        import uvicorn
+
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        config = uvicorn.Config(self.app, log_level=self.log_level, access_log=True)
+        uvicorn.Server(config).run(sockets=[self._sock])
+
+    def _handle_stop(self, signum, frame):
+        self._stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        self._sock = bind_socket(self.host, self.port)
+        print(f"🌐 Listening on http://{self.host}:{self.port} with {self.workers} workers")
+
+        if self.preload is not None:
+            started = time.perf_counter()
+            self.preload()
+            print(f"✅ Preloaded model in parent in {time.perf_counter() - started:.1f}s")
+        gc.collect()
+        gc.freeze()
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        for index in range(self.workers):
+            self._spawn(index)
+
+        parent_rss = psutil.Process().memory_info().rss / (1024 * 1024)
+        print(f"📊 Parent RSS after preload: {parent_rss:.1f} MB")
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            index = self.children.pop(pid, None)
+            if index is None:
+                continue
+            if not self._stopping:
+                print(f"⚠️ Worker {pid} exited with status {status}, restarting")
+                self._spawn(index)
+
+        self._sock.close()
+        print("✅ All workers stopped")
@@ -0,0 +1,131 @@
+"""
+On-demand sampling profiler for the live API process.
+
+A background thread snapshots the Python stack of every thread at a fixed
+interval (``sys._current_frames``) and counts identical stacks. The output
+is in the collapsed-stack format used by flamegraph.pl, speedscope and
+inferno: one ``frame;frame;...;leaf count`` line per distinct stack.
+
+Code wrapped in ``tag_stage(name)`` is attributed to that stage: its stacks
+start with a ``stage:<name>`` frame, so a flamegraph splits cleanly into
+decode, preprocess, forward (torch ops), serialize and gc time. Untagged
+stacks start with ``stage:untagged``.
+
+Only the process that receives the profiling request is sampled; with
+WEB_CONCURRENCY > 1 that is whichever worker accepted the connection.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# Leaf functions of threads parked waiting for work
+IDLE_FUNCTIONS = frozenset({'wait', 'select', 'poll', 'sleep', 'accept', '_worker'})
+
+# Current stage per thread id, read by the sampler without locking
+_stages: Dict[int, str] = {}
+_active_lock = threading.Lock()
+_active: Optional['SamplingProfiler'] = None
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another one is running"""
+
+
+@contextmanager
+def tag_stage(name: str):
+    """Attribute samples taken inside the block to pipeline stage ``name``"""
+    thread_id = threading.get_ident()
+    previous = _stages.get(thread_id)
+    _stages[thread_id] = name
+    try:
+        yield
+    finally:
+        if previous is None:
+            _stages.pop(thread_id, None)
+        else:
+            _stages[thread_id] = previous
+
+
+def note_request():
+    """Count a finished request towards the running profile, if any"""
+    profiler = _active
+    if profiler is not None:
+        profiler.note_request()
+
+
+def _frame_label(code) -> str:
+    path = code.co_filename
+    short = os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path))
+    return f"{code.co_name} ({short})"
+
+
+class SamplingProfiler:
+    """Sample all thread stacks until a time or request limit is reached"""
+
+    def __init__(self, interval: float = 0.005, include_idle: bool = False):
+        self.interval = max(0.001, float(interval))
+        self.include_idle = include_idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.requests = 0
+        self.duration = 0.0
+        self._max_requests = 0
+        self._done = threading.Event()
+
+    def note_request(self):
+        self.requests += 1
+        if self._max_requests and self.requests >= self._max_requests:
+            self._done.set()
+
+    def _sample(self, own_thread: int):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            if not self.include_idle and frame.f_code.co_name in IDLE_FUNCTIONS and thread_id not in _stages:
+                continue
+            frames = []
+            while frame is not None:
+                frames.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            frames.reverse()
+            stage = _stages.get(thread_id, 'untagged')
+            self.stacks[';'.join([f'stage:{stage}', names.get(thread_id, str(thread_id))] + frames)] += 1
+            self.samples += 1
+
+    def run(self, seconds: float, max_requests: int = 0) -> str:
+        """Sample for ``seconds`` (or until ``max_requests`` finish) and return collapsed stacks"""
+        global _active
+        with _active_lock:
+            if _active is not None:
+                raise ProfilerBusy("A profile is already running")
+            _active = self
+        self._max_requests = max(0, int(max_requests))
+
+        own_thread = threading.get_ident()
+        started = time.perf_counter()
+        deadline = started + seconds
+        try:
+            while not self._done.is_set() and time.perf_counter() < deadline:
+                self._sample(own_thread)
+                self._done.wait(self.interval)
+        finally:
+            self.duration = time.perf_counter() - started
+            with _active_lock:
+                _active = None
+        return self.collapsed()
+
+    def collapsed(self) -> str:
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    def stage_totals(self) -> Dict[str, int]:
+        """Sample counts per stage tag"""
+        totals: Counter = Counter()
+        for stack, count in self.stacks.items():
+            totals[stack.split(';', 1)[0][len('stage:'):]] += count
+        return dict(totals)
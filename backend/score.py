@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+High-throughput offline scoring of image files and directories.
+
+Runs the model built by ``LightweightModelLoader`` without going through
+the API. The work is split into three pipelined stages connected by bounded
+queues:
+
+- decode: a pool of worker processes decodes images (draft-mode JPEG
+  decoding) and resizes them to the model input as uint8 arrays;
+- inference: the main process normalizes full batches into a reusable
+  buffer and runs one forward pass per batch;
+- write: a thread appends results to CSV, JSON lines or Parquet as each
+  batch finishes.
+
+Decode workers plus PyTorch's intra-op threads should roughly add up to the
+number of cores; the final report shows which stage was the bottleneck.
+With ``--resume`` files already present in the output are skipped, so an
+interrupted run continues where it stopped. Rows are written in completion
+order, not input order.
+
+Usage:
+    python score.py ../counterfeit-nike-shoes-detection-1/test/images --output scores.csv
+    python score.py /data/photos --output scores.jsonl --workers 6 --torch-threads 2 --resume
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+FIELDS = ['path', 'prediction', 'confidence', 'fake_probability', 'real_probability', 'method', 'error']
+
+
+def image_extensions() -> Set[str]:
+    """File extensions of every format PIL can open"""
+    from PIL import Image
+
+    return {extension for extension, image_format in Image.registered_extensions().items()
+            if image_format in Image.OPEN}
+
+
+def find_images(inputs: Iterable[str]) -> List[str]:
+    """Image files given directly or found recursively under directories, sorted"""
+    extensions = image_extensions()
+    found = set()
+    skipped = 0
+    for source in inputs:
+        if os.path.isdir(source):
+            for root, _, names in os.walk(source):
+                for name in names:
+                    if os.path.splitext(name)[1].lower() in extensions:
+                        found.add(os.path.join(root, name))
+                    else:
+                        skipped += 1
+        elif os.path.isfile(source):
+            found.add(source)
+        else:
+            print(f"⚠️ Skipping {source}: not found")
+    if skipped:
+        print(f"⚠️ Skipped {skipped} files without an image extension PIL can open")
+    return sorted(found)
+
+
+def _decode_chunk(paths: List[str]) -> List[tuple]:
+    """Decode and resize a chunk of images; runs in the decode worker processes"""
+    from image_decode import decode_image
+    from preprocessing import resize_pixels
+
+    decoded = []
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                decoded.append((path, resize_pixels(decode_image(f)), None))
+        except Exception as e:
+            decoded.append((path, None, f'Invalid image format: {str(e)}'))
+    return decoded
+
+
+def _truncate_partial_line(path: str):
+    """Drop a last line cut off by an interrupted run"""
+    with open(path, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(max(0, size - 1))
+        if f.read(1) == b'\n':
+            return
+        position = size
+        while position > 0:
+            step = min(64 * 1024, position)
+            position -= step
+            f.seek(position)
+            block = f.read(step)
+            newline = block.rfind(b'\n')
+            if newline != -1:
+                f.truncate(position + newline + 1)
+                return
+        f.truncate(0)
+
+
+class CsvOutput:
+    """Append rows to a CSV file with a header"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._writer = None
+
+    def completed(self) -> Set[str]:
+        _truncate_partial_line(self.path)
+        with open(self.path, newline='') as f:
+            return {row['path'] for row in csv.DictReader(f) if row.get('path')}
+
+    def open(self, append: bool):
+        write_header = not append or os.path.getsize(self.path) == 0
+        self._file = open(self.path, 'a' if append else 'w', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=FIELDS, extrasaction='ignore')
+        if write_header:
+            self._writer.writeheader()
+
+    def write(self, rows: List[Dict[str, Any]]):
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class JsonlOutput:
+    """Append rows to a JSON lines file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def completed(self) -> Set[str]:
+        _truncate_partial_line(self.path)
+        done = set()
+        with open(self.path) as f:
+            for line in f:
+                if line.strip():
+                    done.add(json.loads(line)['path'])
+        return done
+
+    def open(self, append: bool):
+        self._file = open(self.path, 'a' if append else 'w')
+
+    def write(self, rows: List[Dict[str, Any]]):
+        self._file.write(''.join(json.dumps(row) + '\n' for row in rows))
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class ParquetOutput:
+    """Write rows as a directory of Parquet part files (requires pyarrow)
+
+    Parquet files cannot be appended to, so every ``rows_per_file`` rows are
+    written to a new part file, atomically; an interruption loses at most
+    the rows not yet written to a part.
+    """
+
+    def __init__(self, path: str, rows_per_file: int = 10000):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise SystemExit("❌ Parquet output requires pyarrow (pip install pyarrow)")
+        self.path = path
+        self.rows_per_file = max(1, int(rows_per_file))
+        self._rows: List[Dict[str, Any]] = []
+        self._next_part = 0
+
+    def _parts(self) -> List[str]:
+        return sorted(name for name in os.listdir(self.path)
+                      if name.startswith('part-') and name.endswith('.parquet'))
+
+    def completed(self) -> Set[str]:
+        import pyarrow.parquet as pq
+
+        done = set()
+        for name in self._parts():
+            done.update(pq.read_table(os.path.join(self.path, name), columns=['path']).column('path').to_pylist())
+        return done
+
+    def open(self, append: bool):
+        os.makedirs(self.path, exist_ok=True)
+        parts = self._parts()
+        if not append:
+            for name in parts:
+                os.remove(os.path.join(self.path, name))
+            parts = []
+        self._next_part = int(parts[-1][len('part-'):-len('.parquet')]) + 1 if parts else 0
+
+    def _flush(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._rows:
+            return
+        table = pa.Table.from_pylist([{field: row.get(field) for field in FIELDS} for row in self._rows])
+        part_path = os.path.join(self.path, f'part-{self._next_part:05d}.parquet')
+        pq.write_table(table, part_path + '.tmp')
+        os.replace(part_path + '.tmp', part_path)
+        self._next_part += 1
+        self._rows = []
+
+    def write(self, rows: List[Dict[str, Any]]):
+        self._rows.extend(rows)
+        if len(self._rows) >= self.rows_per_file:
+            self._flush()
+
+    def close(self):
+        self._flush()
+
+
+OUTPUT_FORMATS = {'csv': CsvOutput, 'jsonl': JsonlOutput, 'parquet': ParquetOutput}
+EXTENSION_FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.json': 'jsonl', '.ndjson': 'jsonl',
+                     '.parquet': 'parquet', '.pq': 'parquet'}
+
+
+def output_format(path: str, requested: Optional[str] = None) -> str:
+    """The requested format, or the one implied by the output's extension (CSV by default)"""
+    return requested or EXTENSION_FORMATS.get(os.path.splitext(path.rstrip('/'))[1].lower(), 'csv')
+
+
+class BatchScorer:
+    """Pipeline decode workers, batched inference and incremental writes"""
+
+    def __init__(self, loader, batch_size: int = 32, workers: int = None,
+                 chunk_size: int = 16, queue_size: int = 8, report_interval: float = 10.0):
+        from preprocessing import BatchPreprocessor
+
+        self.loader = loader
+        self.batch_size = max(1, int(batch_size))
+        self.workers = max(1, int(workers or (os.cpu_count() or 2) - 1))
+        self.chunk_size = max(1, int(chunk_size))
+        self.queue_size = max(1, int(queue_size))
+        self.report_interval = report_interval
+        self.preprocessor = BatchPreprocessor(self.batch_size)
+
+        self.scored = 0
+        self.errors = 0
+        self.decode_wait_seconds = 0.0
+        self.inference_seconds = 0.0
+        self._failure: Optional[BaseException] = None
+        self._stop = threading.Event()
+
+    def _put(self, target: queue.Queue, item) -> bool:
+        """Blocking put that gives up once the run is aborted"""
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _decode_stage(self, paths: List[str], decoded: queue.Queue):
+        """Keep the worker pool busy while never holding more than a few chunks"""
+        chunks = [paths[i:i + self.chunk_size] for i in range(0, len(paths), self.chunk_size)]
+        max_pending = self.workers * 2
+        try:
+            with ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                pending = {}
+                next_chunk = 0
+                while (pending or next_chunk < len(chunks)) and not self._stop.is_set():
+                    while len(pending) < max_pending and next_chunk < len(chunks):
+                        pending[pool.submit(_decode_chunk, chunks[next_chunk])] = chunks[next_chunk]
+                        next_chunk += 1
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        chunk = pending.pop(future)
+                        try:
+                            items = future.result()
+                        except Exception as e:
+                            items = [(path, None, f'Decode worker failed: {str(e)}') for path in chunk]
+                        # Blocks while inference is behind
+                        self._put(decoded, items)
+                for future in pending:
+                    future.cancel()
+        except BaseException as e:
+            self._failure = e
+        finally:
+            self._put(decoded, None)
+
+    def _write_stage(self, output, writes: queue.Queue):
+        try:
+            while True:
+                rows = writes.get()
+                if rows is None:
+                    return
+                output.write(rows)
+        except BaseException as e:
+            self._failure = e
+            # Keep draining so the inference stage never blocks on a dead writer
+            while writes.get() is not None:
+                pass
+
+    def _infer(self, batch: List[tuple]) -> List[Dict[str, Any]]:
+        started = time.perf_counter()
+        try:
+            results = self.loader.predict_prepared(self.preprocessor.prepare_pixels([pixels for _, pixels in batch]))
+        except Exception as e:
+            results = [{'error': f'Model prediction failed: {str(e)}'}] * len(batch)
+        self.inference_seconds += time.perf_counter() - started
+        return [{'path': path, **result} for (path, _), result in zip(batch, results)]
+
+    def run(self, paths: List[str], output) -> Dict[str, Any]:
+        """Score ``paths`` into an opened output; return throughput statistics"""
+        decoded: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        writes: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        decoder = threading.Thread(target=self._decode_stage, args=(paths, decoded), name='score-decode', daemon=True)
+        writer = threading.Thread(target=self._write_stage, args=(output, writes), name='score-write', daemon=True)
+
+        started = time.perf_counter()
+        next_report = started + self.report_interval
+        decoder.start()
+        writer.start()
+        batch: List[tuple] = []
+        try:
+            while True:
+                waited = time.perf_counter()
+                items = decoded.get()
+                self.decode_wait_seconds += time.perf_counter() - waited
+                if items is None:
+                    break
+                failed = [{'path': path, 'error': error} for path, pixels, error in items if pixels is None]
+                if failed:
+                    self.errors += len(failed)
+                    writes.put(failed)
+                batch.extend((path, pixels) for path, pixels, _ in items if pixels is not None)
+                while len(batch) >= self.batch_size:
+                    writes.put(self._infer(batch[:self.batch_size]))
+                    self.scored += self.batch_size
+                    batch = batch[self.batch_size:]
+
+                if time.perf_counter() >= next_report:
+                    next_report += self.report_interval
+                    elapsed = time.perf_counter() - started
+                    done = self.scored + self.errors
+                    print(f"📊 {done}/{len(paths)} images, {done / elapsed:.1f} images/s")
+            if batch:
+                writes.put(self._infer(batch))
+                self.scored += len(batch)
+        except BaseException:
+            # Interrupted: stop feeding decode work and let the stages wind down
+            self._stop.set()
+            raise
+        finally:
+            writes.put(None)
+            writer.join()
+            decoder.join()
+        if self._failure is not None:
+            raise self._failure
+
+        elapsed = time.perf_counter() - started
+        return {
+            'images': len(paths),
+            'scored': self.scored,
+            'errors': self.errors,
+            'seconds': round(elapsed, 2),
+            'images_per_second': round((self.scored + self.errors) / elapsed, 1) if elapsed else 0,
+            'decode_workers': self.workers,
+            'batch_size': self.batch_size,
+            # High inference share: add torch threads; high decode wait: add workers
+            'inference_busy_percent': round(self.inference_seconds / elapsed * 100, 1) if elapsed else 0,
+            'decode_wait_percent': round(self.decode_wait_seconds / elapsed * 100, 1) if elapsed else 0,
+        }
+
+
+def main():
+    """Main function for command line usage"""
+    parser = argparse.ArgumentParser(description='Score image files or directories offline')
+    parser.add_argument('inputs', nargs='+', help='Image files or directories (searched recursively)')
+    parser.add_argument('--output', required=True, help='Results file (.csv, .jsonl) or Parquet directory (.parquet)')
+    parser.add_argument('--format', choices=sorted(OUTPUT_FORMATS), help='Output format (default: from the extension)')
+    parser.add_argument('--resume', action='store_true', help='Skip images already in the output and append')
+    parser.add_argument('--overwrite', action='store_true', help='Replace an existing output')
+    parser.add_argument('--batch-size', type=int, default=32, help='Images per forward pass')
+    parser.add_argument('--workers', type=int, default=None, help='Decode processes (default: cores - 1)')
+    parser.add_argument('--torch-threads', type=int, default=None, help='PyTorch intra-op threads')
+    parser.add_argument('--chunk-size', type=int, default=16, help='Images per decode task')
+    parser.add_argument('--queue-size', type=int, default=8, help='Decoded chunks buffered ahead of inference')
+    args = parser.parse_args()
+
+    fmt = output_format(args.output, args.format)
+    output = OUTPUT_FORMATS[fmt](args.output)
+    exists = os.path.exists(args.output)
+    if exists and not (args.resume or args.overwrite):
+        raise SystemExit(f"❌ {args.output} exists; use --resume to continue it or --overwrite to replace it")
+
+    paths = find_images(args.inputs)
+    if args.resume and exists:
+        done = output.completed()
+        paths = [path for path in paths if path not in done]
+        print(f"🔄 Resuming: {len(done)} images already scored, {len(paths)} left")
+    if not paths:
+        print("✅ Nothing to score")
+        return
+
+    if args.torch_threads:
+        import torch
+        torch.set_num_threads(args.torch_threads)
+
+    from app import get_model_loader
+
+    loader = get_model_loader()
+    loader.load_model_lazily()
+    if not loader.model_loaded or loader.backend is None:
+        raise SystemExit("❌ Model could not be loaded; refusing to score with the fallback analysis")
+
+    scorer = BatchScorer(loader, batch_size=args.batch_size, workers=args.workers,
+                         chunk_size=args.chunk_size, queue_size=args.queue_size)
+    print(f"🚀 Scoring {len(paths)} images with {scorer.workers} decode workers, batches of {scorer.batch_size} -> {args.output} ({fmt})")
+    output.open(append=args.resume and exists)
+    try:
+        stats = scorer.run(paths, output)
+    except KeyboardInterrupt:
+        raise SystemExit(f"⚠️ Interrupted; run again with --resume to continue {args.output}")
+    finally:
+        output.close()
+    print(f"✅ Scored {stats['scored']} images ({stats['errors']} errors) in {stats['seconds']}s: "
+          f"{stats['images_per_second']} images/s")
+    print(f"   Inference busy {stats['inference_busy_percent']}%, waiting on decode {stats['decode_wait_percent']}%")
+
+
+if __name__ == "__main__":
+    main()
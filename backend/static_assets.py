@@ -0,0 +1,265 @@
+"""
+Cached, precompressed serving of the frontend build.
+
+The SPA shell (index.html with its /assets/ links rewritten to /static/assets/)
+is built once and kept in memory with gzip and, when the optional ``brotli``
+package is installed, brotli variants and a strong ETag. The source file is
+re-checked at most every SPA_SHELL_RECHECK_SECONDS (default 2) and rebuilt
+only when its mtime or size changes. Conditional requests get 304.
+
+Files under /static are served with precompressed ``.br``/``.gz`` sidecars
+when the client accepts them. Vite's content-hashed files in ``assets/``
+are marked immutable for a year. Generate the sidecars after a frontend
+build with:
+
+    python static_assets.py dist
+"""
+
+import argparse
+import gzip
+import hashlib
+import mimetypes
+import os
+import stat
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+# Preferred first when the client accepts several
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+COMPRESSIBLE_EXTENSIONS = frozenset({
+    '.js', '.mjs', '.css', '.html', '.svg', '.json', '.map', '.txt', '.xml', '.ico', '.wasm',
+})
+# Smaller files gain little and cost an extra stat per request
+MIN_COMPRESS_BYTES = 1024
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+
+def _brotli():
+    """The brotli module, or None when the optional dependency is missing"""
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+def accepted_encodings(accept_encoding: str) -> List[str]:
+    """Content codings the client accepts, ignoring those with q=0"""
+    accepted = []
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding.strip():
+            accepted.append(coding.strip().lower())
+    return accepted
+
+
+def etag_matches(if_none_match: str, etags: Sequence[str]) -> bool:
+    if if_none_match.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') in etags for tag in if_none_match.split(','))
+
+
+def compress(data: bytes) -> Dict[str, bytes]:
+    """gzip (and brotli, if available) variants of ``data``, keyed by coding"""
+    # mtime=0 keeps the output, and so the ETag, stable across rebuilds
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    brotli = _brotli()
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+    return variants
+
+
+class SpaShell:
+    """index.html rewritten for the /static mount, cached with compressed variants"""
+
+    def __init__(self, candidates: Sequence[str], recheck_interval: float = 2.0):
+        self.candidates = list(candidates)
+        self.recheck_interval = max(0.0, float(recheck_interval))
+        self.path: Optional[str] = None
+        self.builds = 0
+        self._signature: Optional[Tuple[int, int]] = None
+        self._variants: Dict[str, bytes] = {}
+        self._etags: Dict[str, str] = {}
+        self._checked_at = float('-inf')
+        self._lock = threading.Lock()
+
+    def _locate(self) -> Optional[str]:
+        for frontend_path in self.candidates:
+            index_path = os.path.join(frontend_path, 'index.html')
+            if os.path.exists(index_path):
+                return index_path
+        return None
+
+    def _build(self, index_path: str, signature: Tuple[int, int]):
+        with open(index_path, 'r') as f:
+            html_content = f.read()
+        # Update asset paths to use /static prefix
+        html_content = html_content.replace('src="/assets/', 'src="/static/assets/')
+        html_content = html_content.replace('href="/assets/', 'href="/static/assets/')
+
+        body = html_content.encode('utf-8')
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        variants = {'identity': body, **compress(body)}
+        self._variants = variants
+        # Strong ETags must differ between encodings of the same content
+        self._etags = {coding: f'"{digest}"' if coding == 'identity' else f'"{digest}-{coding}"'
+                       for coding in variants}
+        self._signature = signature
+        self.path = index_path
+        self.builds += 1
+        sizes = ', '.join(f'{coding} {len(data)}' for coding, data in variants.items())
+        print(f"✅ SPA shell cached from {index_path} ({sizes} bytes)")
+
+    def refresh(self, force: bool = False) -> bool:
+        """Rebuild if index.html changed; return whether a shell is available"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.recheck_interval:
+            return bool(self._variants)
+        with self._lock:
+            if not force and now - self._checked_at < self.recheck_interval:
+                return bool(self._variants)
+            self._checked_at = now
+            index_path = self.path if self.path and os.path.exists(self.path) else self._locate()
+            if index_path is None:
+                self._variants, self._etags, self.path = {}, {}, None
+                return False
+            file_stat = os.stat(index_path)
+            signature = (file_stat.st_mtime_ns, file_stat.st_size)
+            if index_path != self.path or signature != self._signature:
+                self._build(index_path, signature)
+            return True
+
+    def response(self, request_headers) -> Optional[Response]:
+        """The shell for a request, or None if there is no frontend build"""
+        if not self.refresh():
+            return None
+        variants, etags = self._variants, self._etags
+
+        accepted = accepted_encodings(request_headers.get('accept-encoding', ''))
+        coding = next((coding for coding, _ in ENCODINGS if coding in variants and coding in accepted), 'identity')
+        headers = {
+            'ETag': etags[coding],
+            'Cache-Control': REVALIDATE_CACHE_CONTROL,
+            'Vary': 'Accept-Encoding',
+        }
+        if_none_match = request_headers.get('if-none-match')
+        if if_none_match and etag_matches(if_none_match, list(etags.values())):
+            return Response(status_code=304, headers=headers)
+        if coding != 'identity':
+            headers['Content-Encoding'] = coding
+        return Response(content=variants[coding], media_type='text/html; charset=utf-8', headers=headers)
+
+    def get_stats(self) -> Dict:
+        return {
+            'path': self.path,
+            'builds': self.builds,
+            'etag': self._etags.get('identity'),
+            'sizes': {coding: len(data) for coding, data in self._variants.items()},
+        }
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles serving .br/.gz sidecars and immutable caching for hashed assets"""
+
+    def __init__(self, *args, immutable_prefixes: Sequence[str] = ('assets/',), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.immutable_prefixes = tuple(immutable_prefixes)
+
+    def cache_control(self, path: str) -> str:
+        if path.replace(os.sep, '/').startswith(self.immutable_prefixes):
+            return IMMUTABLE_CACHE_CONTROL
+        return REVALIDATE_CACHE_CONTROL
+
+    async def get_response(self, path: str, scope) -> Response:
+        response = None
+        if scope['method'] in ('GET', 'HEAD'):
+            response = await self._sidecar_response(path, scope)
+        if response is None:
+            response = await super().get_response(path, scope)
+            if os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+                response.headers['Vary'] = 'Accept-Encoding'
+        if response.status_code in (200, 304):
+            response.headers['Cache-Control'] = self.cache_control(path)
+        return response
+
+    async def _sidecar_response(self, path: str, scope) -> Optional[Response]:
+        if os.path.splitext(path)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+            return None
+        request_headers = Headers(scope=scope)
+        accepted = accepted_encodings(request_headers.get('accept-encoding', ''))
+        for coding, suffix in ENCODINGS:
+            if coding not in accepted:
+                continue
+            try:
+                full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            except (OSError, ValueError):
+                continue
+            if not stat_result or not stat.S_ISREG(stat_result.st_mode):
+                continue
+            media_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+            response = FileResponse(full_path, stat_result=stat_result, media_type=media_type,
+                                    headers={'Content-Encoding': coding, 'Vary': 'Accept-Encoding'})
+            if self.is_not_modified(response.headers, request_headers):
+                return NotModifiedResponse(response.headers)
+            return response
+        return None
+
+
+def precompress_directory(directory: str, min_bytes: int = MIN_COMPRESS_BYTES) -> Dict[str, int]:
+    """Write .gz (and .br) sidecars next to every compressible file under ``directory``"""
+    totals = {'files': 0, 'original_bytes': 0, 'gzip_bytes': 0, 'br_bytes': 0}
+    suffixes = dict(ENCODINGS)
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            file_path = os.path.join(root, name)
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            if len(data) < min_bytes:
+                continue
+            totals['files'] += 1
+            totals['original_bytes'] += len(data)
+            for coding, compressed in compress(data).items():
+                sidecar_path = file_path + suffixes[coding]
+                # Only keep sidecars that are actually smaller
+                if len(compressed) >= len(data):
+                    if os.path.exists(sidecar_path):
+                        os.remove(sidecar_path)
+                    continue
+                with open(sidecar_path, 'wb') as f:
+                    f.write(compressed)
+                totals[f'{coding}_bytes'] += len(compressed)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write precompressed sidecars for a frontend build')
+    parser.add_argument('directory', nargs='?', default='dist', help='Frontend build directory')
+    parser.add_argument('--min-bytes', type=int, default=MIN_COMPRESS_BYTES,
+                        help='Skip files smaller than this')
+    args = parser.parse_args()
+
+    if _brotli() is None:
+        print("⚠️ brotli not installed - writing gzip sidecars only")
+    totals = precompress_directory(args.directory, args.min_bytes)
+    print(f"✅ Precompressed {totals['files']} files: {totals['original_bytes']} bytes -> "
+          f"gzip {totals['gzip_bytes']}, br {totals['br_bytes']}")
+
+
+if __name__ == '__main__':
+    main()
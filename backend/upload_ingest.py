@@ -0,0 +1,298 @@
+"""
+Streaming, size-bounded ingestion of single-image uploads.
+
+FastAPI's ``UploadFile`` parameters only run the handler after the whole
+multipart body has been received, and ``await file.read()`` then copies it
+into memory. This module parses the multipart stream itself instead:
+
+- the declared Content-Length and the running byte count are checked
+  against MAX_UPLOAD_BYTES, so oversized uploads stop being read early;
+- the first bytes of the file part are sniffed for an image signature (the
+  common web formats directly, anything else - TIFF, ICO, PPM, ... - by
+  PIL's own format checks) and its header parsed (PIL opens headers lazily)
+  for the dimensions, rejecting non-images and images over MAX_DECODE_PIXELS
+  before the rest of the payload is read;
+- the payload is spooled to a temporary file (in memory up to
+  UPLOAD_SPOOL_MEMORY_BYTES, then on disk) and hashed while streaming, so
+  decoding reads from the spool rather than one large bytes object.
+"""
+
+import asyncio
+import hashlib
+import io
+import os
+from tempfile import SpooledTemporaryFile
+from typing import List, Optional, Tuple
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+# Leading bytes of the common web image formats, checked before asking PIL
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+    (b'BM', 'BMP'),
+)
+# Bytes needed to recognise any signature (RIFF....WEBP is the longest)
+SIGNATURE_BYTES = 12
+# Give up looking for the dimensions after this much data (large EXIF blocks)
+SNIFF_LIMIT = 512 * 1024
+# Allowance for multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadRejected(Exception):
+    """Raised when an upload is refused; carries the HTTP status to return"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def max_upload_bytes() -> int:
+    return int(os.getenv('MAX_UPLOAD_BYTES', 20 * 1024 * 1024))
+
+
+def spool_memory_bytes() -> int:
+    return int(os.getenv('UPLOAD_SPOOL_MEMORY_BYTES', 1024 * 1024))
+
+
+def pil_format(head: bytes) -> Optional[str]:
+    """Return the first PIL format whose prefix check accepts ``head``
+
+    Formats without a prefix check (TGA, SPIDER, ...) would accept almost
+    anything, so they are not considered. Some checks unpack a fixed number
+    of bytes and raise on a shorter ``head``; that counts as no match.
+    """
+    from PIL import Image
+
+    Image.init()
+    for image_format, (_, accept) in Image.OPEN.items():
+        if accept is None:
+            continue
+        try:
+            if accept(head):
+                return image_format
+        except Exception:
+            continue
+    return None
+
+
+def sniff_format(head: bytes) -> Optional[str]:
+    """Return the image format named by the leading magic bytes, if any"""
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'WEBP'
+    for signature, image_format in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return image_format
+    # Anything else PIL can decode, as before uploads were sniffed
+    return pil_format(head)
+
+
+def sniff_dimensions(head: bytes) -> Optional[Tuple[int, int]]:
+    """Parse width and height from an image header, or None if more bytes are needed"""
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(head)) as image:
+            return image.size
+    except Image.DecompressionBombError as bomb_error:
+        raise UploadRejected(f'Image too large: {bomb_error}', 413)
+    except Exception:
+        return None
+
+
+class IngestedUpload:
+    """A spooled upload with the metadata gathered while streaming it"""
+
+    def __init__(self, filename: str, content_type: Optional[str], spool_size: int):
+        from image_decode import max_decode_pixels
+
+        self.filename = filename
+        self.content_type = content_type
+        self.file = SpooledTemporaryFile(max_size=spool_size)
+        self.size = 0
+        self.format: Optional[str] = None
+        self.dimensions: Optional[Tuple[int, int]] = None
+        self._hash = hashlib.sha256()
+        self._head = b''
+        self._max_pixels = max_decode_pixels()
+
+    @property
+    def sha256(self) -> str:
+        """Hex digest of the payload, identical to prediction_cache.content_key"""
+        return self._hash.hexdigest()
+
+    def _sniff(self, data: bytes):
+        if self.dimensions is not None:
+            return
+        self._head += data
+        if self.format is None and len(self._head) >= SIGNATURE_BYTES:
+            self.format = sniff_format(self._head)
+            if self.format is None:
+                raise UploadRejected('File must be an image (unrecognized format)', 415)
+        if self.format is None:
+            return
+        self.dimensions = sniff_dimensions(self._head)
+        if self.dimensions is None:
+            if len(self._head) > SNIFF_LIMIT:
+                raise UploadRejected('Invalid image format: could not read image header', 400)
+            return
+        width, height = self.dimensions
+        if self._max_pixels and width * height > self._max_pixels:
+            raise UploadRejected(
+                f'Image too large: {width}x{height} exceeds {self._max_pixels} pixels', 413
+            )
+        self._head = b''
+
+    async def write(self, data: bytes, max_bytes: int):
+        self.size += len(data)
+        if self.size > max_bytes:
+            raise UploadRejected(f'File too large, at most {max_bytes} bytes', 413)
+        self._sniff(data)
+        self._hash.update(data)
+        if getattr(self.file, '_rolled', False):
+            # Spilled to disk: keep file I/O off the event loop
+            await asyncio.to_thread(self.file.write, data)
+        else:
+            self.file.write(data)
+
+    def finish(self):
+        """Validate the complete payload and rewind it for decoding"""
+        if self.size == 0:
+            raise UploadRejected('Empty file received', 400)
+        if self.format is None:
+            self.format = sniff_format(self._head)
+            if self.format is None:
+                raise UploadRejected('File must be an image (unrecognized format)', 415)
+        if self.dimensions is None:
+            raise UploadRejected('Invalid image format: could not read image header', 400)
+        self.file.seek(0)
+
+    def close(self):
+        self.file.close()
+
+
+class _PartCollector:
+    """python-multipart callbacks that buffer events for the async loop"""
+
+    def __init__(self):
+        self.header_field = b''
+        self.header_value = b''
+        self.disposition = b''
+        self.content_type = b''
+        self.headers_done: List[Tuple[int, bytes, bytes]] = []
+        self.data: List[Tuple[int, bytes]] = []
+        self.part_index = -1
+
+    def callbacks(self):
+        return {
+            'on_part_begin': self.on_part_begin,
+            'on_part_data': self.on_part_data,
+            'on_header_field': self.on_header_field,
+            'on_header_value': self.on_header_value,
+            'on_header_end': self.on_header_end,
+            'on_headers_finished': self.on_headers_finished,
+        }
+
+    def on_part_begin(self):
+        self.part_index += 1
+        self.disposition = b''
+        self.content_type = b''
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        self.data.append((self.part_index, data[start:end]))
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self.header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self.header_value += data[start:end]
+
+    def on_header_end(self):
+        field = self.header_field.lower()
+        if field == b'content-disposition':
+            self.disposition = self.header_value
+        elif field == b'content-type':
+            self.content_type = self.header_value
+        self.header_field = b''
+        self.header_value = b''
+
+    def on_headers_finished(self):
+        self.headers_done.append((self.part_index, self.disposition, self.content_type))
+
+
+def _feed(parser, chunk: Optional[bytes]):
+    """Write a chunk to the parser (or finalize it) and report malformed bodies as 400"""
+    try:
+        if chunk is None:
+            parser.finalize()
+        else:
+            parser.write(chunk)
+    except Exception as parse_error:
+        raise UploadRejected(f'Malformed multipart body: {parse_error}', 400)
+
+
+async def ingest_upload(request, field: str = 'file', max_bytes: int = None) -> IngestedUpload:
+    """Stream one uploaded file from a multipart/form-data request into a spool
+
+    Raises UploadRejected as soon as the upload is known to be unacceptable;
+    the caller owns the returned upload and must close() it.
+    """
+    max_bytes = max_upload_bytes() if max_bytes is None else max_bytes
+    content_type, params = parse_options_header(request.headers.get('content-type', ''))
+    if content_type != b'multipart/form-data' or b'boundary' not in params:
+        raise UploadRejected('Expected a multipart/form-data upload', 400)
+
+    declared = request.headers.get('content-length')
+    if declared and declared.isdigit() and int(declared) > max_bytes + MULTIPART_OVERHEAD:
+        raise UploadRejected(f'File too large, at most {max_bytes} bytes', 413)
+
+    collector = _PartCollector()
+    parser = MultipartParser(params[b'boundary'], collector.callbacks())
+    upload: Optional[IngestedUpload] = None
+    upload_part = None
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_bytes + MULTIPART_OVERHEAD:
+                raise UploadRejected(f'File too large, at most {max_bytes} bytes', 413)
+            _feed(parser, chunk)
+
+            for part_index, disposition, part_type in collector.headers_done:
+                _, options = parse_options_header(disposition)
+                if upload is None and options.get(b'name', b'').decode('latin-1') == field and b'filename' in options:
+                    part_type = part_type.decode('latin-1')
+                    if part_type and not part_type.startswith('image/'):
+                        raise UploadRejected('File must be an image', 400)
+                    upload_part = part_index
+                    upload = IngestedUpload(
+                        options[b'filename'].decode('utf-8', errors='replace'),
+                        part_type or None,
+                        spool_memory_bytes()
+                    )
+            collector.headers_done.clear()
+
+            for part_index, data in collector.data:
+                if upload is not None and part_index == upload_part:
+                    await upload.write(data, max_bytes)
+            collector.data.clear()
+        _feed(parser, None)
+    except BaseException:
+        if upload is not None:
+            upload.close()
+        raise
+
+    if upload is None:
+        raise UploadRejected(f'No file received in form field "{field}"', 400)
+    try:
+        upload.finish()
+    except UploadRejected:
+        upload.close()
+        raise
+    return upload
@@ -15,6 +15,10 @@ cd ..
 echo "🐍 Installing Python dependencies..."
 cd backend
 pip install -r requirements.txt
+
+# Precompressed .br/.gz sidecars for the static assets
+echo "🗜️ Precompressing frontend assets..."
+python static_assets.py ../frontend/dist
 cd ..
 
 echo "✅ Build completed successfully!"
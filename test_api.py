@@ -7,6 +7,7 @@ Run this to test your API endpoints and model loading
 import requests
 import json
 import os
+import sys
 
 def test_health_endpoint(base_url):
     """Test the health endpoint"""
@@ -44,6 +45,238 @@ def test_environment():
         print("❌ MODEL_DOWNLOAD_URL not set")
         return False
 
+def test_preprocessing_parity():
+    """Check the NumPy preprocessing matches the torchvision transforms"""
+    import glob
+    import sys
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+    try:
+        import torch
+        from PIL import Image
+        from torchvision import transforms
+        from preprocessing import BatchPreprocessor, MEAN, STD
+    except ImportError as e:
+        print(f"⚠️ Skipping preprocessing parity check: {e}")
+        return
+
+    paths = sorted(glob.glob('classification_data_full/valid/*/*.jpg'))[:4]
+    images = [Image.open(path).convert('RGB') for path in paths]
+    images.append(Image.new('RGB', (1000, 600), (120, 30, 200)))
+
+    compose = transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=MEAN.tolist(), std=STD.tolist())
+    ])
+    reference = torch.stack([compose(image) for image in images])
+    candidate = torch.from_numpy(BatchPreprocessor(len(images)).prepare(images))
+
+    max_diff = float((reference - candidate).abs().max())
+    assert max_diff < 1e-4, f"Preprocessing parity failed: max abs diff {max_diff:.2e}"
+    print(f"✅ Preprocessing parity: max abs diff {max_diff:.2e}")
+
+def test_import_budget():
+    """Check the API imports within budget and keeps heavy packages off the startup path"""
+    import sys
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+    from import_profile import default_budget, deferred_imports, import_seconds, profile_imports
+
+    entries = profile_imports('app')
+    seconds = import_seconds(entries, 'app')
+    budget = default_budget()
+    early = deferred_imports(entries)
+    assert not early, f"Startup imports heavy packages: {', '.join(early)}"
+    assert seconds <= budget, f"import app took {seconds:.2f}s (budget {budget:.2f}s)"
+    print(f"✅ import app: {seconds:.2f}s (budget {budget:.2f}s)")
+
+def test_model_download():
+    """Check parallel, resumable, verified model download against a local range server"""
+    import hashlib
+    import sys
+    import tempfile
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+    from model_download import DownloadError, ModelDownloader, read_digest_record
+
+    payload = os.urandom(3 * 1024 * 1024 + 123)
+    expected = hashlib.sha256(payload).hexdigest()
+    server_state = {'drop_after': None, 'served': 0}
+
+    class RangeHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            start, end = 0, len(payload) - 1
+            header = self.headers.get('Range')
+            if header:
+                first, _, last = header[len('bytes='):].partition('-')
+                start, end = int(first), min(int(last or end), end)
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{len(payload)}')
+            else:
+                self.send_response(200)
+            self.send_header('Content-Length', str(end - start + 1))
+            self.send_header('ETag', '"v1"')
+            self.end_headers()
+            body = payload[start:end + 1]
+            if server_state['drop_after'] is not None and len(body) > 1:
+                # Simulate a dropped connection part-way through the range
+                body = body[:server_state['drop_after']]
+            self.wfile.write(body)
+            server_state['served'] += len(body)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/model.pth'
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            dest = os.path.join(directory, 'model.pth')
+
+            # Every connection drops early and there are no retries: leaves a partial file
+            server_state['drop_after'] = 256 * 1024
+            try:
+                ModelDownloader(url, dest, sha256=expected, parts=4, chunk_size=64 * 1024,
+                                retries=0, min_part_bytes=512 * 1024).download()
+                raise AssertionError("Interrupted download unexpectedly succeeded")
+            except DownloadError:
+                pass
+            assert not os.path.exists(dest) and os.path.exists(dest + '.part'), \
+                "Interrupted download should leave only a .part file"
+
+            # Resume: only the missing bytes are fetched
+            server_state.update(drop_after=None, served=0)
+            downloader = ModelDownloader(url, dest, sha256=expected, parts=4, chunk_size=64 * 1024,
+                                         min_part_bytes=512 * 1024)
+            downloader.download()
+            with open(dest, 'rb') as f:
+                assert f.read() == payload, "Downloaded file differs from the served payload"
+            assert downloader.resumed_bytes > 0 and server_state['served'] < len(payload), \
+                f"Download did not resume (resumed {downloader.resumed_bytes} bytes)"
+            assert (read_digest_record(dest) or {}).get('sha256') == expected, "Digest record missing or wrong"
+
+            # A wrong checksum must never replace the destination
+            bad_dest = os.path.join(directory, 'bad.pth')
+            try:
+                ModelDownloader(url, bad_dest, sha256='0' * 64, min_part_bytes=512 * 1024).download()
+                raise AssertionError("Checksum mismatch was not detected")
+            except DownloadError:
+                pass
+            assert not os.path.exists(bad_dest) and not os.path.exists(bad_dest + '.part'), \
+                "Failed verification left files behind"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print(f"✅ Model download: parallel ranges, resume after interruption and SHA-256 verification")
+
+def test_upload_formats():
+    """Pin which uploads /api/predict accepts: formats PIL can identify, not other files"""
+    import asyncio
+    import io
+    import sys
+    import zipfile
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+    try:
+        from PIL import Image
+        from batch_upload import expand_archive
+        from upload_ingest import IngestedUpload, UploadRejected
+    except ImportError as e:
+        print(f"⚠️ Skipping upload format check: {e}")
+        return
+
+    async def ingest(data):
+        upload = IngestedUpload('upload', None, 1024 * 1024)
+        try:
+            await upload.write(data, 20 * 1024 * 1024)
+            upload.finish()
+            return upload.format, upload.dimensions
+        except UploadRejected as rejected:
+            return rejected.status_code, None
+        finally:
+            upload.close()
+
+    for image_format in ('JPEG', 'PNG', 'GIF', 'BMP', 'WEBP', 'TIFF', 'ICO', 'PPM'):
+        buffer = io.BytesIO()
+        Image.new('RGB', (48, 32), (200, 30, 30)).save(buffer, image_format)
+        result = asyncio.run(ingest(buffer.getvalue()))
+        # ICO is written at its own icon sizes, so only the format is pinned exactly
+        assert result[0] == image_format and result[1] is not None, f"{image_format} upload not accepted: {result}"
+    for name, data in (('PDF', b'%PDF-1.4\n' + b'0' * 64), ('text', b'hello world, not an image'),
+                       ('zip', b'PK\x03\x04' + b'\0' * 64)):
+        status = asyncio.run(ingest(data))[0]
+        assert status == 415, f"{name} upload should be rejected with 415, got {status}"
+
+    # Archive members are picked by content too, and the rest are reported
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as members:
+        for name, image_format in (('x.jpg', 'JPEG'), ('y.tif', 'TIFF')):
+            buffer = io.BytesIO()
+            Image.new('RGB', (48, 32)).save(buffer, image_format)
+            members.writestr(name, buffer.getvalue())
+        members.writestr('notes.txt', b'hello world, not an image')
+    skipped = []
+    names = [name for name, _ in expand_archive(archive.getvalue(), 10, skipped=skipped)]
+    assert (names, skipped) == (['x.jpg', 'y.tif'], ['notes.txt']), f"Archive members picked wrongly: {names}, {skipped}"
+    print("✅ Upload formats: JPEG/PNG/GIF/BMP/WEBP/TIFF/ICO/PPM accepted, non-images rejected with 415 or skipped")
+
+def test_memory_governor():
+    """Check capacities step down under memory pressure and come back once it is gone"""
+    import sys
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+    from memory_governor import MemoryGovernor
+    from memory_optimizer import MemoryOptimizer
+
+    class ScriptedOptimizer(MemoryOptimizer):
+        """Reports an RSS set by the test instead of the process's own"""
+        rss_mb = 700.0
+
+        def get_memory_info(self):
+            return {'rss_mb': self.rss_mb, 'vms_mb': self.rss_mb, 'percent': 1.0,
+                    'available_system_mb': 4096.0, 'total_system_mb': 8192.0}
+
+    optimizer = ScriptedOptimizer()
+    governor = MemoryGovernor(optimizer, gc_cooldown=3600, step_interval=0, memory_limit_mb=None,
+                              warning_headroom_mb=64, critical_headroom_mb=512)
+    capacity = {'cache': 64}
+    governor.register_capacity('cache', lambda size: capacity.update(cache=size), 64)
+
+    thresholds = governor.calibrate()
+    assert (thresholds['baseline_mb'], thresholds['warning_mb'], thresholds['critical_mb']) == (700.0, 764.0, 1212.0), \
+        f"Unexpected calibrated thresholds: {thresholds}"
+    governor.check()
+    assert (governor.level, capacity['cache']) == ('normal', 64), "Governor acted without pressure"
+
+    sizes = []
+    optimizer.rss_mb = 800.0
+    for _ in range(2):
+        governor.check()
+        sizes.append((governor.level, capacity['cache']))
+    assert sizes == [('warning', 32), ('warning', 16)], f"Expected gradual reduction 64 -> 32 -> 16, got {sizes}"
+
+    # Below the warning threshold but above the relief point: hold the reduced capacity
+    optimizer.rss_mb = 760.0
+    governor.check()
+    assert (governor.level, capacity['cache']) == ('warning', 16), "Capacity grew back before pressure was gone"
+
+    optimizer.rss_mb = 700.0
+    restored = []
+    for _ in range(3):
+        governor.check()
+        restored.append(capacity['cache'])
+    assert governor.level == 'normal' and restored == [32, 64, 64], f"Expected restore 16 -> 32 -> 64, got {restored}"
+    print("✅ Memory governor: calibrated thresholds, gradual reduction and restore after pressure")
+
+def run_check(check):
+    """Run an asserting check for main(); return whether it passed"""
+    try:
+        check()
+        return True
+    except AssertionError as failure:
+        print(f"❌ {check.__name__}: {failure}")
+        return False
+
 def main():
     print("🧪 Testing Sneaker Authentication API...\n")
     
@@ -51,6 +284,9 @@ def main():
     print("📋 Local Environment Check:")
     test_model_file()
     test_environment()
+    checks = [test_preprocessing_parity, test_import_budget, test_model_download,
+              test_upload_formats, test_memory_governor]
+    failed = [check.__name__ for check in checks if not run_check(check)]
     print()
     
     # Test API endpoints (replace with your actual Render URL)
@@ -67,6 +303,10 @@ def main():
     print("2. Make sure MODEL_DOWNLOAD_URL environment variable is set in Render")
     print("3. Redeploy your app to Render")
     print("4. Test the health endpoint: https://your-app-name.onrender.com/api/health")
+    
+    if failed:
+        print(f"\n❌ Local checks failed: {', '.join(failed)}")
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()